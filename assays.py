@@ -0,0 +1,146 @@
+import math
+from dataclasses import dataclass
+
+import numpy as np
+
+from batch_engine import BatchSimulation
+from constants import (
+    APTT_NORMAL_SECONDS,
+    ASSAY_FIBRIN_THRESHOLD,
+    ASSAY_TICK_LIMIT,
+    INR_ISI,
+    TICKS_PER_SECOND,
+)
+from simulation_variables import SimulationVariables
+from species import SPECIES_INDEX
+
+FIBRIN = SPECIES_INDEX["fibrin"]
+CROSS_LINKED_FIBRIN = SPECIES_INDEX["cross_linked_fibrin"]
+
+
+@dataclass(frozen=True)
+class Assay:
+    name: str
+    # amounts set on the sample before the clock starts: one activator, with
+    # the other and the vessel wall's thrombomodulin taken out, so only one
+    # pathway can start the cascade
+    reagents: tuple
+
+
+PT = Assay("PT", (("tissue_factor", 100), ("subendothelium", 0), ("thrombomodulin", 0)))
+APTT = Assay(
+    "aPTT", (("tissue_factor", 0), ("subendothelium", 100), ("thrombomodulin", 0))
+)
+
+
+@dataclass(frozen=True)
+class AssayResult:
+    # clotting times in seconds, inf where the sample never clotted; inr and
+    # aptt are nan where it had clotted before the clock started
+    pt_seconds: float
+    aptt_raw_seconds: float
+    inr: float
+    aptt: float
+
+
+def prepare(simulation, assay, reactions=None):
+    # the sample is the patient's plasma: their current amounts without
+    # anything the cascade makes (activated factors, thrombin, fibrin, plasmin
+    # and what they break down into), which would otherwise clot it or break
+    # it down before the clock starts
+    reactions = SimulationVariables.reactions if reactions is None else reactions
+    sample = simulation.copy()
+    sample.current_time = 0
+    for name in {reaction.destination for reaction in reactions}:
+        setattr(sample, name, 0)
+    for name, value in assay.reagents:
+        setattr(sample, name, value)
+    return sample
+
+
+def clotting_times(
+    samples,
+    threshold=ASSAY_FIBRIN_THRESHOLD,
+    limit=ASSAY_TICK_LIMIT,
+    reactions=None,
+):
+    # seconds until fibrin reaches the threshold in each sample, all stepped
+    # together; a sample leaves the batch on the tick it clots and the run
+    # ends once every sample has clotted, stopped reacting or hit the limit
+    batch = BatchSimulation(samples, reactions)
+    batch.prune()
+    times = np.full(batch.size, np.inf)
+    remaining = np.arange(batch.size)
+    fibrin = batch.values[FIBRIN] + batch.values[CROSS_LINKED_FIBRIN]
+    clotted = fibrin >= threshold
+    times[clotted] = 0
+    for tick in range(1, limit + 1):
+        if clotted.any():
+            remaining = remaining[~clotted]
+            fibrin = fibrin[~clotted]
+            batch.keep(~clotted)
+        if not remaining.size:
+            break
+        if not batch.time_passes().any():
+            break
+        previous = fibrin
+        fibrin = batch.values[FIBRIN] + batch.values[CROSS_LINKED_FIBRIN]
+        clotted = fibrin >= threshold
+        if clotted.any():
+            # where within the tick the threshold was crossed
+            fraction = (threshold - previous[clotted]) / (
+                fibrin[clotted] - previous[clotted]
+            )
+            times[remaining[clotted]] = (tick - 1 + fraction) / TICKS_PER_SECOND
+    return times
+
+
+_normal_times = {}
+
+
+def normal_times(reactions=None):
+    # PT and aPTT of default plasma, the reference every result is scaled by
+    reactions = SimulationVariables.reactions if reactions is None else reactions
+    if reactions not in _normal_times:
+        plasma = SimulationVariables()
+        _normal_times[reactions] = tuple(
+            clotting_times(
+                [prepare(plasma, PT, reactions), prepare(plasma, APTT, reactions)],
+                reactions=reactions,
+            ).tolist()
+        )
+    return _normal_times[reactions]
+
+
+def measure(simulations, reactions=None) -> list:
+    # PT/INR and aPTT for every patient, as one batch of 2 x patients samples
+    simulations = list(simulations)
+    samples = [prepare(simulation, PT, reactions) for simulation in simulations] + [
+        prepare(simulation, APTT, reactions) for simulation in simulations
+    ]
+    times = clotting_times(samples, reactions=reactions)
+    normal_pt, normal_aptt = normal_times(reactions)
+    count = len(simulations)
+    # a sample that clots on the spot has no clotting time to compare, so it
+    # has no valid INR or aPTT either
+    return [
+        AssayResult(
+            pt_seconds=float(pt),
+            aptt_raw_seconds=float(aptt),
+            inr=float((pt / normal_pt) ** INR_ISI) if pt > 0 else math.nan,
+            aptt=(
+                float(aptt / normal_aptt * APTT_NORMAL_SECONDS)
+                if aptt > 0
+                else math.nan
+            ),
+        )
+        for pt, aptt in zip(times[:count], times[count:])
+    ]
+
+
+def apply(simulation, reactions=None) -> AssayResult:
+    # stores the patient's INR and aPTT in its iNR and aPTT fields
+    (result,) = measure([simulation], reactions)
+    simulation.iNR = result.inr
+    simulation.aPTT = result.aptt
+    return result
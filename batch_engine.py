@@ -0,0 +1,162 @@
+import numpy as np
+
+from reactions import possible_reactions
+from simulation_variables import SimulationVariables
+from species import SPECIES, SPECIES_INDEX
+
+# where each per-patient reaction constant sits in a compiled reaction
+CONSTANT_POSITIONS = {
+    "divisor": 4,
+    "multiplier": 5,
+    "multiplier_i1": 7,
+    "multiplier_i2": 9,
+    "tail": 10,
+}
+
+
+class BatchSimulation:
+    # values holds one row per species (plus the zero slot) and one column
+    # per patient; every reaction in the table is applied to whole rows
+    def __init__(self, simulations, reactions=None):
+        simulations = list(simulations)
+        self.values = np.array(
+            [sim._values for sim in simulations], dtype=float
+        ).T.reshape(len(SPECIES) + 1, len(simulations))
+        self.current_time = np.array(
+            [sim.current_time for sim in simulations], dtype=np.int64
+        )
+        self.reactions = (
+            SimulationVariables.reactions if reactions is None else reactions
+        )
+        # per-patient values of reaction constants, by (reaction name, field)
+        self.constants = {}
+        self.reaction_table = self.compile()
+
+    @classmethod
+    def from_default(cls, size: int):
+        return cls(SimulationVariables() for _ in range(size))
+
+    @property
+    def size(self) -> int:
+        return self.values.shape[1]
+
+    def species(self, name: str) -> np.ndarray:
+        return self.values[SPECIES_INDEX[name]]
+
+    def to_simulation(self, patient: int) -> SimulationVariables:
+        simulation = SimulationVariables()
+        for name, value in zip(SPECIES, self.values[:, patient]):
+            setattr(simulation, name, float(value))
+        simulation.current_time = int(self.current_time[patient])
+        return simulation
+
+    def compile(self) -> tuple:
+        # the full reaction table, with an array in place of each constant
+        # that differs between patients
+        table = []
+        for reaction in self.reactions:
+            compiled = list(reaction.compile())
+            for field, position in CONSTANT_POSITIONS.items():
+                values = self.constants.get((reaction.name, field))
+                if values is not None:
+                    compiled[position] = values
+            table.append(tuple(compiled))
+        return tuple(table)
+
+    def set_constant(self, reaction: str, field: str, values):
+        # one value per patient for a constant of the named reaction; this
+        # brings back the full table, so prune afterwards
+        if field not in CONSTANT_POSITIONS:
+            raise ValueError(f"'{field}' is not a per-patient reaction constant")
+        if reaction not in {known.name for known in self.reactions}:
+            raise ValueError(f"unknown reaction '{reaction}'")
+        values = np.asarray(values, dtype=float)
+        if values.shape != (self.size,):
+            raise ValueError(f"expected {self.size} values, got {values.shape}")
+        self.constants[reaction, field] = values
+        self.reaction_table = self.compile()
+
+    def keep(self, columns):
+        # drops every other patient; columns is a boolean mask or indices
+        self.values = self.values[:, columns]
+        self.current_time = self.current_time[columns]
+        self.constants = {
+            key: values[columns] for key, values in self.constants.items()
+        }
+        self.reaction_table = tuple(
+            tuple(
+                item[columns] if isinstance(item, np.ndarray) else item
+                for item in reaction
+            )
+            for reaction in self.reaction_table
+        )
+
+    def prune(self):
+        # steps only the reactions some patient could still fire from here;
+        # like SimulationVariables this gives the same numbers as the full
+        # table, so call it again after adding a species from outside
+        self.reaction_table = possible_reactions(
+            self.compile(), self.values.max(axis=1).tolist()
+        )
+
+    def time_passes(self) -> np.ndarray:
+        # returns the amount converted this tick for each patient
+        values = self.values
+        moved = np.zeros(self.size)
+        for (
+            source,
+            destination,
+            catalyst,
+            catalyst_2,
+            divisor,
+            multiplier,
+            inhibitor_1,
+            multiplier_i1,
+            inhibitor_2,
+            multiplier_i2,
+            tail,
+            calcium_factor,
+            catalyst_threshold,
+        ) in self.reaction_table:
+            source_amount = values[source]
+            reacting = source_amount >= 0.005
+            if not reacting.any():
+                continue
+            catalyst_amount = values[catalyst]
+            catalyst_2_amount = values[catalyst_2]
+            if catalyst_threshold:
+                reacting &= catalyst_amount > catalyst_threshold
+                if not reacting.any():
+                    continue
+            elif not catalyst_amount.any() and not catalyst_2_amount.any():
+                continue
+            maximum_catalyst_available = (
+                np.maximum(
+                    np.maximum(catalyst_amount, catalyst_2_amount),
+                    np.minimum(catalyst_amount, catalyst_2_amount) * multiplier,
+                )
+                / divisor
+                - np.maximum(
+                    values[inhibitor_1] * multiplier_i1,
+                    values[inhibitor_2] * multiplier_i2,
+                )
+            ) * calcium_factor
+            change = np.minimum(
+                source_amount / tail, np.maximum(maximum_catalyst_available, 0)
+            )
+            change[~reacting] = 0
+            values[source] = source_amount - change
+            values[destination] += change
+            moved += change
+
+        self.current_time += 1
+        return moved
+
+    def run(self, steps: int) -> int:
+        # stops stepping once no patient's state can change any more and
+        # returns the number of ticks actually computed
+        for done in range(1, steps + 1):
+            if not self.time_passes().any():
+                self.current_time += steps - done
+                return done
+        return steps
@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from constants import TICKS_PER_SECOND, TIME_LIMIT_SECONDS, disorders, simulation_modes
+from reactions import (
+    REACTIONS,
+    ReactionVariables,
+    compile_reactions,
+    possible_reactions,
+    step,
+)
+from runner import build_simulation, run_simulation
+from simulation_variables import SimulationVariables
+
+GROUPS = ("engine", "reactions", "runs", "gui")
+# a result is flagged when it is this much worse than the baseline
+DEFAULT_THRESHOLD = 0.15
+
+
+def legacy_time_passes(simulation: SimulationVariables):
+    # a reconstruction of the per-tick path before the reaction table, not
+    # the old code itself: one ReactionVariables per reaction and string
+    # lookups for every read and write
+    for reaction in simulation.reactions:
+        if (
+            reaction.catalyst_threshold
+            and getattr(simulation, reaction.catalyst) <= reaction.catalyst_threshold
+        ):
+            continue
+        size = ReactionVariables(
+            catalyst_amount=getattr(simulation, reaction.catalyst),
+            catalyst_2_amount=(
+                getattr(simulation, reaction.catalyst_2) if reaction.catalyst_2 else 0.0
+            ),
+            source_amount=getattr(simulation, reaction.source),
+            divisor=reaction.divisor,
+            multiplier=reaction.multiplier,
+            inhibitor_1_amount=(
+                getattr(simulation, reaction.inhibitor_1)
+                if reaction.inhibitor_1
+                else 0.0
+            ),
+            multiplier_i1=reaction.multiplier_i1,
+            inhibitor_2_amount=(
+                getattr(simulation, reaction.inhibitor_2)
+                if reaction.inhibitor_2
+                else 0.0
+            ),
+            multiplier_i2=reaction.multiplier_i2,
+            tail=reaction.tail,
+            reaction_affected_by_calcium=reaction.reaction_affected_by_calcium,
+        ).get_reaction_size()
+        simulation.perform_reaction(reaction.source, reaction.destination, size)
+    simulation.current_time += 1
+
+
+def metric(value, unit, higher_is_better=False):
+    return {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+
+def best_time(function, repeat=5) -> float:
+    # the fastest of several timings, the least disturbed by other load
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def reacting_simulation(ticks=300) -> SimulationVariables:
+    # part way into a pro-thrombotic run, where every reaction can fire
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    for _ in range(ticks):
+        simulation.time_passes()
+    return simulation
+
+
+def steps_per_second(
+    time_passes, steps: int, mode="Haemostasis (Pro-thrombotic)"
+) -> float:
+    def run():
+        simulation = build_simulation(mode)
+        for _ in range(steps):
+            time_passes(simulation)
+
+    return steps / best_time(run, repeat=3)
+
+
+def bench_engine(steps):
+    table = steps_per_second(SimulationVariables.time_passes, steps)
+    legacy = steps_per_second(legacy_time_passes, steps // 4)
+    # the loop as time_passes ran it before the fibrinolysis and anticoagulant
+    # reactions: the first 14, pruned to those that can fire from the start
+    first_14 = compile_reactions(REACTIONS[:14])
+    results = {}
+    for mode in simulation_modes[1:]:
+        full = steps_per_second(SimulationVariables.time_passes, steps, mode)
+        pruned = possible_reactions(first_14, build_simulation(mode)._values)
+        reduced = steps_per_second(
+            lambda simulation: step(simulation._values, pruned), steps, mode
+        )
+        results[f"engine.time_passes/{mode}"] = metric(
+            full, "steps/s", higher_is_better=True
+        )
+        results[f"engine.first_14_reactions/{mode}"] = metric(
+            reduced, "steps/s", higher_is_better=True
+        )
+    simulation = reacting_simulation()
+
+    def copy():
+        for _ in range(1000):
+            simulation.copy()
+
+    return {
+        "engine.time_passes": metric(table, "steps/s", higher_is_better=True),
+        "engine.reconstructed_legacy_time_passes": metric(
+            legacy, "steps/s", higher_is_better=True
+        ),
+        **results,
+        "engine.state_copy": metric(best_time(copy) / 1000 * 1e9, "ns/call"),
+        "engine.state_memory": metric(simulation.nbytes(), "bytes"),
+    }
+
+
+def bench_reactions(calls):
+    results = {}
+    start = reacting_simulation()
+    simulation = SimulationVariables()
+    for reaction in SimulationVariables.reactions:
+        method = getattr(simulation, reaction.name)
+
+        def run():
+            simulation.restore(start.field_values())
+            for _ in range(calls):
+                method()
+
+        results[f"reactions.{reaction.name}"] = metric(
+            best_time(run) / calls * 1e9, "ns/call"
+        )
+
+    def construct():
+        for _ in range(calls):
+            ReactionVariables(
+                catalyst_amount=10.0, source_amount=1000.0, divisor=1000
+            ).get_reaction_size()
+
+    results["reactions.ReactionVariables"] = metric(
+        best_time(construct) / calls * 1e9, "ns/call"
+    )
+    return results
+
+
+def bench_runs():
+    # every preset and disorder run to the GUI's time limit
+    steps = (TIME_LIMIT_SECONDS + 1) * TICKS_PER_SECOND
+    results = {}
+    for mode in simulation_modes:
+        for disorder in disorders:
+            seconds = best_time(
+                lambda: run_simulation(build_simulation(mode, disorder), steps),
+                repeat=3,
+            )
+            results[f"runs.{mode}/{disorder}"] = metric(seconds * 1000, "ms")
+    return results
+
+
+def bench_gui(frames):
+    # the per-frame GUI work, drawn on Qt's offscreen platform
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    import main
+
+    application = QApplication.instance() or QApplication([])
+    window = main.MainWindow()
+    window.simulationModeCombo.setCurrentText("Haemostasis (Pro-thrombotic)")
+    for _ in range(300):
+        window.step_simulation()
+    # a few untimed frames first, so lazily built plot state is in place
+    for _ in range(10):
+        window.time_passes()
+    timings = {"time_passes": [], "update_ui_components": [], "update_lines": []}
+    for _ in range(frames):
+        for name, function in (
+            ("time_passes", window.time_passes),
+            ("update_ui_components", window.update_ui_components),
+            ("update_lines", window.update_lines),
+        ):
+            start = time.perf_counter()
+            function()
+            timings[name].append(time.perf_counter() - start)
+        # a frame's worth of steps so every redraw has new values to show
+        for _ in range(8):
+            window.step_simulation()
+    window.close()
+    application.processEvents()
+    return {
+        f"gui.{name}": metric(float(np.median(values)) * 1000, "ms")
+        for name, values in timings.items()
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+    }
+
+
+def run_benchmarks(groups=GROUPS, steps=20000, calls=20000, frames=60) -> dict:
+    results = {}
+    for group in groups:
+        match group:
+            case "engine":
+                results.update(bench_engine(steps))
+            case "reactions":
+                results.update(bench_reactions(calls))
+            case "runs":
+                results.update(bench_runs())
+            case "gui":
+                results.update(bench_gui(frames))
+            case _:
+                raise ValueError(f"unknown benchmark group '{group}'")
+    return {"environment": environment(), "results": results}
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD) -> list:
+    # (name, baseline value, current value, relative change, regressed) for
+    # every result in both; change is positive when the result got worse
+    rows = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["value"]
+        after = result["value"]
+        if result["higher_is_better"]:
+            change = before / after - 1 if after else float("inf")
+        else:
+            change = after / before - 1 if before else 0.0
+        rows.append((name, before, after, change, change > threshold))
+    return rows
+
+
+def print_results(report):
+    for name, result in report["results"].items():
+        print(f"{name:<60}{result['value']:>16,.2f} {result['unit']}")
+
+
+def print_comparison(rows, threshold):
+    print(f"{'benchmark':<60}{'baseline':>14}{'current':>14}{'worse by':>10}")
+    for name, before, after, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<60}{before:>14,.2f}{after:>14,.2f}{change:>10.1%}{flag}")
+    regressions = sum(regressed for *_, regressed in rows)
+    print(f"{regressions} of {len(rows)} results more than {threshold:.0%} worse")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Time the engine, the reactions, full runs and the GUI frame"
+    )
+    parser.add_argument(
+        "--groups",
+        default=",".join(GROUPS),
+        help=f"comma separated groups to run (default: {','.join(GROUPS)})",
+    )
+    parser.add_argument("--steps", type=int, default=20000)
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument(
+        "--compare", metavar="BASELINE", help="JSON results to check for regressions"
+    )
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.groups.split(","), args.steps, args.calls, args.frames)
+    print_results(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        rows = compare(report, baseline, args.threshold)
+        print()
+        print_comparison(rows, args.threshold)
+        if any(regressed for *_, regressed in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+import csv
+import hashlib
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
+
+import numpy as np
+
+from batch_engine import BatchSimulation
+from constants import TICKS_PER_SECOND
+from reactions import ENGINE_VERSION, TUNABLE_FIELDS, used_constants
+from runner import build_simulation
+from simulation_variables import SimulationVariables
+from species import SPECIES_INDEX
+
+# differential evolution (DE/rand/1/bin) settings
+MUTATION = 0.7
+CROSSOVER = 0.9
+
+
+@dataclass(frozen=True)
+class Targets:
+    # reference curves: sample times in seconds and, per species, the
+    # amounts at those times (nan where a curve has no point)
+    times: np.ndarray
+    species: tuple
+    values: np.ndarray
+
+    @classmethod
+    def load(cls, path):
+        # the CSV layout save_trajectory writes: a time column, then one
+        # column per species; empty cells are skipped
+        with open(path, newline="") as file:
+            rows = list(csv.reader(file))
+        header, rows = rows[0], [row for row in rows[1:] if row]
+        if not header or header[0] != "time":
+            raise ValueError(f"{path}: the first column must be 'time'")
+        species = tuple(name.strip() for name in header[1:])
+        unknown = [name for name in species if name not in SPECIES_INDEX]
+        if unknown:
+            raise ValueError(f"{path}: unknown species {', '.join(unknown)}")
+        if not species or not rows:
+            raise ValueError(f"{path} has no target curves")
+        table = np.array(
+            [[float(cell) if cell.strip() else np.nan for cell in row] for row in rows]
+        )
+        order = np.argsort(table[:, 0])
+        return cls(table[order, 0], species, table[order, 1:])
+
+    @property
+    def steps(self) -> int:
+        return math.ceil(self.times[-1] * TICKS_PER_SECOND)
+
+    def digest(self) -> str:
+        data = json.dumps(
+            [self.times.tolist(), self.species, np.nan_to_num(self.values).tolist()]
+        )
+        return hashlib.sha256(data.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class Scenario:
+    mode: str = "Haemostasis (Pro-thrombotic)"
+    disorder: str = "None"
+    overrides: tuple = ()
+
+    def simulation(self):
+        return build_simulation(self.mode, self.disorder, dict(self.overrides))
+
+
+def parse_parameter(label):
+    # "reaction.field" -> (reaction, field), for constants that can be fitted:
+    # ones the reaction reads and that are not 0, since the fit is in log10
+    name, _, field = label.rpartition(".")
+    reactions = {reaction.name: reaction for reaction in SimulationVariables.reactions}
+    if name not in reactions:
+        raise ValueError(f"unknown reaction in '{label}'")
+    if field not in TUNABLE_FIELDS:
+        raise ValueError(f"'{field}' in '{label}' is not a tunable constant")
+    if field not in used_constants(reactions[name]):
+        raise ValueError(f"{name} does not use its {field}")
+    if not getattr(reactions[name], field) > 0:
+        raise ValueError(f"{label} is 0 and cannot be fitted on a log scale")
+    return name, field
+
+
+def starting_values(labels) -> np.ndarray:
+    reactions = {reaction.name: reaction for reaction in SimulationVariables.reactions}
+    return np.array(
+        [
+            float(getattr(reactions[name], field))
+            for name, field in map(parse_parameter, labels)
+        ]
+    )
+
+
+def evaluate(scenario, targets, labels, candidates, reactions=None) -> np.ndarray:
+    # curve error of each row of candidates (constants in labels order), all
+    # run as one batch: the root mean square of the difference from every
+    # target point, each curve scaled by its own peak
+    candidates = np.atleast_2d(candidates)
+    batch = BatchSimulation([scenario.simulation()] * len(candidates), reactions)
+    for column, (name, field) in enumerate(map(parse_parameter, labels)):
+        batch.set_constant(name, field, candidates[:, column])
+    batch.prune()
+    indices = [SPECIES_INDEX[name] for name in targets.species]
+    curves = np.empty((targets.steps + 1, len(indices), len(candidates)))
+    curves[0] = batch.values[indices]
+    for tick in range(1, targets.steps + 1):
+        if not batch.time_passes().any():
+            curves[tick:] = batch.values[indices]
+            break
+        curves[tick] = batch.values[indices]
+    # amounts at the target times, linear between ticks
+    position = targets.times * TICKS_PER_SECOND
+    below = np.floor(position).astype(int)
+    above = np.minimum(below + 1, targets.steps)
+    fraction = (position - below)[:, np.newaxis, np.newaxis]
+    simulated = curves[below] * (1 - fraction) + curves[above] * fraction
+    scale = np.nanmax(np.abs(targets.values), axis=0)
+    scale[~(scale > 0)] = 1
+    error = (simulated - targets.values[:, :, np.newaxis]) / scale[:, np.newaxis]
+    present = ~np.isnan(targets.values)
+    return np.sqrt(np.mean(error[present] ** 2, axis=0))
+
+
+class Calibration:
+    # fits log10 of the chosen constants with differential evolution inside
+    # start / spread .. start * spread. Each generation's trial population is
+    # one batch, split between worker processes when there are several, and
+    # the state is written to the checkpoint after every generation so an
+    # interrupted fit carries on where it stopped.
+    def __init__(
+        self,
+        targets,
+        labels,
+        scenario=Scenario(),
+        population=None,
+        spread=10.0,
+        seed=0,
+        workers=1,
+        checkpoint=None,
+    ):
+        if not labels:
+            raise ValueError("choose at least one constant to fit")
+        if spread <= 1:
+            raise ValueError("spread must be above 1")
+        self.targets = targets
+        self.labels = tuple(labels)
+        self.scenario = scenario
+        self.start = np.log10(starting_values(self.labels))
+        self.lower = self.start - math.log10(spread)
+        self.upper = self.start + math.log10(spread)
+        self.size = population or max(8, 6 * len(self.labels))
+        if self.size < 4:
+            raise ValueError("differential evolution needs at least 4 candidates")
+        self.seed = seed
+        self.workers = workers or os.cpu_count()
+        self.checkpoint = checkpoint
+        self.generation = 0
+        self.history = []
+        self.generator = np.random.default_rng(seed)
+        self.population = None
+        self.scores = None
+        self._executor = None
+
+    def config(self) -> dict:
+        # what a checkpoint has to match to be resumed
+        return {
+            "engine_version": ENGINE_VERSION,
+            "labels": list(self.labels),
+            "scenario": [
+                self.scenario.mode,
+                self.scenario.disorder,
+                [list(pair) for pair in self.scenario.overrides],
+            ],
+            "targets": self.targets.digest(),
+            "start": self.start.tolist(),
+            "lower": self.lower.tolist(),
+            "upper": self.upper.tolist(),
+            "population": self.size,
+            "seed": self.seed,
+        }
+
+    def score(self, population) -> np.ndarray:
+        candidates = 10**population
+        if self._executor is None:
+            return evaluate(self.scenario, self.targets, self.labels, candidates)
+        # the reactions go along so workers use any constants loaded here
+        results = self._executor.map(
+            evaluate,
+            itertools.repeat(self.scenario),
+            itertools.repeat(self.targets),
+            itertools.repeat(self.labels),
+            np.array_split(candidates, self.workers),
+            itertools.repeat(SimulationVariables.reactions),
+        )
+        return np.concatenate(list(results))
+
+    def initialise(self):
+        # the hand-tuned constants are one of the first candidates
+        population = self.generator.uniform(
+            self.lower, self.upper, (self.size, len(self.labels))
+        )
+        population[0] = self.start
+        self.population = population
+        self.scores = self.score(population)
+        self.history.append(float(self.scores.min()))
+
+    def trials(self) -> np.ndarray:
+        size, dimensions = self.population.shape
+        trials = np.empty_like(self.population)
+        for index in range(size):
+            others = [other for other in range(size) if other != index]
+            a, b, c = self.population[self.generator.choice(others, 3, replace=False)]
+            mutant = np.clip(a + MUTATION * (b - c), self.lower, self.upper)
+            cross = self.generator.random(dimensions) < CROSSOVER
+            cross[self.generator.integers(dimensions)] = True
+            trials[index] = np.where(cross, mutant, self.population[index])
+        return trials
+
+    def advance(self):
+        trials = self.trials()
+        scores = self.score(trials)
+        better = scores <= self.scores
+        self.population[better] = trials[better]
+        self.scores[better] = scores[better]
+        self.generation += 1
+        self.history.append(float(self.scores.min()))
+
+    def run(self, generations, tolerance=0.0, progress=None):
+        # carries on to `generations` in total, stopping early once the best
+        # error is at or under tolerance
+        pool = (
+            ProcessPoolExecutor(max_workers=self.workers)
+            if self.workers > 1
+            else nullcontext()
+        )
+        with pool as self._executor:
+            if self.population is None and not self.resume():
+                self.initialise()
+                self.save()
+            while self.generation < generations and self.best_error > tolerance:
+                self.advance()
+                self.save()
+                if progress is not None:
+                    progress(self)
+        self._executor = None
+        return self.best
+
+    @property
+    def best_error(self) -> float:
+        return float(self.scores.min())
+
+    @property
+    def best(self) -> dict:
+        # reaction name -> {field: value} for the best candidate so far
+        values = 10 ** self.population[int(self.scores.argmin())]
+        constants = {}
+        for (name, field), value in zip(map(parse_parameter, self.labels), values):
+            constants.setdefault(name, {})[field] = float(value)
+        return constants
+
+    def save(self):
+        if self.checkpoint is None:
+            return
+        state = {
+            "config": self.config(),
+            "generation": self.generation,
+            "population": self.population.tolist(),
+            "scores": self.scores.tolist(),
+            "history": self.history,
+            "random_state": self.generator.bit_generator.state,
+        }
+        partial = f"{self.checkpoint}.partial"
+        with open(partial, "w") as file:
+            json.dump(state, file)
+        os.replace(partial, self.checkpoint)
+
+    def resume(self) -> bool:
+        # picks up a checkpoint of the same fit; False when there is none
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return False
+        with open(self.checkpoint) as file:
+            state = json.load(file)
+        if state["config"] != self.config():
+            raise ValueError(
+                f"{self.checkpoint} is a checkpoint of a different fit; "
+                "remove it or choose another path"
+            )
+        self.generation = state["generation"]
+        self.population = np.array(state["population"])
+        self.scores = np.array(state["scores"])
+        self.history = state["history"]
+        self.generator.bit_generator.state = state["random_state"]
+        return True
+
+
+def write_parameters(path, constants, error=None, labels=()):
+    # the file load_parameters / $COAGULATION_PARAMETERS read at startup
+    document = {
+        "engine_version": ENGINE_VERSION,
+        "fitted": list(labels),
+        "error": error,
+        "reactions": constants,
+    }
+    partial = f"{path}.partial"
+    with open(partial, "w") as file:
+        json.dump(document, file, indent=2)
+    os.replace(partial, path)
@@ -0,0 +1,297 @@
+import math
+import operator
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from batch_engine import BatchSimulation
+from constants import COHORT_CHUNK_PATIENTS, COHORT_STRIDE, TICKS_PER_SECOND
+from online_stats import OnlineStats, QuantileSketch
+from runner import build_simulation
+from species import SPECIES_INDEX
+from sweep import ProgressBar
+
+DEFAULT_SPECIES = ("thrombin", "fibrin", "cross_linked_fibrin")
+DEFAULT_THRESHOLDS = ("thrombin>1000", "cross_linked_fibrin>500")
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+@dataclass(frozen=True)
+class Distribution:
+    # how a starting amount varies between patients around its preset value:
+    # lognormal keeps the mean and has coefficient of variation `spread`,
+    # normal has standard deviation `spread` times the value (cut off at 0)
+    kind: str
+    spread: float
+
+    @classmethod
+    def parse(cls, text):
+        kind, _, spread = text.partition(":")
+        if kind not in ("lognormal", "normal") or not spread:
+            raise ValueError(f"expected lognormal:CV or normal:CV, got '{text}'")
+        return cls(kind, float(spread))
+
+    def factors(self, generator, size) -> np.ndarray:
+        match self.kind:
+            case "lognormal":
+                sigma = math.sqrt(math.log1p(self.spread**2))
+                return generator.lognormal(-(sigma**2) / 2, sigma, size)
+            case "normal":
+                return np.maximum(generator.normal(1, self.spread, size), 0)
+        raise ValueError(f"unknown distribution '{self.kind}'")
+
+
+# population spread of the plasma proteins and cells the model reads
+DEFAULT_VARIATION = {
+    "fibrinogen": Distribution("lognormal", 0.2),
+    "prothrombin": Distribution("lognormal", 0.15),
+    "factor5": Distribution("lognormal", 0.2),
+    "factor7": Distribution("lognormal", 0.2),
+    "factor8": Distribution("lognormal", 0.3),
+    "factor9": Distribution("lognormal", 0.2),
+    "factor10": Distribution("lognormal", 0.2),
+    "factor11": Distribution("lognormal", 0.2),
+    "factor12": Distribution("lognormal", 0.25),
+    "factor13": Distribution("lognormal", 0.2),
+    "protein_c": Distribution("lognormal", 0.15),
+    "protein_s": Distribution("lognormal", 0.15),
+    "antithrombin3": Distribution("lognormal", 0.1),
+    "tFPI": Distribution("lognormal", 0.2),
+    "plasminogen": Distribution("lognormal", 0.15),
+    "tAFI": Distribution("lognormal", 0.2),
+    "pAI1": Distribution("lognormal", 0.4),
+    "a2A": Distribution("lognormal", 0.15),
+    "platelets": Distribution("lognormal", 0.25),
+    "calcium_ions": Distribution("normal", 0.04),
+}
+
+
+@dataclass(frozen=True)
+class Threshold:
+    # the first tick a species goes above (or below) a value
+    species: str
+    above: bool
+    value: float
+
+    @classmethod
+    def parse(cls, text):
+        for symbol, above in ((">", True), ("<", False)):
+            name, found, value = text.partition(symbol)
+            if found:
+                if name not in SPECIES_INDEX:
+                    raise ValueError(f"unknown species '{name}'")
+                return cls(name, above, float(value))
+        raise ValueError(f"expected NAME>VALUE or NAME<VALUE, got '{text}'")
+
+    def reached(self, values) -> np.ndarray:
+        compare = operator.gt if self.above else operator.lt
+        return compare(values[SPECIES_INDEX[self.species]], self.value)
+
+    def __str__(self):
+        return f"{self.species}{'>' if self.above else '<'}{self.value:g}"
+
+
+@dataclass(frozen=True)
+class Cohort:
+    mode: str = "Haemostasis (Pro-thrombotic)"
+    # disorder name -> share of the cohort
+    disorders: tuple = (("None", 1.0),)
+    variation: tuple = tuple(DEFAULT_VARIATION.items())
+    steps: int = 2000
+    species: tuple = DEFAULT_SPECIES
+    stride: int = COHORT_STRIDE
+    thresholds: tuple = tuple(Threshold.parse(text) for text in DEFAULT_THRESHOLDS)
+    relative_accuracy: float = 0.01
+    # seconds per time-to-threshold histogram bin
+    bin_seconds: float = 5.0
+
+    def __post_init__(self):
+        for name, _ in self.variation:
+            if name not in SPECIES_INDEX:
+                raise ValueError(f"unknown species '{name}'")
+        for name in self.species:
+            if name not in SPECIES_INDEX:
+                raise ValueError(f"unknown species '{name}'")
+        if self.stride < 1:
+            raise ValueError("stride must be at least 1")
+        if not self.disorders or any(share < 0 for _, share in self.disorders):
+            raise ValueError("disorder shares must be non-negative")
+
+    @property
+    def sample_ticks(self) -> np.ndarray:
+        return np.arange(0, self.steps + 1, self.stride)
+
+    @property
+    def bin_edges(self) -> np.ndarray:
+        end = self.steps / TICKS_PER_SECOND
+        return np.arange(0, end + self.bin_seconds, self.bin_seconds)
+
+
+@dataclass
+class CohortSummary:
+    # everything kept about a cohort; its size depends on the cohort's
+    # settings, not on how many patients went through it
+    cohort: Cohort
+    patients: int = 0
+    disorder_counts: dict = field(default_factory=dict)
+    sketch: QuantileSketch = None
+    stats: OnlineStats = None
+    # one row of bin counts per threshold, and the patients never reaching it
+    time_counts: np.ndarray = None
+    never: np.ndarray = None
+    seconds: float = 0.0
+
+    def __post_init__(self):
+        shape = (len(self.cohort.sample_ticks), len(self.cohort.species))
+        if self.sketch is None:
+            self.sketch = QuantileSketch(shape, self.cohort.relative_accuracy)
+        if self.stats is None:
+            self.stats = OnlineStats(math.prod(shape))
+        if self.time_counts is None:
+            bins = len(self.cohort.bin_edges) - 1
+            self.time_counts = np.zeros(
+                (len(self.cohort.thresholds), bins), dtype=np.int64
+            )
+            self.never = np.zeros(len(self.cohort.thresholds), dtype=np.int64)
+
+    def merge(self, other):
+        if other.cohort != self.cohort:
+            raise ValueError("can only merge summaries of the same cohort")
+        self.patients += other.patients
+        for name, count in other.disorder_counts.items():
+            self.disorder_counts[name] = self.disorder_counts.get(name, 0) + count
+        self.sketch.merge(other.sketch)
+        self.stats.merge(other.stats)
+        self.time_counts += other.time_counts
+        self.never += other.never
+        self.seconds += other.seconds
+
+    def percentiles(self, percentiles=PERCENTILES) -> np.ndarray:
+        # (percentile, sample, species)
+        return np.array([self.sketch.quantile(p / 100) for p in percentiles])
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self.stats.mean.reshape(self.sketch.shape)
+
+    @property
+    def std(self) -> np.ndarray:
+        return self.stats.std.reshape(self.sketch.shape)
+
+    def time_percentile(self, threshold, percentile) -> float:
+        # read off the histogram to bin resolution; inf once it falls among
+        # the patients that never reached the threshold
+        counts = self.time_counts[threshold]
+        rank = percentile / 100 * self.patients
+        reached = np.cumsum(counts)
+        if not self.patients or rank > reached[-1]:
+            return math.inf
+        return float(self.cohort.bin_edges[np.searchsorted(reached, rank) + 1])
+
+    def save(self, path):
+        np.savez(
+            path,
+            time=self.cohort.sample_ticks / TICKS_PER_SECOND,
+            species=np.array(self.cohort.species),
+            percentiles=np.array(PERCENTILES),
+            values=self.percentiles(),
+            mean=self.mean,
+            std=self.std,
+            thresholds=np.array([str(t) for t in self.cohort.thresholds]),
+            bin_edges=self.cohort.bin_edges,
+            time_counts=self.time_counts,
+            never=self.never,
+            patients=self.patients,
+        )
+
+
+def sample_patients(cohort, size, generator):
+    # starting states for size patients: disorder by its share, then every
+    # varied species scaled by a draw from its distribution
+    names = [name for name, _ in cohort.disorders]
+    shares = np.array([share for _, share in cohort.disorders], dtype=float)
+    chosen = generator.choice(len(names), size=size, p=shares / shares.sum())
+    bases = np.array(
+        [build_simulation(cohort.mode, name)._values for name in names], dtype=float
+    )
+    values = bases[chosen].T.copy()
+    for name, distribution in cohort.variation:
+        values[SPECIES_INDEX[name]] *= distribution.factors(generator, size)
+    counts = np.bincount(chosen, minlength=len(names))
+    return values, {name: int(count) for name, count in zip(names, counts) if count}
+
+
+def run_chunk(cohort, size, seed) -> CohortSummary:
+    start = time.perf_counter()
+    generator = np.random.default_rng(seed)
+    values, disorder_counts = sample_patients(cohort, size, generator)
+    batch = BatchSimulation([build_simulation(cohort.mode)] * size)
+    batch.values = values
+    batch.prune()
+    summary = CohortSummary(cohort, patients=size, disorder_counts=disorder_counts)
+    indices = [SPECIES_INDEX[name] for name in cohort.species]
+    samples = np.empty((len(cohort.sample_ticks), len(indices), size))
+    reached = np.full((len(cohort.thresholds), size), np.inf)
+    row = 0
+    quiescent = False
+    for tick in range(cohort.steps + 1):
+        if tick and not quiescent:
+            quiescent = not batch.time_passes().any()
+        if not quiescent:
+            for number, threshold in enumerate(cohort.thresholds):
+                first = np.isinf(reached[number]) & threshold.reached(batch.values)
+                reached[number, first] = tick / TICKS_PER_SECOND
+        if tick % cohort.stride == 0:
+            samples[row] = batch.values[indices]
+            summary.sketch.update(samples[row], at=row)
+            row += 1
+    summary.stats = OnlineStats.from_samples(samples.reshape(-1, size).T)
+    for number, times in enumerate(reached):
+        summary.time_counts[number] = np.histogram(
+            times[np.isfinite(times)], cohort.bin_edges
+        )[0]
+        summary.never[number] = np.isinf(times).sum()
+    summary.seconds = time.perf_counter() - start
+    return summary
+
+
+def chunk_sizes(patients, chunk):
+    return [min(chunk, patients - start) for start in range(0, patients, chunk)]
+
+
+def run_cohort(
+    cohort, patients, chunk=COHORT_CHUNK_PATIENTS, workers=None, seed=0, progress=True
+) -> CohortSummary:
+    # chunks go to worker processes and are merged as they finish; at most
+    # two per worker are in flight, so memory stays flat however large the
+    # cohort. Each chunk's seed comes from its index, so the patients drawn
+    # do not depend on the number of workers.
+    sizes = chunk_sizes(patients, chunk)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    summary = CohortSummary(cohort)
+    bar = ProgressBar(len(sizes)) if progress and sizes else None
+    if workers == 1:
+        for size, chunk_seed in zip(sizes, seeds):
+            summary.merge(run_chunk(cohort, size, chunk_seed))
+            if bar is not None:
+                bar.advance()
+        return summary
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        limit = 2 * (workers or os.cpu_count())
+        queued = iter(zip(sizes, seeds))
+        pending = set()
+        while True:
+            for size, chunk_seed in queued:
+                pending.add(executor.submit(run_chunk, cohort, size, chunk_seed))
+                if len(pending) >= limit:
+                    break
+            if not pending:
+                return summary
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                summary.merge(future.result())
+                if bar is not None:
+                    bar.advance()
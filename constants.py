@@ -6,6 +6,13 @@ LIGHTGREEN = "#90EE90"
 LIGHTBLUE = "#ADD8E6"
 ROYALBLUE = "#4169E1"
 SIMULATION_END = 50000
+# ticks kept for each plotted line before the oldest roll off
+HISTORY_CAPACITY = 20000
+# plot decimation: each level summarises LOD_FACTOR buckets of the one below
+LOD_FACTOR = 4
+LOD_LEVELS = 6
+# rows added each time the all-species history has to grow
+HISTORY_CHUNK = 2048
 
 disorders = [
     "None",
@@ -21,4 +28,63 @@ disorders = [
     "Factor V Leiden",
 ]
 
-speeds = ["x 1", "x 2", "x 4", "x 8", "x 16", "x 32", "x 64", "x 0.5"]
+simulation_modes = [
+    "None",
+    "Haemostasis (Pro-thrombotic)",
+    "Haemostasis (Anti-thrombotic)",
+    "Fibrinolysis",
+]
+
+speeds = [
+    "x 1",
+    "x 2",
+    "x 4",
+    "x 8",
+    "x 16",
+    "x 32",
+    "x 64",
+    "x 0.5",
+    "x 256",
+    "x 1024",
+    "As fast as possible",
+]
+# speed value meaning "as fast as possible"
+MAX_SPEED = 0
+# each tick of the model is half a second
+TICKS_PER_SECOND = 2
+# the GUI stops once the run passes this many seconds with the time limit on
+TIME_LIMIT_SECONDS = 1000
+# plot and label redraws per second
+FRAME_RATE = 60
+# batches of stepped states the simulation thread may get ahead of the GUI
+WORKER_QUEUE_BATCHES = 8
+# the GUI keeps a packed copy of the state every CHECKPOINT_INTERVAL ticks to
+# seek back through a run; at CHECKPOINT_LIMIT copies the interval doubles
+CHECKPOINT_INTERVAL = 64
+CHECKPOINT_LIMIT = 512
+# finished trajectories kept on disk before the least recently used go
+TRAJECTORY_CACHE_BYTES = 256_000_000
+# runs held in memory and written together by the trajectory store
+STORE_CHUNK_RUNS = 64
+# virtual clotting assays stop the clock once fibrin (free and cross-linked)
+# reaches ASSAY_FIBRIN_THRESHOLD; a sample still fluid after ASSAY_TICK_LIMIT
+# ticks is reported as never clotting
+ASSAY_FIBRIN_THRESHOLD = 500
+ASSAY_TICK_LIMIT = 10000
+# normal plasma reads an INR of 1.0 and an aPTT of APTT_NORMAL_SECONDS; the
+# model's tissue factor is taken as the reference thromboplastin
+INR_ISI = 1.0
+APTT_NORMAL_SECONDS = 30
+# virtual patients stepped together in one batch by a cohort worker, and the
+# ticks between the states each cohort percentile is kept for
+COHORT_CHUNK_PATIENTS = 1024
+COHORT_STRIDE = 10
+# the local simulation service: default port, the longest run a client may
+# ask for, trajectory rows per streamed message, the finished results kept
+# in memory for repeat requests and the largest request body or WebSocket
+# message it reads
+SERVICE_PORT = 8765
+SERVICE_MAX_STEPS = 20000
+SERVICE_CHUNK_ROWS = 250
+SERVICE_MEMORY_BYTES = 64_000_000
+SERVICE_MAX_PAYLOAD = 1_000_000
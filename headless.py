@@ -0,0 +1,640 @@
+import argparse
+import csv
+import operator
+import sys
+import time
+
+from assays import measure
+from calibration import Calibration, Scenario, Targets, write_parameters
+from cohort import (
+    DEFAULT_SPECIES,
+    DEFAULT_THRESHOLDS,
+    DEFAULT_VARIATION,
+    PERCENTILES,
+    Cohort,
+    Distribution,
+    Threshold,
+    run_cohort,
+)
+from constants import (
+    COHORT_CHUNK_PATIENTS,
+    COHORT_STRIDE,
+    TICKS_PER_SECOND,
+    disorders,
+    simulation_modes,
+)
+from instrumentation import ReactionProfiler
+from online_stats import OnlineStats
+from runner import (
+    build_simulation,
+    compare_backends,
+    run_simulation,
+    save_trajectory,
+    stream_simulation,
+    tick_times,
+)
+from sensitivity import DEFAULT_OUTPUTS, DEFAULT_STEP, analyse
+from simulation_variables import load_parameters
+from species import SPECIES
+from sweep import build_jobs, run_sweep, save_sweep, stream_sweep
+from trajectory_cache import TrajectoryCache
+
+DEFAULT_STEPS = 2000
+
+
+def parse_overrides(pairs):
+    overrides = {}
+    for pair in pairs:
+        name, _, value = pair.partition("=")
+        if not value:
+            raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got '{pair}'")
+        overrides[name] = float(value)
+    return overrides
+
+
+def parse_grid(pairs):
+    grid = {}
+    for pair in pairs:
+        name, _, values = pair.partition("=")
+        if not values:
+            raise argparse.ArgumentTypeError(f"expected NAME=V1,V2,..., got '{pair}'")
+        grid[name] = [float(value) for value in values.split(",")]
+    return grid
+
+
+def parse_species(text):
+    if text is None:
+        return SPECIES
+    species = tuple(name.strip() for name in text.split(","))
+    unknown = [name for name in species if name not in SPECIES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown species: {', '.join(unknown)}")
+    return species
+
+
+def parse_condition(text, simulation):
+    # "NAME>VALUE" or "NAME<VALUE", checked against the live simulation
+    for symbol, compare in ((">", operator.gt), ("<", operator.lt)):
+        name, found, value = text.partition(symbol)
+        if found:
+            if name not in SPECIES:
+                raise argparse.ArgumentTypeError(f"unknown species '{name}'")
+            threshold = float(value)
+            return lambda seconds, values: compare(getattr(simulation, name), threshold)
+    raise argparse.ArgumentTypeError(f"expected NAME>VALUE or NAME<VALUE, got '{text}'")
+
+
+def parse_shares(pairs):
+    # "NAME" or "NAME=SHARE"; a disorder without a share counts as 1
+    shares = []
+    for pair in pairs or ["None"]:
+        name, _, share = pair.partition("=")
+        if name not in disorders:
+            raise argparse.ArgumentTypeError(f"unknown disorder '{name}'")
+        shares.append((name, float(share) if share else 1.0))
+    return tuple(shares)
+
+
+def parse_variation(pairs, defaults=True):
+    variation = dict(DEFAULT_VARIATION) if defaults else {}
+    for pair in pairs:
+        name, _, text = pair.partition("=")
+        if not text:
+            raise argparse.ArgumentTypeError(f"expected NAME=KIND:CV, got '{pair}'")
+        variation[name] = Distribution.parse(text)
+    return tuple(variation.items())
+
+
+def add_scenario_arguments(parser):
+    parser.add_argument("--preset", default="None", choices=simulation_modes)
+    parser.add_argument("--disorder", default="None", choices=disorders)
+    parser.add_argument("--steps", type=int, default=DEFAULT_STEPS)
+    parser.add_argument(
+        "--set",
+        dest="overrides",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="override a starting species amount",
+    )
+
+
+def add_profile_arguments(parser):
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="count and time every reaction, then summarise on stderr",
+    )
+    parser.add_argument(
+        "--profile-output", metavar="CSV", help="write the per-reaction counters here"
+    )
+
+
+def start_profile(args, simulation):
+    if args.profile or args.profile_output:
+        return ReactionProfiler.attach(simulation)
+    return None
+
+
+def report_profile(args, profiler):
+    if profiler is None:
+        return
+    print(profiler.format_table(), file=sys.stderr)
+    print(file=sys.stderr)
+    print(profiler.format_flame(), file=sys.stderr)
+    if args.profile_output:
+        profiler.write_csv(args.profile_output)
+
+
+def run_command(args):
+    overrides = parse_overrides(args.overrides)
+    simulation = build_simulation(args.preset, args.disorder, overrides)
+    start_tick = simulation.current_time
+    species = parse_species(args.species)
+    profiler = start_profile(args, simulation)
+    if profiler is not None and args.backend != "discrete":
+        raise ValueError("profiling covers the discrete backend only")
+    if args.no_cache or profiler is not None:
+        trajectory = run_simulation(simulation, args.steps, species, args.backend)
+    else:
+        cache = TrajectoryCache()
+        trajectory = cache.run(simulation, args.steps, species, args.backend)
+        if cache.hits:
+            print(f"loaded from the trajectory cache in {cache.directory}")
+    save_trajectory(
+        args.output,
+        tick_times(start_tick, args.steps),
+        species,
+        trajectory,
+        metadata={
+            "preset": args.preset,
+            "disorder": args.disorder,
+            "steps": args.steps,
+            "backend": args.backend,
+            "overrides": overrides,
+        },
+    )
+    print(f"wrote {args.steps} steps of {len(species)} species to {args.output}")
+    report_profile(args, profiler)
+
+
+def stream_command(args):
+    overrides = parse_overrides(args.overrides)
+    simulation = build_simulation(args.preset, args.disorder, overrides)
+    species = parse_species(args.species)
+    until = parse_condition(args.until, simulation) if args.until else None
+    profiler = start_profile(args, simulation)
+    stream = stream_simulation(
+        simulation, args.steps or None, species, args.stride, until
+    )
+    stats = OnlineStats(len(species))
+    output = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        writer = csv.writer(output)
+        writer.writerow(("time", *species))
+        for seconds, values in stream:
+            writer.writerow((seconds, *values))
+            stats.update(values)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"{stats.count} samples, stopped at {seconds} seconds", file=sys.stderr)
+    print(
+        f"{'species':<22}{'mean':>14}{'std':>14}{'min':>14}{'max':>14}", file=sys.stderr
+    )
+    for index, name in enumerate(species):
+        print(
+            f"{name:<22}{stats.mean[index]:>14.2f}{stats.std[index]:>14.2f}"
+            f"{stats.minimum[index]:>14.2f}{stats.maximum[index]:>14.2f}",
+            file=sys.stderr,
+        )
+    report_profile(args, profiler)
+
+
+def sweep_command(args):
+    jobs = build_jobs(args.presets, args.disorders, parse_grid(args.grid))
+    species = parse_species(args.species)
+    if args.output.lower().endswith(".npz"):
+        trajectories, job_seconds, elapsed = run_sweep(
+            jobs, args.steps, species, args.workers, progress=not args.quiet
+        )
+        save_sweep(args.output, jobs, args.steps, species, trajectories, job_seconds)
+    else:
+        job_seconds, elapsed = stream_sweep(
+            args.output,
+            jobs,
+            args.steps,
+            species,
+            args.workers,
+            progress=not args.quiet,
+            compress=args.compress,
+        )
+    print(
+        f"{len(jobs)} jobs in {elapsed:.2f}s ({len(jobs) / elapsed:.1f} jobs/sec), "
+        f"mean job {job_seconds.mean():.3f}s, "
+        f"parallel speed-up {job_seconds.sum() / elapsed:.1f}x"
+    )
+    print(f"wrote {args.output}")
+
+
+def compare_command(args):
+    species = parse_species(args.species)
+    report = compare_backends(args.preset, args.disorder, args.steps, species)
+    print(f"{args.preset} / {args.disorder}, {args.steps} ticks")
+    print(
+        f"discrete: {report['discrete_seconds'] * 1000:8.1f} ms "
+        f"({args.steps} fixed ticks)"
+    )
+    print(
+        f"ode:      {report['ode_seconds'] * 1000:8.1f} ms "
+        f"({report['ode_accepted_steps']} accepted, "
+        f"{report['ode_rejected_steps']} rejected steps, "
+        f"{report['ode_rate_evaluations']} rate evaluations)"
+    )
+    print(f"{'species':<22}{'discrete':>14}{'ode':>14}{'max dev':>14}{'rel dev':>10}")
+    for name, row in report["species"].items():
+        print(
+            f"{name:<22}{row['discrete_final']:>14.2f}{row['ode_final']:>14.2f}"
+            f"{row['max_deviation']:>14.2f}{row['relative_deviation']:>10.2%}"
+        )
+
+
+def assay_command(args):
+    overrides = parse_overrides(args.overrides)
+    simulations = [
+        build_simulation(args.preset, disorder, overrides)
+        for disorder in args.disorders
+    ]
+    print(f"{'disorder':<28}{'PT (s)':>10}{'INR':>8}{'aPTT (s)':>10}")
+    for disorder, result in zip(args.disorders, measure(simulations)):
+        print(
+            f"{disorder:<28}{result.pt_seconds:>10.1f}{result.inr:>8.2f}"
+            f"{result.aptt:>10.1f}"
+        )
+
+
+def sensitivity_command(args):
+    overrides = parse_overrides(args.overrides)
+    simulation = build_simulation(args.preset, args.disorder, overrides)
+    outputs = tuple(name.strip() for name in args.outputs.split(","))
+    start = time.perf_counter()
+    result = analyse(simulation, args.steps, outputs, args.step)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{len(result.parameters)} parameters, {2 * len(result.parameters) + 1} "
+        f"runs of {args.steps} ticks in {elapsed:.2f}s"
+    )
+    print(result.format_table(args.top))
+    if args.output:
+        result.write_csv(args.output)
+        print(f"wrote {args.output}")
+
+
+def cohort_command(args):
+    cohort = Cohort(
+        mode=args.preset,
+        disorders=parse_shares(args.disorders),
+        variation=parse_variation(args.vary, not args.no_default_variation),
+        steps=args.steps,
+        species=parse_species(args.species),
+        stride=args.stride,
+        thresholds=tuple(
+            Threshold.parse(text) for text in args.threshold or DEFAULT_THRESHOLDS
+        ),
+    )
+    start = time.perf_counter()
+    summary = run_cohort(
+        cohort,
+        args.patients,
+        chunk=args.chunk,
+        workers=args.workers,
+        seed=args.seed,
+        progress=not args.quiet,
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"{summary.patients} patients in {elapsed:.2f}s "
+        f"({summary.patients / elapsed:.0f} patients/sec, "
+        f"parallel speed-up {summary.seconds / elapsed:.1f}x)"
+    )
+    print(
+        ", ".join(f"{name}: {count}" for name, count in summary.disorder_counts.items())
+    )
+    final = summary.percentiles()[:, -1]
+    print(f"at {cohort.steps / TICKS_PER_SECOND:g} seconds")
+    print(f"{'species':<22}" + "".join(f"{f'p{p}':>12}" for p in PERCENTILES))
+    for index, name in enumerate(cohort.species):
+        print(f"{name:<22}" + "".join(f"{value:>12.2f}" for value in final[:, index]))
+    print(
+        f"{'time to':<28}" + "".join(f"{f'p{p}':>8}" for p in PERCENTILES) + "   never"
+    )
+    for number, threshold in enumerate(cohort.thresholds):
+        times = [summary.time_percentile(number, p) for p in PERCENTILES]
+        print(
+            f"{str(threshold):<28}"
+            + "".join(f"{value:>8g}" for value in times)
+            + f"{summary.never[number]:>8}"
+        )
+    if args.output:
+        summary.save(args.output)
+        print(f"wrote {args.output}")
+
+
+def calibrate_command(args):
+    targets = Targets.load(args.targets)
+    overrides = parse_overrides(args.overrides)
+    calibration = Calibration(
+        targets,
+        args.fit,
+        Scenario(args.preset, args.disorder, tuple(overrides.items())),
+        population=args.population,
+        spread=args.spread,
+        seed=args.seed,
+        workers=args.workers,
+        checkpoint=args.checkpoint,
+    )
+    start = time.perf_counter()
+
+    def report(calibration):
+        print(
+            f"generation {calibration.generation}: best error "
+            f"{calibration.best_error:.5f} "
+            f"({time.perf_counter() - start:.1f}s)"
+        )
+
+    best = calibration.run(args.generations, args.tolerance, progress=report)
+    print(f"fitted {len(args.fit)} constants, error {calibration.best_error:.5f}")
+    for name, fields in best.items():
+        for field, value in fields.items():
+            print(f"  {name}.{field} = {value:.6g}")
+    write_parameters(args.output, best, calibration.best_error, args.fit)
+    print(f"wrote {args.output}; load it with --parameters or $COAGULATION_PARAMETERS")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m headless",
+        description="Run the coagulation simulation without the GUI",
+    )
+    parser.add_argument(
+        "--parameters",
+        metavar="JSON",
+        help="reaction constants written by calibrate "
+        "(default: $COAGULATION_PARAMETERS, if set)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run one scenario")
+    add_scenario_arguments(run_parser)
+    run_parser.add_argument(
+        "--species", help="comma separated species to record (default: all)"
+    )
+    run_parser.add_argument("--output", default="trajectory.npz")
+    run_parser.add_argument(
+        "--backend",
+        default="discrete",
+        choices=("discrete", "ode"),
+        help="fixed half-second ticks or the adaptive-step ODE solver",
+    )
+    run_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always recompute instead of reusing a stored trajectory",
+    )
+    add_profile_arguments(run_parser)
+    run_parser.set_defaults(handler=run_command)
+
+    stream_parser = commands.add_parser(
+        "stream",
+        help="write samples as CSV while the run goes, then summarise",
+        description="Write samples as CSV as they are produced, then print "
+        "summary statistics to stderr. --steps 0 runs until nothing changes.",
+    )
+    add_scenario_arguments(stream_parser)
+    stream_parser.add_argument(
+        "--species", help="comma separated species to record (default: all)"
+    )
+    stream_parser.add_argument(
+        "--stride", type=int, default=1, help="ticks between samples"
+    )
+    stream_parser.add_argument(
+        "--until",
+        metavar="NAME>VALUE",
+        help="stop at the first sample where a species crosses a threshold",
+    )
+    stream_parser.add_argument(
+        "--output", default="-", help="CSV file to write (default: stdout)"
+    )
+    add_profile_arguments(stream_parser)
+    stream_parser.set_defaults(handler=stream_command)
+
+    sweep_parser = commands.add_parser(
+        "sweep", help="run every preset x disorder (x grid) combination"
+    )
+    sweep_parser.add_argument(
+        "--presets", nargs="+", default=simulation_modes, choices=simulation_modes
+    )
+    sweep_parser.add_argument(
+        "--disorders", nargs="+", default=disorders, choices=disorders
+    )
+    sweep_parser.add_argument(
+        "--grid",
+        action="append",
+        default=[],
+        metavar="NAME=V1,V2,...",
+        help="starting amounts of a species to cross with every combination",
+    )
+    sweep_parser.add_argument("--steps", type=int, default=DEFAULT_STEPS)
+    sweep_parser.add_argument(
+        "--workers", type=int, help="worker processes (default: all cores)"
+    )
+    sweep_parser.add_argument(
+        "--species", help="comma separated species to record (default: all)"
+    )
+    sweep_parser.add_argument(
+        "--output",
+        default="sweep.npz",
+        help="an .npz file, or a directory to stream a trajectory store into",
+    )
+    sweep_parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="compress trajectory store chunks (they can then not be memory-mapped)",
+    )
+    sweep_parser.add_argument("--quiet", action="store_true", help="no progress bar")
+    sweep_parser.set_defaults(handler=sweep_command)
+
+    assay_parser = commands.add_parser(
+        "assay", help="measure PT/INR and aPTT for each disorder in one batch"
+    )
+    assay_parser.add_argument("--preset", default="None", choices=simulation_modes)
+    assay_parser.add_argument(
+        "--disorders", nargs="+", default=disorders, choices=disorders
+    )
+    assay_parser.add_argument(
+        "--set",
+        dest="overrides",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="override a starting species amount",
+    )
+    assay_parser.set_defaults(handler=assay_command)
+
+    sensitivity_parser = commands.add_parser(
+        "sensitivity",
+        help="normalised sensitivity of outputs to every reaction constant",
+        description="Scale every reaction constant and starting amount up and "
+        "down by --step, run all of them as one batch and report "
+        "(dy/y)/(dp/p) for each output, largest effects first.",
+    )
+    add_scenario_arguments(sensitivity_parser)
+    sensitivity_parser.add_argument(
+        "--outputs",
+        default=",".join(DEFAULT_OUTPUTS),
+        help="comma separated clot_time, peak:NAME, peak_time:NAME or final:NAME",
+    )
+    sensitivity_parser.add_argument(
+        "--step", type=float, default=DEFAULT_STEP, help="relative perturbation"
+    )
+    sensitivity_parser.add_argument(
+        "--top", type=int, default=20, help="parameters to print (default: 20)"
+    )
+    sensitivity_parser.add_argument(
+        "--output", metavar="CSV", help="write every coefficient here"
+    )
+    sensitivity_parser.set_defaults(handler=sensitivity_command)
+
+    cohort_parser = commands.add_parser(
+        "cohort",
+        help="run a Monte Carlo cohort of virtual patients, keeping statistics",
+        description="Sample starting amounts around the preset and disorders, "
+        "run the patients in batched chunks across processes and keep only "
+        "per-tick percentile sketches and time-to-threshold histograms.",
+    )
+    cohort_parser.add_argument(
+        "--preset", default="Haemostasis (Pro-thrombotic)", choices=simulation_modes
+    )
+    cohort_parser.add_argument(
+        "--disorder",
+        dest="disorders",
+        action="append",
+        metavar="NAME[=SHARE]",
+        help="a disorder and its share of the cohort; repeat to mix",
+    )
+    cohort_parser.add_argument(
+        "--vary",
+        action="append",
+        default=[],
+        metavar="NAME=KIND:CV",
+        help="spread of a starting amount, e.g. factor8=lognormal:0.3",
+    )
+    cohort_parser.add_argument(
+        "--no-default-variation",
+        action="store_true",
+        help="vary only the species given with --vary",
+    )
+    cohort_parser.add_argument("--patients", type=int, default=10_000)
+    cohort_parser.add_argument("--steps", type=int, default=DEFAULT_STEPS)
+    cohort_parser.add_argument(
+        "--species",
+        default=",".join(DEFAULT_SPECIES),
+        help="comma separated species to keep percentiles for",
+    )
+    cohort_parser.add_argument(
+        "--stride", type=int, default=COHORT_STRIDE, help="ticks between kept states"
+    )
+    cohort_parser.add_argument(
+        "--threshold",
+        action="append",
+        metavar="NAME>VALUE",
+        help="record the time each patient first crosses this; repeatable",
+    )
+    cohort_parser.add_argument(
+        "--chunk", type=int, default=COHORT_CHUNK_PATIENTS, help="patients per batch"
+    )
+    cohort_parser.add_argument(
+        "--workers", type=int, help="worker processes (default: all cores)"
+    )
+    cohort_parser.add_argument("--seed", type=int, default=0)
+    cohort_parser.add_argument("--output", metavar="NPZ", help="save the summary")
+    cohort_parser.add_argument("--quiet", action="store_true", help="no progress bar")
+    cohort_parser.set_defaults(handler=cohort_command)
+
+    calibrate_parser = commands.add_parser(
+        "calibrate",
+        help="fit reaction constants to target curves",
+        description="Fit the chosen constants to reference curves (a CSV with "
+        "a time column in seconds and one column per species) by differential "
+        "evolution, running each generation as one batch.",
+    )
+    calibrate_parser.add_argument("targets", help="CSV of target curves")
+    calibrate_parser.add_argument(
+        "--preset", default="Haemostasis (Pro-thrombotic)", choices=simulation_modes
+    )
+    calibrate_parser.add_argument("--disorder", default="None", choices=disorders)
+    calibrate_parser.add_argument(
+        "--set",
+        dest="overrides",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="override a starting species amount",
+    )
+    calibrate_parser.add_argument(
+        "--fit",
+        action="append",
+        required=True,
+        metavar="REACTION.FIELD",
+        help="a constant to fit, e.g. convert_prothrombin.divisor; repeatable",
+    )
+    calibrate_parser.add_argument("--generations", type=int, default=50)
+    calibrate_parser.add_argument(
+        "--population", type=int, help="candidates per generation"
+    )
+    calibrate_parser.add_argument(
+        "--spread",
+        type=float,
+        default=10.0,
+        help="search from value / spread to value * spread",
+    )
+    calibrate_parser.add_argument(
+        "--tolerance", type=float, default=0.0, help="stop once the error is this low"
+    )
+    calibrate_parser.add_argument("--seed", type=int, default=0)
+    calibrate_parser.add_argument(
+        "--workers", type=int, help="worker processes (default: all cores)"
+    )
+    calibrate_parser.add_argument(
+        "--checkpoint",
+        metavar="JSON",
+        help="save progress here each generation and resume from it",
+    )
+    calibrate_parser.add_argument("--output", default="parameters.json")
+    calibrate_parser.set_defaults(handler=calibrate_command)
+
+    compare_parser = commands.add_parser(
+        "compare", help="compare the discrete and ODE backends on one scenario"
+    )
+    add_scenario_arguments(compare_parser)
+    compare_parser.add_argument(
+        "--species",
+        default="thrombin,fibrin,cross_linked_fibrin,factor10a,factor5a",
+        help="comma separated species to compare",
+    )
+    compare_parser.set_defaults(handler=compare_command)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        load_parameters(args.parameters)
+        args.handler(args)
+    except (ValueError, argparse.ArgumentTypeError) as error:
+        parser.error(str(error))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+import numpy as np
+
+from constants import HISTORY_CAPACITY, HISTORY_CHUNK
+
+
+class HistoryBuffer:
+    # rows are written into a block twice the capacity so the newest
+    # `capacity` rows are always one contiguous slice; when the block fills,
+    # the live rows are moved back to the front (amortised O(1) per append).
+    # With a chunk size the block starts small and grows by that many rows.
+    def __init__(self, columns=1, capacity=HISTORY_CAPACITY, dtype=float, chunk=None):
+        if capacity < 1:
+            raise ValueError("history capacity must be at least 1")
+        self.capacity = capacity
+        self.chunk = chunk
+        rows = 2 * capacity if chunk is None else min(chunk, 2 * capacity)
+        self._data = np.zeros((rows, columns), dtype=dtype)
+        self._start = 0
+        self._end = 0
+        # rows appended since the last clear, including those rolled off
+        self.total = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def columns(self) -> int:
+        return self._data.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
+
+    @property
+    def first_index(self) -> int:
+        # position of the oldest kept row among all rows appended
+        return self.total - len(self)
+
+    def append(self, row):
+        index = self._next_row()
+        self._data[index] = row
+
+    def _next_row(self) -> int:
+        if self._end == len(self._data):
+            if len(self._data) < 2 * self.capacity:
+                self._grow()
+            else:
+                self._roll()
+        row = self._end
+        self._end += 1
+        self.total += 1
+        if self._end - self._start > self.capacity:
+            self._start += 1
+        return row
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=self._data.dtype).reshape(-1, self.columns)
+        self.total += len(rows)
+        if len(rows) >= self.capacity:
+            rows = rows[-self.capacity :]
+            self._start = self._end = 0
+        while len(rows):
+            if self._end == len(self._data):
+                if len(self._data) < 2 * self.capacity:
+                    self._grow()
+                else:
+                    self._roll()
+            taken = min(len(self._data) - self._end, len(rows))
+            self._data[self._end : self._end + taken] = rows[:taken]
+            self._end += taken
+            self._start = max(self._start, self._end - self.capacity)
+            rows = rows[taken:]
+
+    def _grow(self):
+        rows = min(len(self._data) + self.chunk, 2 * self.capacity)
+        grown = np.zeros((rows, self.columns), dtype=self._data.dtype)
+        grown[: self._end] = self._data[: self._end]
+        self._data = grown
+
+    def _roll(self):
+        kept = self._end - self._start
+        self._data[:kept] = self._data[self._start : self._end]
+        self._start = 0
+        self._end = kept
+
+    def truncate(self, total):
+        # drops every row after the first `total` ever appended
+        if total >= self.total:
+            return
+        if total < self.first_index:
+            self.clear()
+            self.total = total
+            return
+        self._end -= self.total - total
+        self.total = total
+
+    def clear(self):
+        self._start = 0
+        self._end = 0
+        self.total = 0
+
+    def view(self) -> np.ndarray:
+        return self._data[self._start : self._end]
+
+    def column(self, index) -> np.ndarray:
+        return self._data[self._start : self._end, index]
+
+
+class TrajectoryHistory(HistoryBuffer):
+    # a time column followed by one float32 column per named variable, so
+    # any variable's history can be plotted without re-running
+    def __init__(self, names, capacity=HISTORY_CAPACITY, chunk=HISTORY_CHUNK):
+        super().__init__(
+            columns=len(names) + 1, capacity=capacity, dtype=np.float32, chunk=chunk
+        )
+        self.names = tuple(names)
+        self._column_index = {name: index + 1 for index, name in enumerate(names)}
+
+    def record(self, time, values):
+        index = self._next_row()
+        row = self._data[index]
+        row[0] = time
+        row[1:] = values
+
+    def hold(self, times, values):
+        # one row per time; values is either one row shared by all of them
+        # or a row for each
+        rows = np.empty((len(times), self.columns), dtype=self._data.dtype)
+        rows[:, 0] = times
+        rows[:, 1:] = values
+        self.extend(rows)
+
+    def truncate_after(self, time):
+        kept = np.searchsorted(self.times(), self._data.dtype.type(time), side="right")
+        self.truncate(self.first_index + int(kept))
+
+    def times(self) -> np.ndarray:
+        return self.column(0)
+
+    def column_index(self, name) -> int:
+        return self._column_index[name]
+
+    def series(self, name) -> np.ndarray:
+        return self.column(self._column_index[name])
@@ -0,0 +1,117 @@
+import csv
+import time
+
+import numpy as np
+
+from reactions import step
+
+# columns of ReactionProfiler.rows()
+PROFILE_COLUMNS = ("reaction", "calls", "skipped", "seconds", "flux")
+
+
+class ReactionProfiler:
+    # per-reaction counters for SimulationVariables.time_passes. A simulation
+    # only pays for this while its `profiler` attribute is set; otherwise
+    # time_passes runs the plain reaction table step.
+    def __init__(self, reactions):
+        self.names = tuple(reaction.name for reaction in reactions)
+        self.ticks = 0
+        self.calls = np.zeros(len(self.names), dtype=np.int64)
+        # calls where the source was below the 0.005 reaction threshold
+        self.skipped = np.zeros(len(self.names), dtype=np.int64)
+        self.seconds = np.zeros(len(self.names))
+        # total amount each reaction moved from source to destination
+        self.flux = np.zeros(len(self.names))
+
+    @classmethod
+    def attach(cls, simulation):
+        simulation.profiler = cls(simulation.reactions)
+        return simulation.profiler
+
+    @staticmethod
+    def detach(simulation):
+        profiler = simulation.profiler
+        simulation.profiler = None
+        return profiler
+
+    def step(self, values, table) -> float:
+        # reactions.step one reaction at a time, timing and counting each
+        self.ticks += 1
+        moved = 0.0
+        clock = time.perf_counter
+        for index, reaction in enumerate(table):
+            self.calls[index] += 1
+            if values[reaction[0]] < 0.005:
+                self.skipped[index] += 1
+                continue
+            start = clock()
+            change = step(values, (reaction,))
+            self.seconds[index] += clock() - start
+            self.flux[index] += change
+            moved += change
+        return moved
+
+    def reset(self):
+        self.ticks = 0
+        for counter in (self.calls, self.skipped, self.seconds, self.flux):
+            counter[:] = 0
+
+    def rows(self) -> list:
+        # one tuple per reaction in PROFILE_COLUMNS order, costliest first
+        order = np.argsort(-self.seconds, kind="stable")
+        return [
+            (
+                self.names[index],
+                int(self.calls[index]),
+                int(self.skipped[index]),
+                float(self.seconds[index]),
+                float(self.flux[index]),
+            )
+            for index in order
+        ]
+
+    def write_csv(self, path):
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(PROFILE_COLUMNS)
+            writer.writerows(self.rows())
+
+    @property
+    def name_width(self) -> int:
+        # the reaction column fits the longest name plus a gap
+        return max(len("reaction"), *map(len, self.names)) + 2
+
+    def format_table(self) -> str:
+        width = self.name_width
+        lines = [
+            f"{'reaction':<{width}}{'calls':>10}{'skipped':>10}{'us/call':>10}"
+            f"{'total ms':>10}{'flux':>16}"
+        ]
+        for name, calls, skipped, seconds, flux in self.rows():
+            active = calls - skipped
+            per_call = seconds / active * 1e6 if active else 0.0
+            lines.append(
+                f"{name:<{width}}{calls:>10}{skipped:>10}{per_call:>10.2f}"
+                f"{seconds * 1000:>10.2f}{flux:>16.2f}"
+            )
+        return "\n".join(lines)
+
+    def format_flame(self, width=40) -> str:
+        # time_passes at the root and each reaction's share of it as a bar,
+        # the text counterpart of one level of a flame graph
+        total = self.seconds.sum()
+        lines = [f"time_passes  {self.ticks} ticks  {total * 1000:.2f} ms"]
+        name_width = self.name_width
+        for name, _, _, seconds, _ in self.rows():
+            share = seconds / total if total else 0.0
+            bar = "#" * round(share * width)
+            lines.append(f"  {name:<{name_width}}{share:>7.1%} {bar}")
+        return "\n".join(lines)
+
+    def collapsed(self) -> str:
+        # "time_passes;<reaction> <microseconds>" lines, the collapsed stack
+        # format flame graph tools read
+        return "\n".join(
+            f"time_passes;{name} {round(seconds * 1e6)}"
+            for name, _, _, seconds, _ in self.rows()
+        )
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from constants import SERVICE_PORT, disorders, simulation_modes
+from server import OPCODE_CLOSE, SimulationService, encode_frame, read_frame
+
+
+def scenarios(distinct, steps, unique, generator):
+    # an endless stream of run requests drawn from `distinct` scenarios, so
+    # repeats exercise in-flight sharing and the result cache; with unique
+    # every request gets its own factor8 level and has to be computed
+    pool = [
+        {
+            "preset": generator.choice(simulation_modes[1:]),
+            "disorder": generator.choice(disorders),
+            "steps": steps,
+            "species": ["thrombin", "fibrin", "cross_linked_fibrin"],
+        }
+        for _ in range(distinct)
+    ]
+    count = 0
+    while True:
+        request = dict(generator.choice(pool))
+        if unique:
+            count += 1
+            request["overrides"] = {"factor8": 500 + count / 1000}
+        yield request
+
+
+async def read_head(reader):
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    status = int(head.split(" ", 2)[1])
+    headers = {}
+    for line in head.split("\r\n")[1:]:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    return status, headers
+
+
+async def http_client(host, port, requests, results):
+    # one keep-alive connection posting requests one after another
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for request in requests:
+            body = json.dumps(request).encode()
+            start = time.perf_counter()
+            writer.write(
+                b"POST /run HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json"
+                b"\r\nContent-Length: %d\r\n\r\n%s" % (host.encode(), len(body), body)
+            )
+            await writer.drain()
+            status, headers = await read_head(reader)
+            received = 0
+            if headers.get("transfer-encoding") == "chunked":
+                last = b""
+                while True:
+                    size = int((await reader.readline()).strip(), 16)
+                    if not size:
+                        await reader.readexactly(2)
+                        break
+                    last = await reader.readexactly(size)
+                    received += size
+                    await reader.readexactly(2)
+                ok = status == 200 and json.loads(last).get("done")
+            else:
+                received = len(await reader.readexactly(int(headers["content-length"])))
+                ok = False
+            results.append((time.perf_counter() - start, received, bool(ok)))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def websocket_client(host, port, requests, results):
+    # one WebSocket carrying requests one after another
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16))
+    writer.write(
+        b"GET /ws HTTP/1.1\r\nHost: %s\r\nUpgrade: websocket\r\nConnection: Upgrade"
+        b"\r\nSec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        % (host.encode(), key)
+    )
+    await writer.drain()
+    status, _ = await read_head(reader)
+    if status != 101:
+        raise ConnectionError(f"WebSocket upgrade refused with {status}")
+    try:
+        for request in requests:
+            start = time.perf_counter()
+            writer.write(encode_frame(json.dumps(request).encode(), mask=os.urandom(4)))
+            await writer.drain()
+            received = 0
+            while True:
+                _, payload = await read_frame(reader)
+                received += len(payload)
+                message = json.loads(payload)
+                if "error" in message or message.get("done"):
+                    break
+            results.append((time.perf_counter() - start, received, "done" in message))
+        # a closing handshake, so the server is done with the socket too
+        writer.write(encode_frame(b"\x03\xe8", OPCODE_CLOSE, mask=os.urandom(4)))
+        await writer.drain()
+        while (await read_frame(reader))[0] != OPCODE_CLOSE:
+            pass
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def fetch_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"GET /stats HTTP/1.1\r\nHost: %s\r\n\r\n" % host.encode())
+    await writer.drain()
+    _, headers = await read_head(reader)
+    stats = json.loads(await reader.readexactly(int(headers["content-length"])))
+    writer.close()
+    await writer.wait_closed()
+    return stats
+
+
+async def load_test(
+    host, port, clients, requests, protocol, distinct, steps, unique, seed
+):
+    generator = random.Random(seed)
+    stream = scenarios(distinct, steps, unique, generator)
+    per_client = [
+        [
+            next(stream)
+            for _ in range(requests // clients + (index < requests % clients))
+        ]
+        for index in range(clients)
+    ]
+    client = websocket_client if protocol == "ws" else http_client
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, batch, results) for batch in per_client))
+    elapsed = time.perf_counter() - start
+    latencies = np.array([latency for latency, _, _ in results])
+    return {
+        "protocol": protocol,
+        "clients": clients,
+        "requests": len(results),
+        "failed": sum(not ok for _, _, ok in results),
+        "seconds": elapsed,
+        "requests_per_second": len(results) / elapsed,
+        "megabytes": sum(size for _, size, _ in results) / 1_000_000,
+        "latency_ms": {
+            name: float(np.percentile(latencies, q) * 1000)
+            for name, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))
+        },
+        "server": await fetch_stats(host, port),
+    }
+
+
+async def run(args):
+    if not args.serve:
+        return await load_test(
+            args.host,
+            args.port,
+            args.clients,
+            args.requests,
+            args.protocol,
+            args.distinct,
+            args.steps,
+            args.unique,
+            args.seed,
+        )
+    # a service in this process on a free port, with nothing cached on disk
+    service = SimulationService(args.workers)
+    server = await asyncio.start_server(service.handle, args.host, 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        return await load_test(
+            args.host,
+            port,
+            args.clients,
+            args.requests,
+            args.protocol,
+            args.distinct,
+            args.steps,
+            args.unique,
+            args.seed,
+        )
+    finally:
+        server.close()
+        await server.wait_closed()
+        # the clients have hung up; let their handlers see it and finish
+        await asyncio.wait_for(asyncio.gather(*service.connections), 5)
+        service.close()
+
+
+def print_report(report):
+    print(
+        f"{report['requests']} requests from {report['clients']} {report['protocol']} "
+        f"clients in {report['seconds']:.2f}s: "
+        f"{report['requests_per_second']:.1f} requests/sec, "
+        f"{report['megabytes']:.1f} MB, {report['failed']} failed"
+    )
+    print(
+        "latency "
+        + ", ".join(
+            f"{name} {value:.1f} ms" for name, value in report["latency_ms"].items()
+        )
+    )
+    server = report["server"]
+    print(
+        f"server: {server['computed']} computed, {server['disk_hits']} from disk, "
+        f"{server['memory_hits']} from memory, {server['shared']} shared in flight, "
+        f"{server['errors']} errors"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m load_test",
+        description="Many concurrent clients against the simulation service",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="start a service in this process instead of using a running one",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="worker processes for --serve (default: all)"
+    )
+    parser.add_argument("--clients", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=400, help="in total")
+    parser.add_argument("--protocol", choices=("http", "ws"), default="ws")
+    parser.add_argument(
+        "--distinct", type=int, default=20, help="different scenarios to draw from"
+    )
+    parser.add_argument(
+        "--unique", action="store_true", help="make every request a new computation"
+    )
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", metavar="JSON", help="write the report here")
+    args = parser.parse_args(argv)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import numpy as np
+
+from constants import LOD_FACTOR, LOD_LEVELS
+from history import HistoryBuffer
+
+
+class LevelOfDetail:
+    # a min/max pyramid over every column of a history: bucket k of level n
+    # holds the minimum and maximum of history rows [k * f**n, (k + 1) * f**n)
+    # where f is the factor. Levels are only extended with newly completed
+    # buckets, so keeping them current costs O(new rows).
+    def __init__(self, history, factor=LOD_FACTOR, levels=LOD_LEVELS):
+        self.history = history
+        self.factor = factor
+        self.levels = []
+        for level in range(1, levels + 1):
+            capacity = history.capacity // factor**level + 2
+            self.levels.append(
+                (
+                    HistoryBuffer(history.columns, capacity, np.float32),
+                    HistoryBuffer(history.columns, capacity, np.float32),
+                )
+            )
+
+    def clear(self):
+        for minimums, maximums in self.levels:
+            minimums.clear()
+            maximums.clear()
+
+    def update(self):
+        if self.levels and self.levels[0][0].total * self.factor > self.history.total:
+            # the history has been cleared since the last update
+            self.clear()
+        below = self.history, self.history
+        for level in self.levels:
+            self._fold(*below, *level)
+            below = level
+
+    def _fold(self, source_minimums, source_maximums, minimums, maximums):
+        # summarise complete buckets of the level below not yet in this level
+        first = max(
+            minimums.total * self.factor,
+            _aligned(source_minimums.first_index, self.factor),
+        )
+        last = source_minimums.total // self.factor * self.factor
+        if last <= first:
+            return
+        if first // self.factor != minimums.total:
+            # rows rolled off the level below before they were summarised
+            for buffer in (minimums, maximums):
+                buffer.clear()
+                buffer.total = first // self.factor
+        offset = source_minimums.first_index
+        shape = (-1, self.factor, self.history.columns)
+        rows = slice(first - offset, last - offset)
+        minimums.extend(source_minimums.view()[rows].reshape(shape).min(axis=1))
+        maximums.extend(source_maximums.view()[rows].reshape(shape).max(axis=1))
+
+    def select(self, column, start_time, end_time, points):
+        # (x, y) for one column between two times with about `points` buckets:
+        # raw rows when few enough are visible, else a min/max envelope
+        times = self.history.times()
+        # a key of the column's own dtype keeps searchsorted from copying it
+        start_time, end_time = times.dtype.type(start_time), times.dtype.type(end_time)
+        start = max(np.searchsorted(times, start_time, "left") - 1, 0)
+        end = min(np.searchsorted(times, end_time, "right") + 1, len(times))
+        if end - start <= 2 * points or not self.levels:
+            return times[start:end], self.history.column(column)[start:end]
+        level = 1
+        while level < len(self.levels) and (end - start) / self.factor**level > points:
+            level += 1
+        offset = self.history.first_index
+        pieces = self._envelope(level, column, start + offset, end + offset)
+        return (
+            np.concatenate([piece[0] for piece in pieces]),
+            np.concatenate([piece[1] for piece in pieces]),
+        )
+
+    def _envelope(self, level, column, first, last):
+        # pieces covering absolute history rows [first, last); whatever this
+        # level has not summarised yet comes from the level below
+        if level == 0 or first >= last:
+            offset = self.history.first_index
+            first = max(first, offset)
+            rows = self.history.view()[first - offset : last - offset]
+            return [(rows[:, 0], rows[:, column])]
+        minimums, maximums = self.levels[level - 1]
+        size = self.factor**level
+        first_bucket = max(first // size, minimums.first_index)
+        last_bucket = min(last // size, minimums.total)
+        if last_bucket <= first_bucket:
+            return self._envelope(level - 1, column, first, last)
+        buckets = slice(
+            first_bucket - minimums.first_index, last_bucket - minimums.first_index
+        )
+        low = minimums.view()[buckets]
+        high = maximums.view()[buckets]
+        x = np.empty(2 * len(low), dtype=np.float32)
+        y = np.empty(2 * len(low), dtype=np.float32)
+        x[0::2] = low[:, 0]
+        x[1::2] = high[:, 0]
+        y[0::2] = low[:, column]
+        y[1::2] = high[:, column]
+        return [(x, y)] + self._envelope(level - 1, column, last_bucket * size, last)
+
+
+def _aligned(index, factor):
+    return -(-index // factor) * factor
@@ -1,3 +1,7 @@
+import queue
+import time
+from contextlib import contextmanager
+
 import pyqtgraph as pg
 from constants import *
 
@@ -9,14 +13,18 @@ from PyQt5.QtWidgets import (
     QGridLayout,
     QMainWindow,
     QComboBox,
+    QSlider,
 )
 from PyQt5.QtGui import QIcon, QFont
 from PyQt5.QtCore import QTimer, Qt
-from simulation_variables import (
-    SimulationVariables,
-    line_1_y,
-    line_2_y,
-)
+import assays
+from history import TrajectoryHistory
+from instrumentation import ReactionProfiler
+from lod import LevelOfDetail
+from simulation_variables import FIELD_NAMES, SimulationVariables, load_parameters
+from simulation_worker import SimulationWorker
+from snapshots import CheckpointTimeline
+from trajectory_cache import TrajectoryCache
 
 sim_vars = SimulationVariables()
 boldFont = QFont()
@@ -24,15 +32,37 @@ boldFont.setBold(True)
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(
+        self, history_capacity=HISTORY_CAPACITY, checkpoint_limit=CHECKPOINT_LIMIT
+    ):
         super().__init__()
         self.timer = QTimer()
         self.time_limit = True
+        # time spent refreshing labels in the last update_ui_components call
+        self.ui_frame_seconds = 0.0
         self.line1_name = "cross_linked_fibrin"
         self.line2_name = "thrombin"
-        self.time_list_1 = []
-        self.time_list_2 = []
-        self.timer.timeout.connect(self.time_passes)
+        # every variable is recorded each tick; the plot lines show columns
+        self.history = TrajectoryHistory(FIELD_NAMES, capacity=history_capacity)
+        self.lod = LevelOfDetail(self.history)
+        # the plot shows the whole run until it is zoomed or panned, and again
+        # once its auto-range button is pressed
+        self.following = True
+        # checkpoints for seeking back through the run with the slider
+        self.timeline = CheckpointTimeline(limit=checkpoint_limit)
+        self.trajectory_cache = TrajectoryCache()
+        # the model runs on its own thread; the labels show the last state
+        # it handed over while it runs
+        self.engine = SimulationWorker(sim_vars, self.trajectory_cache)
+        self.engine.stopped.connect(self.run_finished)
+        self.state = sim_vars.field_values()
+        # the patient's own plasma, as their disorder and any added fibrinogen
+        # leave it; this is what the assays measure, since the running state
+        # has already clotted and the presets add to it
+        self.patient = SimulationVariables()
+        # default plasma already reads INR 1.0 and aPTT 30
+        self.assayed_values = self.patient._values.copy()
+        self.timer.timeout.connect(self.advance_frame)
         self.setStyleSheet(f"background-color: {CREAM};")
         self.setWindowIcon(QIcon("icon.jpg"))
         self.setWindowTitle("Coagulation Simulator")
@@ -45,6 +75,7 @@ class MainWindow(QMainWindow):
         self.main_window.setLayout(self.layout)
         self.setCentralWidget(self.main_window)
         self.update_ui_components()
+        self.engine.start()
         self.showMaximized()
 
     def setup_ui_components(self):
@@ -65,12 +96,7 @@ class MainWindow(QMainWindow):
         self.simulationModeCombo = self.create_widget(
             actions_row + 1,
             5,
-            options=(
-                "None",
-                "Haemostasis (Pro-thrombotic)",
-                "Haemostasis (Anti-thrombotic)",
-                "Fibrinolysis",
-            ),
+            options=simulation_modes,
             widget_type="COMBOBOX",
         )
         self.simulationModeCombo.setCurrentText("None")
@@ -91,14 +117,14 @@ class MainWindow(QMainWindow):
             disease_row + 4,
             5,
             widget_type="COMBOBOX",
-            options=sorted(sim_vars.__dict__),
+            options=sorted(FIELD_NAMES),
             colour=LIGHTRED,
         )
         self.line2Combo = self.create_widget(
             disease_row + 7,
             5,
             widget_type="COMBOBOX",
-            options=sorted(sim_vars.__dict__),
+            options=sorted(FIELD_NAMES),
             colour=LIGHTBLUE,
         )
         self.line1Combo.currentTextChanged.connect(self.change_line1_variable)
@@ -123,6 +149,7 @@ class MainWindow(QMainWindow):
         self.setup_anticoagulation()
         self.setup_fibrinolysis()
         self.set_up_plot()
+        self.setup_label_bindings()
         self.disorderBox.setCurrentText("None")
         self.line1Combo.setCurrentText(self.line1_name)
         self.line2Combo.setCurrentText(self.line2_name)
@@ -130,7 +157,7 @@ class MainWindow(QMainWindow):
     def change_line1_variable(self, text):
         self.line1_name = text
         self.line1.setData(name=text)
-        self.change_line_variable(1)
+        self.change_line_variable()
         self.legend.removeItem(self.line1)
         self.legend.removeItem(self.line2)
         self.legend.addItem(self.line1, text)
@@ -139,18 +166,11 @@ class MainWindow(QMainWindow):
     def change_line2_variable(self, text):
         self.line2_name = text
         self.line2.setData(name=text)
-        self.change_line_variable(2)
+        self.change_line_variable()
         self.legend.removeItem(self.line2)
         self.legend.addItem(self.line2, text)
 
-    def change_line_variable(self, line: int):
-        match line:
-            case 1:
-                line_1_y.clear()
-                self.time_list_1.clear()
-            case 2:
-                line_2_y.clear()
-                self.time_list_2.clear()
+    def change_line_variable(self):
         self.update_lines()
 
     def setup_time_functionality(self):
@@ -194,6 +214,15 @@ class MainWindow(QMainWindow):
         self.speedChoiceBox.currentIndexChanged.connect(self.new_speed)
         self.speedChoiceBox.setCurrentText("x 64")
         self.currentTimeLabel = self.create_widget(7, 5, widget_type="LABEL")
+        self.historyMemoryLabel = self.create_widget(8, 5, widget_type="LABEL")
+        self.uiFrameTimeLabel = self.create_widget(11, 5, widget_type="LABEL")
+        self.profileButton = self.create_widget(
+            21,
+            5,
+            colour=ROYALBLUE,
+            action=self.toggle_profiling,
+            widget_type="BUTTON",
+        )
 
     def setup_fibrinolysis(self):
         self.fibrinolysisLabel = self.create_widget(
@@ -502,42 +531,168 @@ class MainWindow(QMainWindow):
 
     def set_up_plot(self):
         self.plot_widget = pg.PlotWidget()
-        self.layout.addWidget(self.plot_widget, 8, 4, 21, 1)
+        self.layout.addWidget(self.plot_widget, 8, 4, 20, 1)
         self.plot_widget.setTitle("Compound Levels over Time", color=(0, 0, 0))
         self.plot_widget.setBackground("w")
         self.legend = self.plot_widget.addLegend()
         self.plot_widget.setYRange(0, 50000)
-        self.plot_widget.setXRange(0, 1000)
+        self.plot_widget.setXRange(0, TIME_LIMIT_SECONDS, padding=0)
         self.plot_widget.setLabel("bottom", "Time (seconds)")
         self.plot_widget.setLabel("left", "Amount (AU)")
         self.plot_widget.showGrid(x=True, y=True)
+        self.plot_widget.sigXRangeChanged.connect(self.view_range_changed)
+        self.plot_widget.getViewBox().sigRangeChangedManually.connect(
+            self.stop_following
+        )
         self.pen = pg.mkPen(color=(255, 0, 0))
-        time_list = [i / 2 for i in range(len(line_1_y))]
         self.line1 = self.plot_widget.plot(
-            time_list,
-            line_1_y,
             pen=pg.mkPen(color=(255, 0, 0), width=3),
             name=self.line1_name,
         )
         self.line2 = self.plot_widget.plot(
             pen=pg.mkPen(color=(0, 0, 255), width=3), name=self.line2_name
         )
+        self.cursor = pg.InfiniteLine(angle=90, pen=pg.mkPen(color=(128, 128, 128)))
+        self.plot_widget.addItem(self.cursor, ignoreBounds=True)
+        self.timelineSlider = QSlider(Qt.Horizontal)
+        self.timelineSlider.setMaximum(0)
+        self.timelineSlider.valueChanged.connect(self.seek)
+        self.layout.addWidget(self.timelineSlider, 28, 4)
 
     def update_lines(self):
-        self.line1.setData(self.time_list_1, line_1_y)
-        self.line2.setData(self.time_list_2, line_2_y)
+        # each line gets about one point per horizontal pixel of the visible
+        # range, whatever the history length; while following, the visible
+        # range is the run so far, and at least up to the time limit
+        self.lod.update()
+        view_box = self.plot_widget.getViewBox()
+        if view_box.autoRangeEnabled()[0]:
+            self.following = True
+        if self.following:
+            times = self.history.times()
+            start = 0
+            end = max(TIME_LIMIT_SECONDS, float(times[-1]) if len(times) else 0)
+            if view_box.viewRange()[0] != [start, end]:
+                view_box.setXRange(start, end, padding=0)
+        else:
+            (start, end), _ = view_box.viewRange()
+        points = max(int(self.plot_widget.getViewBox().width()), 100)
+        for line, name in (
+            (self.line1, self.line1_name),
+            (self.line2, self.line2_name),
+        ):
+            line.setData(
+                *self.lod.select(self.history.column_index(name), start, end, points)
+            )
+
+    def view_range_changed(self):
+        # while following, update_lines itself sets the range it has drawn
+        if not self.following:
+            self.update_lines()
+
+    def stop_following(self):
+        self.following = False
+        self.update_lines()
+
+    def step_simulation(self) -> bool:
+        self.record(*self.engine.step(self.time_limit))
+        return not self.time_limit_reached()
+
+    def record(self, times, states):
+        self.history.hold(times, states)
+        self.timeline.extend(states)
+        self.state = states[-1]
+
+    def take_batches(self):
+        # everything the worker has stepped since the last frame
+        while True:
+            try:
+                times, states = self.engine.batches.get_nowait()
+            except queue.Empty:
+                return
+            self.record(times, states)
+
+    @contextmanager
+    def paused(self):
+        # the GUI changes the simulation only while the worker holds off; a
+        # running simulation carries on afterwards unless it was stopped
+        running = self.timer.isActive()
+        if running:
+            self.engine.pause()
+            self.take_batches()
+        try:
+            yield
+        finally:
+            if running and self.timer.isActive():
+                self.state = sim_vars.field_values()
+                self.engine.resume(sim_vars.speed, self.time_limit)
+
+    def time_limit_reached(self) -> bool:
+        return (
+            self.time_limit
+            and sim_vars.current_time // TICKS_PER_SECOND > TIME_LIMIT_SECONDS
+        )
+
+    def advance_frame(self):
+        # whatever the worker has stepped since the last frame, then a single
+        # redraw; a full queue holds the worker back until this catches up
+        self.take_batches()
+        self.redraw()
+
+    def run_finished(self):
+        # the worker stopped itself at the time limit
+        self.stop_timer()
+        self.report_profile()
+        self.redraw()
 
     def time_passes(self):
-        sim_vars.time_passes()
+        with self.paused():
+            self.discard_future()
+            self.step_simulation()
+            if self.time_limit_reached():
+                self.stop_timer()
+        self.redraw()
+
+    def seek(self, tick):
+        # scrubbing pauses the run; the plot keeps the whole run so the
+        # slider can still move forwards until the run carries on from here
+        self.stop_timer()
+        if tick == sim_vars.current_time:
+            return
+        if not len(self.timeline):
+            self.timeline.pin(sim_vars)
+        self.timeline.seek(sim_vars, tick)
+        self.update_ui_components()
+
+    def discard_future(self):
+        # carrying on from an earlier tick replaces the rest of the run
+        if not len(self.timeline):
+            self.timeline.pin(sim_vars)
+        if sim_vars.current_time >= self.timeline.end:
+            return
+        self.history.truncate_after(sim_vars.current_time / TICKS_PER_SECOND)
+        self.lod.clear()
+        self.timeline.truncate(sim_vars.current_time)
         self.update_lines()
 
-        self.time_list_1.append(sim_vars.current_time / 2)
-        self.time_list_2.append(sim_vars.current_time / 2)
-        line_1_y.append(sim_vars.__dict__[self.line1_name])
-        line_2_y.append(sim_vars.__dict__[self.line2_name])
-        if self.time_limit and sim_vars.current_time // 2 > 1000:
-            self.stop_timer()
-            print(sim_vars.calcium_ions)
+    def state_changed(self):
+        # presets, disorders and added fibrinogen are not part of the model,
+        # so the timeline needs a checkpoint of the state they leave
+        self.discard_future()
+        self.run_assays()
+        self.timeline.pin(sim_vars)
+        self.update_ui_components()
+
+    def run_assays(self):
+        # PT/INR and aPTT of the patient, skipped when nothing has changed
+        # since the last measurement
+        if self.patient._values != self.assayed_values:
+            assays.apply(self.patient)
+            self.assayed_values = self.patient._values.copy()
+        sim_vars.iNR = self.patient.iNR
+        sim_vars.aPTT = self.patient.aPTT
+
+    def redraw(self):
+        self.update_lines()
         self.update_ui_components()
 
     def create_widget(
@@ -597,43 +752,71 @@ class MainWindow(QMainWindow):
                 self.set_fibrinolysis_mode()
 
     def clear_lines(self):
-        line_1_y.clear()
-        line_2_y.clear()
-        self.time_list_1.clear()
-        self.time_list_2.clear()
+        self.history.clear()
+        self.lod.clear()
+        self.following = True
         self.update_lines()
 
     def start_timer(self):
+        self.discard_future()
         self.new_speed(self.speedChoiceBox.currentIndex())
-        timer_speed = int(500 // sim_vars.speed)
-        self.timer.start(timer_speed)
+        self.state = sim_vars.field_values()
+        self.engine.resume(sim_vars.speed, self.time_limit)
+        self.timer.start(1000 // FRAME_RATE)
         self.startTimerButton.setDisabled(True)
         self.speedChoiceBox.setDisabled(True)
         self.set_colour(self.startTimerButton, WHITE)
 
     def stop_timer(self):
+        self.engine.pause()
+        self.take_batches()
         self.timer.stop()
         self.startTimerButton.setDisabled(False)
         self.speedChoiceBox.setDisabled(False)
         self.set_colour(self.startTimerButton, ROYALBLUE)
 
     def reset_simulation(self):
+        self.stop_timer()
         sim_vars.reset()
+        self.patient.reset()
+        self.assayed_values = self.patient._values.copy()
+        self.timeline.clear()
         self.clear_lines()
         self.update_lines()
-        self.stop_timer()
         self.simulationModeCombo.setCurrentText("None")
         self.speedChoiceBox.setCurrentText("x 64")
         self.disorderBox.setCurrentText("None")
         self.update_ui_components()
 
     def toggle_time_limit(self):
-        self.time_limit = not self.time_limit
+        with self.paused():
+            self.time_limit = not self.time_limit
         self.set_colour(
             self.timeLimitButton, ROYALBLUE if self.time_limit else LIGHTGREEN
         )
         self.update_ui_components()
 
+    def toggle_profiling(self):
+        # the counters are printed when profiling is switched off or when a
+        # profiled run reaches the time limit
+        with self.paused():
+            if sim_vars.profiler is None:
+                ReactionProfiler.attach(sim_vars)
+            else:
+                self.report_profile()
+                ReactionProfiler.detach(sim_vars)
+        self.set_colour(
+            self.profileButton, LIGHTGREEN if sim_vars.profiler else ROYALBLUE
+        )
+        self.update_ui_components()
+
+    def report_profile(self):
+        if sim_vars.profiler is not None and sim_vars.profiler.ticks:
+            print(sim_vars.profiler.format_table())
+            print()
+            print(sim_vars.profiler.format_flame())
+            sim_vars.profiler.reset()
+
     def new_speed(self, index):
         speed_dictionary = {
             0: 1,
@@ -644,97 +827,146 @@ class MainWindow(QMainWindow):
             5: 32,
             6: 64,
             7: 0.5,
+            8: 256,
+            9: 1024,
+            10: MAX_SPEED,
         }
         sim_vars.speed = speed_dictionary[index]
 
     def set_haemostasis_mode(self, prothrombotic: bool):
-        sim_vars.set_haemostasis_mode(prothrombotic=prothrombotic)
-        self.update_ui_components()
+        with self.paused():
+            sim_vars.set_haemostasis_mode(prothrombotic=prothrombotic)
+            self.state_changed()
 
     def increase_fibrinogen_level(self):
-        sim_vars.increase_fibrinogen_level()
-        self.update_ui_components()
+        with self.paused():
+            sim_vars.increase_fibrinogen_level()
+            self.patient.increase_fibrinogen_level()
+            self.state_changed()
 
     def set_fibrinolysis_mode(self):
-        sim_vars.set_fibrinolysis_mode()
-        self.clear_lines()
-        self.update_ui_components()
+        with self.paused():
+            sim_vars.set_fibrinolysis_mode()
+            self.clear_lines()
+            self.state_changed()
 
     def set_disorder(self, text):
-        sim_vars.set_disorder(text=text)
-        self.update_ui_components()
+        with self.paused():
+            sim_vars.set_disorder(text=text)
+            self.patient.set_disorder(text=text)
+            self.state_changed()
+
+    def setup_label_bindings(self):
+        # each value label paired once with the position of its variable in
+        # SimulationVariables.field_values()
+        field_index = {name: index for index, name in enumerate(FIELD_NAMES)}
+        self.label_bindings = tuple(
+            (label, field_index[name])
+            for label, name in (
+                (self.vWFLabel2, "vWF"),
+                (self.plateletsLabel2, "platelets"),
+                (self.activatedPlateletsLabel2, "activated_platelets"),
+                (self.glycoprotein1bLabel2, "glyc1b"),
+                (self.glycoprotein2b3aLabel2, "glyc2b3a"),
+                (self.prostacyclinLabel2, "prostacyclin"),
+                (self.endothelinLabel2, "endothelin"),
+                (self.nitricOxideLabel2, "nitric_oxide"),
+                (self.alphaGranulesLabel2, "alpha_granules"),
+                (self.denseGranulesLabel2, "dense_granules"),
+                (self.serotoninLabel2, "serotonin"),
+                (self.aDPLabel2, "aDP"),
+                (self.calciumIonsLabel2, "calcium_ions"),
+                (self.fibrinogenLabel, "fibrinogen"),
+                (self.fibrinLabel, "fibrin"),
+                (self.prothrombinLabel, "prothrombin"),
+                (self.thrombinLabel, "thrombin"),
+                (self.tissueFactorLabel, "tissue_factor"),
+                (self.factor7Label, "factor7"),
+                (self.factor7aLabel, "factor7a"),
+                (self.factor8Label, "factor8"),
+                (self.factor8aLabel, "factor8a"),
+                (self.factor9Label, "factor9"),
+                (self.factor9aLabel, "factor9a"),
+                (self.factor11Label, "factor11"),
+                (self.factor11aLabel, "factor11a"),
+                (self.factor12Label, "factor12"),
+                (self.factor12aLabel, "factor12a"),
+                (self.factor10Label, "factor10"),
+                (self.factor10aLabel, "factor10a"),
+                (self.factor5Label, "factor5"),
+                (self.factor5aLabel, "factor5a"),
+                (self.factor13Label, "factor13"),
+                (self.factor13aLabel, "factor13a"),
+                (self.iNRLabel, "iNR"),
+                (self.aPTTLabel, "aPTT"),
+                (self.proteinCLabel2, "protein_c"),
+                (self.proteinCaLabel2, "protein_ca"),
+                (self.tFPILabel2, "tFPI"),
+                (self.thrombomodulinLabel2, "thrombomodulin"),
+                (self.antithrombin3Label2, "antithrombin3"),
+                (self.proteinSLabel2, "protein_s"),
+                (self.c1EsteraseInhibitorLabel2, "c1_esterase_inhibitor"),
+                (self.plasminLabel2, "plasmin"),
+                (self.plasminogenLabel2, "plasminogen"),
+                (self.fDPLabel2, "fDP"),
+                (self.tPALabel2, "tPA"),
+                (self.tAFILabel2, "tAFI"),
+                (self.tAFIaLabel2, "tAFIa"),
+                (self.pAI1Label2, "pAI1"),
+                (self.a2ALabel2, "a2A"),
+                (self.crossLinkedFibrinLabel, "cross_linked_fibrin"),
+                (self.exposedSubendotheliumLabel, "subendothelium"),
+            )
+        )
+        self.label_texts = {}
+
+    def set_label_text(self, label, text):
+        if self.label_texts.get(label) != text:
+            label.setText(text)
+            self.label_texts[label] = text
 
     def update_ui_components(self):
-        updating_labels = (
-            (self.vWFLabel2, sim_vars.vWF),
-            (self.plateletsLabel2, sim_vars.platelets),
-            (self.activatedPlateletsLabel2, sim_vars.activated_platelets),
-            (self.glycoprotein1bLabel2, sim_vars.glyc1b),
-            (self.glycoprotein2b3aLabel2, sim_vars.glyc2b3a),
-            (self.prostacyclinLabel2, sim_vars.prostacyclin),
-            (self.endothelinLabel2, sim_vars.endothelin),
-            (self.nitricOxideLabel2, sim_vars.nitric_oxide),
-            (self.alphaGranulesLabel2, sim_vars.alpha_granules),
-            (self.denseGranulesLabel2, sim_vars.dense_granules),
-            (self.serotoninLabel2, sim_vars.serotonin),
-            (self.aDPLabel2, sim_vars.aDP),
-            (self.calciumIonsLabel2, sim_vars.calcium_ions),
-            (self.fibrinogenLabel, sim_vars.fibrinogen),
-            (self.fibrinLabel, sim_vars.fibrin),
-            (self.prothrombinLabel, sim_vars.prothrombin),
-            (self.thrombinLabel, sim_vars.thrombin),
-            (self.tissueFactorLabel, sim_vars.tissue_factor),
-            (self.factor7Label, sim_vars.factor7),
-            (self.factor7aLabel, sim_vars.factor7a),
-            (self.factor8Label, sim_vars.factor8),
-            (self.factor8aLabel, sim_vars.factor8a),
-            (self.factor9Label, sim_vars.factor9),
-            (self.factor9aLabel, sim_vars.factor9a),
-            (self.factor11Label, sim_vars.factor11),
-            (self.factor11aLabel, sim_vars.factor11a),
-            (self.factor12Label, sim_vars.factor12),
-            (self.factor12aLabel, sim_vars.factor12a),
-            (self.factor10Label, sim_vars.factor10),
-            (self.factor10aLabel, sim_vars.factor10a),
-            (self.factor5Label, sim_vars.factor5),
-            (self.factor5aLabel, sim_vars.factor5a),
-            (self.factor13Label, sim_vars.factor13),
-            (self.factor13aLabel, sim_vars.factor13a),
-            (self.iNRLabel, sim_vars.iNR),
-            (self.aPTTLabel, sim_vars.aPTT),
-            (self.proteinCLabel2, sim_vars.protein_c),
-            (self.proteinCaLabel2, sim_vars.protein_ca),
-            (self.tFPILabel2, sim_vars.tFPI),
-            (self.thrombomodulinLabel2, sim_vars.thrombomodulin),
-            (self.antithrombin3Label2, sim_vars.antithrombin3),
-            (self.proteinSLabel2, sim_vars.protein_s),
-            (self.c1EsteraseInhibitorLabel2, sim_vars.c1_esterase_inhibitor),
-            (self.plasminLabel2, sim_vars.plasmin),
-            (self.plasminogenLabel2, sim_vars.plasminogen),
-            (self.fDPLabel2, sim_vars.fDP),
-            (self.tPALabel2, sim_vars.tPA),
-            (self.tAFILabel2, sim_vars.tAFI),
-            (self.tAFIaLabel2, sim_vars.tAFIa),
-            (self.pAI1Label2, sim_vars.pAI1),
-            (self.a2ALabel2, sim_vars.a2A),
-            (
-                self.crossLinkedFibrinLabel,
-                sim_vars.cross_linked_fibrin,
-            ),
-            (
-                self.exposedSubendotheliumLabel,
-                sim_vars.subendothelium,
-            ),
-        )
-
-        self.timeLimitButton.setText(f"Time Limit {'ON' if self.time_limit else 'OFF'}")
-
-        for label in updating_labels:
-            label[0].setText(format(abs(label[1]), ".2f"))
-        self.currentTimeLabel.setText(f"Time: {sim_vars.current_time // 2} seconds")
+        start = time.perf_counter()
+        # the simulation belongs to the worker while it runs
+        values = self.state if self.engine.running else sim_vars.field_values()
+        tick = int(values[1])
+        for label, index in self.label_bindings:
+            self.set_label_text(label, format(abs(values[index]), ".2f"))
+        self.set_label_text(
+            self.timeLimitButton, f"Time Limit {'ON' if self.time_limit else 'OFF'}"
+        )
+        self.set_label_text(
+            self.profileButton, f"Profiling {'ON' if sim_vars.profiler else 'OFF'}"
+        )
+        self.set_label_text(
+            self.currentTimeLabel, f"Time: {tick // TICKS_PER_SECOND} seconds"
+        )
+        self.set_label_text(
+            self.historyMemoryLabel,
+            f"History: {self.history.nbytes / 1_000_000:.1f} MB"
+            f" + {self.timeline.nbytes / 1000:.0f} kB",
+        )
+        self.cursor.setPos(tick / TICKS_PER_SECOND)
+        if self.timelineSlider.maximum() != self.timeline.end:
+            self.timelineSlider.blockSignals(True)
+            self.timelineSlider.setMaximum(self.timeline.end)
+            self.timelineSlider.blockSignals(False)
+        if self.timelineSlider.value() != tick:
+            self.timelineSlider.blockSignals(True)
+            self.timelineSlider.setValue(tick)
+            self.timelineSlider.blockSignals(False)
+        self.set_label_text(
+            self.uiFrameTimeLabel, f"Labels: {self.ui_frame_seconds * 1000:.2f} ms"
+        )
+        self.ui_frame_seconds = time.perf_counter() - start
+
+    def closeEvent(self, event):
+        self.engine.shutdown()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
+    load_parameters()
     app = QApplication([])
     window = MainWindow()
     window.show()
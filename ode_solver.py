@@ -0,0 +1,150 @@
+import numpy as np
+
+from species import SPECIES, SPECIES_INDEX
+
+# Dormand-Prince 5(4) tableau (the reaction network has no explicit time
+# dependence, so the stage times are not needed)
+A = (
+    (),
+    (1 / 5,),
+    (3 / 40, 9 / 40),
+    (44 / 45, -56 / 15, 32 / 9),
+    (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+    (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+    (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+)
+# fifth order weights minus the embedded fourth order ones
+ERROR_WEIGHTS = np.array(
+    [
+        35 / 384 - 5179 / 57600,
+        0,
+        500 / 1113 - 7571 / 16695,
+        125 / 192 - 393 / 640,
+        -2187 / 6784 + 92097 / 339200,
+        11 / 84 - 187 / 2100,
+        -1 / 40,
+    ]
+)
+
+
+class RateFunction:
+    # the reaction table read as a system of ODEs: each reaction runs at the
+    # amount per tick it would move from the current state, and all of them
+    # act at once rather than one after another within a tick
+    def __init__(self, table):
+        columns = list(zip(*table))
+        (
+            self.source,
+            self.destination,
+            self.catalyst,
+            self.catalyst_2,
+        ) = (np.array(column, dtype=np.intp) for column in columns[:4])
+        self.divisor = np.array(columns[4], dtype=float)
+        self.multiplier = np.array(columns[5], dtype=float)
+        self.inhibitor_1 = np.array(columns[6], dtype=np.intp)
+        self.multiplier_i1 = np.array(columns[7], dtype=float)
+        self.inhibitor_2 = np.array(columns[8], dtype=np.intp)
+        self.multiplier_i2 = np.array(columns[9], dtype=float)
+        self.tail = np.array(columns[10], dtype=float)
+        self.calcium_factor = np.array(columns[11], dtype=float)
+        self.catalyst_threshold = np.array(columns[12], dtype=float)
+        self.evaluations = 0
+
+    def __call__(self, y):
+        self.evaluations += 1
+        source_amount = y[self.source]
+        catalyst_amount = y[self.catalyst]
+        catalyst_2_amount = y[self.catalyst_2]
+        maximum_catalyst_available = (
+            np.maximum(
+                np.maximum(catalyst_amount, catalyst_2_amount),
+                np.minimum(catalyst_amount, catalyst_2_amount) * self.multiplier,
+            )
+            / self.divisor
+            - np.maximum(
+                y[self.inhibitor_1] * self.multiplier_i1,
+                y[self.inhibitor_2] * self.multiplier_i2,
+            )
+        ) * self.calcium_factor
+        rate = np.minimum(
+            source_amount / self.tail, np.maximum(maximum_catalyst_available, 0)
+        )
+        rate[source_amount < 0.005] = 0
+        rate[
+            (self.catalyst_threshold > 0) & (catalyst_amount <= self.catalyst_threshold)
+        ] = 0
+        return np.bincount(self.destination, rate, minlength=len(y)) - np.bincount(
+            self.source, rate, minlength=len(y)
+        )
+
+
+class AdaptiveSolver:
+    # Dormand-Prince with step size control; the solution is sampled at every
+    # whole tick through cubic Hermite interpolation of each accepted step
+    def __init__(self, table, rtol=1e-4, atol=1e-3, max_step=None):
+        self.rate = RateFunction(table)
+        self.rtol = rtol
+        self.atol = atol
+        self.max_step = max_step
+        self.accepted = 0
+        self.rejected = 0
+
+    def solve(self, y0, ticks):
+        y = np.array(y0, dtype=float)
+        samples = np.empty((ticks + 1, len(y)))
+        samples[0] = y
+        next_sample = 1
+        t = 0.0
+        h = 1.0
+        max_step = self.max_step or max(ticks, 1)
+        f = self.rate(y)
+        while next_sample <= ticks:
+            h = min(h, max_step, ticks - t)
+            stages = [f]
+            for row in A[1:]:
+                stages.append(
+                    self.rate(y + h * sum(weight * k for weight, k in zip(row, stages)))
+                )
+            y_new = y + h * sum(weight * k for weight, k in zip(A[6], stages))
+            # A[6] is the fifth order solution, so its stage is f at y_new
+            f_new = stages[6]
+            error = h * sum(weight * k for weight, k in zip(ERROR_WEIGHTS, stages))
+            scale = self.atol + self.rtol * np.maximum(np.abs(y), np.abs(y_new))
+            error_norm = np.sqrt(np.mean((error / scale) ** 2))
+            if error_norm <= 1:
+                self.accepted += 1
+                t_new = t + h
+                last_sample = min(int(t_new + 1e-9), ticks)
+                if last_sample >= next_sample:
+                    sample_ticks = np.arange(next_sample, last_sample + 1)
+                    samples[next_sample : last_sample + 1] = _hermite(
+                        t, y, f, t_new, y_new, f_new, sample_ticks
+                    )
+                    next_sample = last_sample + 1
+                t, y, f = t_new, y_new, f_new
+            else:
+                self.rejected += 1
+            factor = 5 if error_norm == 0 else 0.9 * error_norm**-0.2
+            h *= min(5, max(0.2, factor))
+        return samples
+
+
+def _hermite(t0, y0, f0, t1, y1, f1, t):
+    # one row per time in t
+    h = t1 - t0
+    s = ((t - t0) / h)[:, np.newaxis]
+    return (
+        (2 * s**3 - 3 * s**2 + 1) * y0
+        + (s**3 - 2 * s**2 + s) * h * f0
+        + (-2 * s**3 + 3 * s**2) * y1
+        + (s**3 - s**2) * h * f1
+    )
+
+
+def run_ode(simulation, steps, species=SPECIES, rtol=1e-4, atol=1e-3):
+    # the ODE counterpart of runner.run_simulation
+    solver = AdaptiveSolver(simulation.reaction_table, rtol=rtol, atol=atol)
+    samples = solver.solve(simulation._values, steps)
+    simulation.load_amounts(samples[-1, :-1].tolist())
+    simulation.current_time += steps
+    return samples[:, [SPECIES_INDEX[name] for name in species]], solver
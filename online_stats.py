@@ -0,0 +1,125 @@
+import math
+
+import numpy as np
+
+
+class OnlineStats:
+    # count, mean and variance (Welford's update) plus minimum and maximum
+    # per column, kept in O(columns) memory whatever the number of samples.
+    # Stats gathered separately (e.g. in worker processes) can be merged.
+    def __init__(self, columns):
+        self.count = 0
+        self.mean = np.zeros(columns)
+        self._m2 = np.zeros(columns)
+        self.minimum = np.full(columns, np.inf)
+        self.maximum = np.full(columns, -np.inf)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (values - self.mean)
+        np.minimum(self.minimum, values, out=self.minimum)
+        np.maximum(self.maximum, values, out=self.maximum)
+
+    @classmethod
+    def from_samples(cls, samples):
+        # the stats of a whole block of rows at once
+        samples = np.asarray(samples, dtype=float)
+        stats = cls(samples.shape[1])
+        stats.count = len(samples)
+        if stats.count:
+            stats.mean = samples.mean(axis=0)
+            stats._m2 = ((samples - stats.mean) ** 2).sum(axis=0)
+            stats.minimum = samples.min(axis=0)
+            stats.maximum = samples.max(axis=0)
+        return stats
+
+    def merge(self, other):
+        # Chan et al.'s pairwise combination of two sets of moments
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self._m2 = self._m2 + other._m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        np.minimum(self.minimum, other.minimum, out=self.minimum)
+        np.maximum(self.maximum, other.maximum, out=self.maximum)
+
+    @property
+    def variance(self) -> np.ndarray:
+        # sample variance; undefined below two samples
+        if self.count < 2:
+            return np.full_like(self.mean, np.nan)
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+
+class QuantileSketch:
+    # one mergeable log-bucket histogram (as in DDSketch) per cell of shape:
+    # a bucket spans a factor of (1 + a) / (1 - a), so any quantile read back
+    # is within relative_accuracy a of a true sample. Values at or below
+    # minimum share a bucket read back as 0, values above maximum the top
+    # one. Memory depends on the shape and range only, never on the count.
+    def __init__(self, shape, relative_accuracy=0.01, minimum=1e-3, maximum=1e7):
+        self.shape = tuple(shape)
+        self.relative_accuracy = relative_accuracy
+        self.minimum = minimum
+        self.maximum = maximum
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._offset = math.ceil(math.log(minimum) / self._log_gamma)
+        buckets = math.ceil(math.log(maximum) / self._log_gamma) - self._offset + 2
+        self.counts = np.zeros((*self.shape, buckets), dtype=np.int64)
+
+    def bucket(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        index = np.zeros(values.shape, dtype=np.int64)
+        above = values > self.minimum
+        index[above] = (
+            np.ceil(np.log(values[above]) / self._log_gamma) - self._offset + 1
+        )
+        return np.minimum(index, self.counts.shape[-1] - 1)
+
+    def update(self, values, at=()):
+        # values has the shape of the cells selected by at (the whole sketch
+        # by default) plus a trailing axis of samples
+        counts = self.counts[at]
+        buckets = counts.shape[-1]
+        cells = counts.shape[:-1]
+        values = np.asarray(values, dtype=float).reshape(*cells, -1)
+        flat = (
+            np.arange(math.prod(cells)).reshape(*cells, 1) * buckets
+            + self.bucket(values)
+        ).ravel()
+        counts += np.bincount(flat, minlength=counts.size).reshape(counts.shape)
+
+    def merge(self, other):
+        if (other.counts.shape, other.gamma, other.minimum) != (
+            self.counts.shape,
+            self.gamma,
+            self.minimum,
+        ):
+            raise ValueError("can only merge sketches with the same layout")
+        self.counts += other.counts
+
+    @property
+    def count(self) -> np.ndarray:
+        return self.counts.sum(axis=-1)
+
+    def quantile(self, q) -> np.ndarray:
+        # one value per cell; nan where a cell has no samples
+        cumulative = self.counts.cumsum(axis=-1)
+        total = cumulative[..., -1]
+        rank = np.floor(q * np.maximum(total - 1, 0))
+        index = (cumulative <= rank[..., np.newaxis]).sum(axis=-1)
+        index = np.minimum(index, self.counts.shape[-1] - 1)
+        values = 2 * self.gamma ** (index - 1.0 + self._offset) / (self.gamma + 1)
+        values[index == 0] = 0
+        values[total == 0] = np.nan
+        return values
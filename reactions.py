@@ -0,0 +1,492 @@
+import json
+from dataclasses import dataclass, replace
+
+from species import SPECIES_INDEX, ZERO_SLOT
+
+# bump whenever step() or the solvers would give different numbers for the
+# same reaction table, so stored trajectories are not reused
+ENGINE_VERSION = 2
+
+
+@dataclass
+class ReactionVariables:
+    catalyst_amount: float
+    source_amount: float
+    divisor: float
+    catalyst_2_amount: float = 0.0
+    calcium_ions: float = 1.2
+    reaction_affected_by_calcium: bool = False
+    multiplier: float = 1.0
+    inhibitor_1_amount: float = 0.0
+    multiplier_i1: float = 0.0
+    inhibitor_2_amount: float = 0.0
+    multiplier_i2: float = 0.0
+    tail: float = 100.0
+    vitamin_k: bool = False
+    maximum_inhibitor_amount: float = 0.0
+
+    def get_reaction_size(self) -> float:
+        maximum_source_available = self.source_amount / self.tail
+        if self.source_amount < 0.005:
+            return 0
+        self.maximum_inhibitor_amount = self.get_maximum_inhibitor_amount()
+        maximum_catalyst_available = self.get_maximum_catalyst_available()
+        change = min(maximum_source_available, maximum_catalyst_available)
+        return change
+
+    def get_maximum_catalyst_available(self):
+        maximum_catalyst_available = (
+            max(
+                self.catalyst_amount,
+                self.catalyst_2_amount,
+                min(self.catalyst_amount, self.catalyst_2_amount) * self.multiplier,
+            )
+            / self.divisor
+            - self.maximum_inhibitor_amount
+        )
+        return max(maximum_catalyst_available * self.calcium_multiplier(), 0)
+
+    def calcium_multiplier(self) -> float:
+        if not self.reaction_affected_by_calcium:
+            return 1.0
+        if self.calcium_ions > 1.199:
+            return 1.0
+        return (self.calcium_ions / 1.2) ** 3
+
+    def get_maximum_inhibitor_amount(self):
+        return max(
+            self.inhibitor_1_amount * self.multiplier_i1,
+            self.inhibitor_2_amount * self.multiplier_i2,
+        )
+
+
+@dataclass(frozen=True)
+class Reaction:
+    name: str
+    catalyst: str
+    source: str
+    destination: str
+    divisor: float
+    catalyst_2: str | None = None
+    multiplier: float = 1.0
+    inhibitor_1: str | None = None
+    multiplier_i1: float = 0.0
+    inhibitor_2: str | None = None
+    multiplier_i2: float = 0.0
+    tail: float = 100.0
+    reaction_affected_by_calcium: bool = False
+    # when set, the reaction only runs while the first catalyst is above it,
+    # whatever the second catalyst
+    catalyst_threshold: float = 0.0
+
+    def calcium_factor(self) -> float:
+        # the network never passes the plasma calcium level through, so the
+        # multiplier is the one ReactionVariables gives at its default
+        return ReactionVariables(
+            catalyst_amount=0,
+            source_amount=0,
+            divisor=self.divisor,
+            reaction_affected_by_calcium=self.reaction_affected_by_calcium,
+        ).calcium_multiplier()
+
+    def compile(self) -> tuple:
+        return (
+            SPECIES_INDEX[self.source],
+            SPECIES_INDEX[self.destination],
+            SPECIES_INDEX[self.catalyst],
+            SPECIES_INDEX[self.catalyst_2] if self.catalyst_2 else ZERO_SLOT,
+            self.divisor,
+            self.multiplier,
+            SPECIES_INDEX[self.inhibitor_1] if self.inhibitor_1 else ZERO_SLOT,
+            self.multiplier_i1,
+            SPECIES_INDEX[self.inhibitor_2] if self.inhibitor_2 else ZERO_SLOT,
+            self.multiplier_i2,
+            self.tail,
+            self.calcium_factor(),
+            self.catalyst_threshold,
+        )
+
+
+# in the order SimulationVariables.time_passes applies them
+REACTIONS = (
+    Reaction(
+        "convert_fibrinogen",
+        catalyst="thrombin",
+        source="fibrinogen",
+        destination="fibrin",
+        divisor=15,
+        reaction_affected_by_calcium=True,
+    ),
+    Reaction(
+        "convert_fibrin",
+        catalyst="factor13a",
+        source="fibrin",
+        destination="cross_linked_fibrin",
+        divisor=50,
+    ),
+    Reaction(
+        "convert_prothrombin",
+        catalyst="factor10a",
+        catalyst_2="factor5a",
+        source="prothrombin",
+        destination="thrombin",
+        divisor=120000,
+        multiplier=6000,
+        reaction_affected_by_calcium=True,
+        inhibitor_1="tFPI",
+        multiplier_i1=0.1,
+    ),
+    Reaction(
+        "thrombin_convert_factor7",
+        catalyst="thrombin",
+        source="factor7",
+        destination="factor7a",
+        divisor=1000,
+    ),
+    Reaction(
+        "thrombin_convert_factor8",
+        catalyst="thrombin",
+        source="factor8",
+        destination="factor8a",
+        divisor=1000,
+    ),
+    Reaction(
+        "thrombin_convert_factor11",
+        catalyst="thrombin",
+        source="factor11",
+        destination="factor11a",
+        divisor=1000,
+    ),
+    Reaction(
+        "convert_factor5",
+        catalyst="thrombin",
+        catalyst_2="factor10a",
+        source="factor5",
+        destination="factor5a",
+        divisor=120_000,
+        multiplier=6000,
+    ),
+    Reaction(
+        "convert_factor7",
+        catalyst="tissue_factor",
+        source="factor7",
+        destination="factor7a",
+        divisor=1000,
+    ),
+    Reaction(
+        "convert_factor9",
+        catalyst="factor11a",
+        catalyst_2="factor7a",
+        source="factor9",
+        destination="factor9a",
+        divisor=2000,
+        multiplier=200,
+        reaction_affected_by_calcium=True,
+    ),
+    Reaction(
+        "convert_factor10_extrinsic",
+        catalyst="factor7a",
+        source="factor10",
+        destination="factor10a",
+        divisor=1000,
+    ),
+    Reaction(
+        "convert_factor10_intrinsic",
+        catalyst="factor9a",
+        catalyst_2="factor8a",
+        source="factor10",
+        destination="factor10a",
+        divisor=120000,
+        multiplier=3000,
+        reaction_affected_by_calcium=True,
+    ),
+    Reaction(
+        "convert_factor11",
+        catalyst="factor12a",
+        source="factor11",
+        destination="factor11a",
+        divisor=500,
+    ),
+    Reaction(
+        "convert_factor12",
+        catalyst="subendothelium",
+        source="factor12",
+        destination="factor12a",
+        divisor=100,
+    ),
+    Reaction(
+        "convert_factor13",
+        catalyst="thrombin",
+        source="factor13",
+        destination="factor13a",
+        divisor=20,
+    ),
+    # fibrinolysis
+    Reaction(
+        "tpa_convert_plasminogen",
+        catalyst="tPA",
+        source="plasminogen",
+        destination="plasmin",
+        divisor=20,
+        tail=500,
+    ),
+    Reaction(
+        "plasmin_degrade_cross_linked_fibrin",
+        catalyst="plasmin",
+        source="cross_linked_fibrin",
+        destination="fDP",
+        divisor=20,
+        inhibitor_1="tAFIa",
+        multiplier_i1=0.15,
+    ),
+    Reaction(
+        "plasmin_degrade_fibrin",
+        catalyst="plasmin",
+        source="fibrin",
+        destination="fDP",
+        divisor=40,
+        inhibitor_1="tAFIa",
+        multiplier_i1=0.15,
+    ),
+    Reaction(
+        "thrombin_convert_tafi",
+        catalyst="thrombin",
+        source="tAFI",
+        destination="tAFIa",
+        divisor=400,
+    ),
+    Reaction(
+        "pai1_inhibit_tpa",
+        catalyst="pAI1",
+        source="tPA",
+        destination="dummy",
+        divisor=500,
+    ),
+    Reaction(
+        "a2a_inhibit_plasmin",
+        catalyst="a2A",
+        source="plasmin",
+        destination="dummy",
+        divisor=100,
+    ),
+    # anticoagulation
+    Reaction(
+        "thrombomodulin_convert_protein_c",
+        catalyst="thrombomodulin",
+        catalyst_2="thrombin",
+        source="protein_c",
+        destination="protein_ca",
+        divisor=100,
+        multiplier=100,
+        catalyst_threshold=0.01,
+    ),
+    Reaction(
+        "protein_ca_inhibit_factor8a",
+        catalyst="protein_ca",
+        catalyst_2="protein_s",
+        source="factor8a",
+        destination="dummy",
+        divisor=2000,
+        multiplier=2000,
+    ),
+    Reaction(
+        "protein_ca_inhibit_factor5a",
+        catalyst="protein_ca",
+        catalyst_2="protein_s",
+        source="factor5a",
+        destination="dummy",
+        divisor=2000,
+        multiplier=2000,
+    ),
+    Reaction(
+        "tfpi_inhibit_factor7a",
+        catalyst="tFPI",
+        source="factor7a",
+        destination="dummy",
+        divisor=2000,
+    ),
+    Reaction(
+        "tfpi_inhibit_factor10a",
+        catalyst="tFPI",
+        source="factor10a",
+        destination="dummy",
+        divisor=2000,
+    ),
+    Reaction(
+        "c1_esterase_inhibit_factor11a",
+        catalyst="c1_esterase_inhibitor",
+        source="factor11a",
+        destination="dummy",
+        divisor=2000,
+    ),
+    Reaction(
+        "c1_esterase_inhibit_factor12a",
+        catalyst="c1_esterase_inhibitor",
+        source="factor12a",
+        destination="dummy",
+        divisor=2000,
+    ),
+    Reaction(
+        "antithrombin3_inhibit_thrombin",
+        catalyst="antithrombin3",
+        source="thrombin",
+        destination="dummy",
+        divisor=2000,
+    ),
+    Reaction(
+        "antithrombin3_inhibit_factor10a",
+        catalyst="antithrombin3",
+        source="factor10a",
+        destination="dummy",
+        divisor=2000,
+    ),
+    Reaction(
+        "antithrombin3_inhibit_factor9a",
+        catalyst="antithrombin3",
+        source="factor9a",
+        destination="dummy",
+        divisor=2000,
+    ),
+)
+
+
+# the Reaction fields a parameter file may set
+TUNABLE_FIELDS = ("divisor", "multiplier", "multiplier_i1", "multiplier_i2", "tail")
+
+
+def used_constants(reaction) -> tuple:
+    # the tunable fields step() actually reads for this reaction: the
+    # multipliers only count alongside their second catalyst or inhibitor
+    return tuple(
+        field
+        for field, used in (
+            ("divisor", True),
+            ("multiplier", reaction.catalyst_2),
+            ("multiplier_i1", reaction.inhibitor_1),
+            ("multiplier_i2", reaction.inhibitor_2),
+            ("tail", True),
+        )
+        if used
+    )
+
+
+def with_constants(reactions, constants) -> tuple:
+    # constants maps reaction name -> {field: value}
+    by_name = {reaction.name: reaction for reaction in reactions}
+    for name, fields in constants.items():
+        if name not in by_name:
+            raise ValueError(f"unknown reaction '{name}'")
+        for field, value in fields.items():
+            if field not in TUNABLE_FIELDS:
+                raise ValueError(f"'{field}' of {name} is not a tunable constant")
+            if not value > 0:
+                raise ValueError(f"{name}.{field} must be positive, got {value}")
+    return tuple(
+        replace(reaction, **constants.get(reaction.name, {})) for reaction in reactions
+    )
+
+
+def load_constants(path) -> dict:
+    # a parameter file as written by calibration.write_parameters
+    with open(path) as file:
+        document = json.load(file)
+    if not isinstance(document.get("reactions"), dict):
+        raise ValueError(f"{path} has no 'reactions' table")
+    if document.get("engine_version", ENGINE_VERSION) != ENGINE_VERSION:
+        raise ValueError(
+            f"{path} was fitted with engine version {document['engine_version']}, "
+            f"this is version {ENGINE_VERSION}; fit it again"
+        )
+    return document["reactions"]
+
+
+def compile_reactions(reactions) -> tuple:
+    return tuple(reaction.compile() for reaction in reactions)
+
+
+def possible_reactions(table, values) -> tuple:
+    # the compiled reactions that could ever move anything from this state.
+    # A species that is absent and made by no possible reaction stays absent,
+    # so reactions needing it as their source or only catalysts never fire;
+    # propagating from the species present finds the rest. The result keeps
+    # the table's order, so stepping it gives exactly what the full table
+    # would until something outside the model adds a species.
+    present = {index for index, value in enumerate(values) if value}
+    # step() leaves a source alone below 0.005, so it only counts while above
+    # that or while some possible reaction is making more of it
+    sources = {index for index in present if values[index] >= 0.005}
+    possible = [False] * len(table)
+    changed = True
+    while changed:
+        changed = False
+        for index, reaction in enumerate(table):
+            if possible[index] or reaction[0] not in sources:
+                continue
+            # a reaction with a catalyst threshold needs its first catalyst
+            if reaction[2] in present or (reaction[3] in present and not reaction[12]):
+                possible[index] = True
+                present.add(reaction[1])
+                sources.add(reaction[1])
+                changed = True
+    return tuple(reaction for reaction, keep in zip(table, possible) if keep)
+
+
+def step(values, table) -> float:
+    # same arithmetic as ReactionVariables.get_reaction_size followed by
+    # SimulationVariables.perform_reaction, over a flat list of amounts.
+    # Returns the total amount moved; 0 means the state is a fixed point.
+    moved = 0.0
+    for reaction in table:
+        source = reaction[0]
+        source_amount = values[source]
+        if source_amount < 0.005:
+            continue
+        (
+            _,
+            destination,
+            catalyst,
+            catalyst_2,
+            divisor,
+            multiplier,
+            inhibitor_1,
+            multiplier_i1,
+            inhibitor_2,
+            multiplier_i2,
+            tail,
+            calcium_factor,
+            catalyst_threshold,
+        ) = reaction
+        catalyst_amount = values[catalyst]
+        catalyst_2_amount = values[catalyst_2]
+        if catalyst_amount <= catalyst_threshold and (
+            catalyst_threshold or not catalyst_2_amount
+        ):
+            # nothing can be catalysed however much source there is
+            continue
+        if catalyst_2_amount:
+            maximum_catalyst_available = max(
+                catalyst_amount,
+                catalyst_2_amount,
+                min(catalyst_amount, catalyst_2_amount) * multiplier,
+            )
+        else:
+            # the catalyst is above its threshold, so it is the maximum
+            maximum_catalyst_available = catalyst_amount
+        # max() and min() spelled out: the same results without the calls
+        inhibition = values[inhibitor_1] * multiplier_i1
+        inhibition_2 = values[inhibitor_2] * multiplier_i2
+        if inhibition_2 > inhibition:
+            inhibition = inhibition_2
+        maximum_catalyst_available = (
+            maximum_catalyst_available / divisor - inhibition
+        ) * calcium_factor
+        if maximum_catalyst_available <= 0:
+            # held back entirely by its inhibitors
+            continue
+        change = source_amount / tail
+        if maximum_catalyst_available < change:
+            change = maximum_catalyst_available
+        values[source] = source_amount - change
+        values[destination] += change
+        moved += change
+    return moved
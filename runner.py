@@ -0,0 +1,155 @@
+import csv
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from constants import TICKS_PER_SECOND
+from ode_solver import run_ode
+from simulation_variables import SimulationVariables
+from species import SPECIES, SPECIES_INDEX
+
+
+def build_simulation(mode="None", disorder="None", overrides=None):
+    simulation = SimulationVariables()
+    simulation.set_simulation_mode(mode)
+    simulation.set_disorder(disorder)
+    for name, value in (overrides or {}).items():
+        if name not in SPECIES_INDEX:
+            raise ValueError(f"unknown species '{name}'")
+        setattr(simulation, name, value)
+    return simulation
+
+
+def run_simulation(simulation, steps, species=SPECIES, backend="discrete"):
+    # row 0 is the starting state, row n the state after n ticks
+    match backend:
+        case "discrete":
+            pass
+        case "ode":
+            return run_ode(simulation, steps, species)[0]
+        case _:
+            raise ValueError(f"unknown backend '{backend}'")
+    indices = [SPECIES_INDEX[name] for name in species]
+    values = simulation._values
+    trajectory = np.empty((steps + 1, len(indices)))
+    trajectory[0] = [values[index] for index in indices]
+    for row in range(1, steps + 1):
+        moved = simulation.time_passes()
+        trajectory[row] = [values[index] for index in indices]
+        if not moved:
+            # nothing can react any more: the rest of the run is this state
+            trajectory[row + 1 :] = trajectory[row]
+            simulation.current_time += steps - row
+            break
+    return trajectory
+
+
+def stream_simulation(simulation, steps=None, species=SPECIES, stride=1, until=None):
+    # yields (seconds, values) for the starting state and then every `stride`
+    # ticks, holding nothing but the current state, so memory stays flat
+    # however long the run. species=None yields whole field_values()
+    # snapshots. Stops after `steps` ticks (always yielding the final state),
+    # after the first sample `until(seconds, values)` accepts, or, with no
+    # step limit, once no reaction can fire any more.
+    if stride < 1:
+        raise ValueError("stride must be at least 1")
+    if species is None:
+        sample = simulation.field_values
+    else:
+        indices = [SPECIES_INDEX[name] for name in species]
+        values = simulation._values
+
+        def sample():
+            return tuple(values[index] for index in indices)
+
+    ticks = 0
+    quiescent = False
+    while True:
+        seconds = simulation.current_time / TICKS_PER_SECOND
+        current = sample()
+        yield seconds, current
+        if until is not None and until(seconds, current):
+            return
+        if ticks == steps or (quiescent and steps is None):
+            return
+        count = stride if steps is None else min(stride, steps - ticks)
+        if quiescent:
+            simulation.current_time += count
+        else:
+            for done in range(1, count + 1):
+                if not simulation.time_passes():
+                    quiescent = True
+                    simulation.current_time += count - done
+                    break
+        ticks += count
+
+
+def compare_backends(mode, disorder, steps, species=SPECIES):
+    # runs one scenario on both backends and summarises how far apart the
+    # curves are and what each cost
+    report = {}
+    discrete_simulation = build_simulation(mode, disorder)
+    start = time.perf_counter()
+    discrete = run_simulation(discrete_simulation, steps, species)
+    report["discrete_seconds"] = time.perf_counter() - start
+
+    ode_simulation = build_simulation(mode, disorder)
+    start = time.perf_counter()
+    ode, solver = run_ode(ode_simulation, steps, species)
+    report["ode_seconds"] = time.perf_counter() - start
+    report["ode_accepted_steps"] = solver.accepted
+    report["ode_rejected_steps"] = solver.rejected
+    report["ode_rate_evaluations"] = solver.rate.evaluations
+
+    peak = np.abs(discrete).max(axis=0)
+    deviation = np.abs(discrete - ode).max(axis=0)
+    report["species"] = {
+        name: {
+            "discrete_final": float(discrete[-1, index]),
+            "ode_final": float(ode[-1, index]),
+            "max_deviation": float(deviation[index]),
+            "relative_deviation": (
+                float(deviation[index] / peak[index]) if peak[index] else 0.0
+            ),
+        }
+        for index, name in enumerate(species)
+    }
+    return report
+
+
+def tick_times(start_tick, steps):
+    # each tick is half a second, as in the GUI
+    return (start_tick + np.arange(steps + 1)) / TICKS_PER_SECOND
+
+
+def save_trajectory(path, times, species, trajectory, metadata=None):
+    path = Path(path)
+    match path.suffix.lower():
+        case ".npz":
+            np.savez(
+                path,
+                time=times,
+                species=np.array(species),
+                trajectory=trajectory,
+                metadata=json.dumps(metadata or {}),
+            )
+        case ".csv":
+            with path.open("w", newline="") as file:
+                writer = csv.writer(file)
+                writer.writerow(("time", *species))
+                for time, row in zip(times, trajectory):
+                    writer.writerow((time, *row))
+        case _:
+            raise ValueError(f"unsupported trajectory format '{path.suffix}'")
+
+
+def load_trajectory(path):
+    with np.load(path) as data:
+        return (
+            data["time"],
+            tuple(data["species"]),
+            data["trajectory"],
+            json.loads(str(data["metadata"])),
+        )
@@ -0,0 +1,57 @@
+import time
+
+from constants import FRAME_RATE, MAX_SPEED, TICKS_PER_SECOND
+
+# share of each frame the "as fast as possible" speed may spend stepping
+FRAME_BUDGET = 0.75 / FRAME_RATE
+# steps run between clock checks at "as fast as possible"
+STEPS_PER_CLOCK_CHECK = 32
+
+
+class StepScheduler:
+    # turns elapsed wall-clock time into simulation steps, so stepping and
+    # redrawing run at independent rates: at speed x1 the model advances
+    # TICKS_PER_SECOND ticks per real second however often frames are drawn
+    def __init__(self, speed=1, clock=time.perf_counter, frame_budget=FRAME_BUDGET):
+        self.speed = speed
+        self.clock = clock
+        self.frame_budget = frame_budget
+        self._last = clock()
+        self._carry = 0.0
+
+    @property
+    def unthrottled(self) -> bool:
+        return self.speed == MAX_SPEED
+
+    def start(self):
+        self._last = self.clock()
+        self._carry = 0.0
+
+    def steps_due(self) -> int:
+        now = self.clock()
+        # a stalled frame (window drag, breakpoint) does not trigger a
+        # catch-up burst of more than a quarter second of simulation
+        elapsed = min(now - self._last, 0.25)
+        self._last = now
+        due = elapsed * self.speed * TICKS_PER_SECOND + self._carry
+        steps = int(due)
+        self._carry = due - steps
+        return steps
+
+    def run_frame(self, step) -> int:
+        # step() advances the model once and returns False to stop early
+        if not self.unthrottled:
+            steps = self.steps_due()
+            for done in range(1, steps + 1):
+                if not step():
+                    return done
+            return steps
+        deadline = self.clock() + self.frame_budget
+        done = 0
+        while True:
+            for _ in range(STEPS_PER_CLOCK_CHECK):
+                done += 1
+                if not step():
+                    return done
+            if self.clock() >= deadline:
+                return done
@@ -0,0 +1,196 @@
+import csv
+from dataclasses import dataclass
+
+import numpy as np
+
+from batch_engine import BatchSimulation
+from constants import ASSAY_FIBRIN_THRESHOLD, TICKS_PER_SECOND
+from reactions import used_constants
+from simulation_variables import SimulationVariables
+from species import SPECIES_INDEX
+
+DEFAULT_OUTPUTS = ("peak:thrombin", "peak_time:thrombin", "clot_time")
+# relative size of each perturbation, applied up and down
+DEFAULT_STEP = 0.05
+FIBRIN = SPECIES_INDEX["fibrin"]
+CROSS_LINKED_FIBRIN = SPECIES_INDEX["cross_linked_fibrin"]
+
+
+@dataclass(frozen=True)
+class Parameter:
+    # a reaction constant (name is the reaction, field the Reaction field)
+    # or, with field None, the starting amount of the species name
+    name: str
+    field: str | None
+    value: float
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}.{self.field}" if self.field else self.name
+
+
+@dataclass
+class Summary:
+    # per column: the highest amount of every species, the tick it was
+    # reached, the amounts at the end and the clot time in seconds
+    peak: np.ndarray
+    peak_tick: np.ndarray
+    final: np.ndarray
+    clot_time: np.ndarray
+
+    def output(self, name) -> np.ndarray:
+        kind, _, species = name.partition(":")
+        match kind:
+            case "clot_time":
+                return self.clot_time
+            case "peak":
+                return self.peak[SPECIES_INDEX[species]]
+            case "peak_time":
+                return self.peak_tick[SPECIES_INDEX[species]] / TICKS_PER_SECOND
+            case "final":
+                return self.final[SPECIES_INDEX[species]]
+        raise ValueError(f"unknown output '{name}'")
+
+
+def check_output(name):
+    kind, _, species = name.partition(":")
+    if kind == "clot_time" and not species:
+        return
+    if kind not in ("peak", "peak_time", "final"):
+        raise ValueError(
+            f"unknown output '{name}', expected clot_time, peak:NAME, "
+            "peak_time:NAME or final:NAME"
+        )
+    if species not in SPECIES_INDEX:
+        raise ValueError(f"unknown species '{species}'")
+
+
+def parameters(simulation, reactions=None) -> list:
+    # every constant a reaction actually uses, then the starting amount of
+    # every species a reaction reads that the scenario does not leave at 0
+    reactions = SimulationVariables.reactions if reactions is None else reactions
+    found = []
+    used = set()
+    for reaction in reactions:
+        # tail included: every reaction caps its step at source / tail
+        for field in used_constants(reaction):
+            found.append(Parameter(reaction.name, field, getattr(reaction, field)))
+        used.update(
+            (
+                reaction.source,
+                reaction.catalyst,
+                reaction.catalyst_2,
+                reaction.inhibitor_1,
+                reaction.inhibitor_2,
+            )
+        )
+    for name, index in SPECIES_INDEX.items():
+        if name in used and simulation._values[index]:
+            found.append(Parameter(name, None, simulation._values[index]))
+    return found
+
+
+def summarise(batch, steps, threshold=ASSAY_FIBRIN_THRESHOLD) -> Summary:
+    # steps the batch, keeping running peaks and the clot time instead of
+    # whole trajectories; stops early once no column changes any more
+    values = batch.values
+    peak = values.copy()
+    peak_tick = np.zeros(values.shape, dtype=np.int64)
+    fibrin = values[FIBRIN] + values[CROSS_LINKED_FIBRIN]
+    clot_time = np.where(fibrin >= threshold, 0.0, np.inf)
+    for tick in range(1, steps + 1):
+        if not batch.time_passes().any():
+            break
+        higher = values > peak
+        peak[higher] = values[higher]
+        peak_tick[higher] = tick
+        previous = fibrin
+        fibrin = values[FIBRIN] + values[CROSS_LINKED_FIBRIN]
+        clotted = np.isinf(clot_time) & (fibrin >= threshold)
+        if clotted.any():
+            # where within the tick the threshold was crossed
+            fraction = (threshold - previous[clotted]) / (
+                fibrin[clotted] - previous[clotted]
+            )
+            clot_time[clotted] = (tick - 1 + fraction) / TICKS_PER_SECOND
+    return Summary(peak, peak_tick, values.copy(), clot_time)
+
+
+@dataclass
+class SensitivityResult:
+    parameters: list
+    outputs: tuple
+    # outputs of the unperturbed scenario
+    base: np.ndarray
+    # one row per parameter, one column per output: the relative change in
+    # the output over the relative change in the parameter, nan where the
+    # base output is 0 or infinite
+    coefficients: np.ndarray
+
+    def ranked(self) -> list:
+        # parameter indices, largest effect on any output first
+        strength = np.nan_to_num(np.abs(self.coefficients)).max(axis=1)
+        return sorted(range(len(self.parameters)), key=lambda row: -strength[row])
+
+    def write_csv(self, path):
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(("parameter", "value", *self.outputs))
+            for parameter, row in zip(self.parameters, self.coefficients):
+                writer.writerow((parameter.label, parameter.value, *row))
+
+    def format_table(self, top=None) -> str:
+        rows = self.ranked()[:top]
+        width = max(len(output) for output in self.outputs) + 2
+        lines = [
+            f"{'parameter':<44}" + "".join(f"{o:>{width}}" for o in self.outputs),
+            f"{'(base)':<44}" + "".join(f"{v:>{width}.4g}" for v in self.base),
+        ]
+        for row in rows:
+            lines.append(
+                f"{self.parameters[row].label:<44}"
+                + "".join(f"{c:>{width}.3f}" for c in self.coefficients[row])
+            )
+        return "\n".join(lines)
+
+
+def analyse(
+    simulation,
+    steps,
+    outputs=DEFAULT_OUTPUTS,
+    step=DEFAULT_STEP,
+    reactions=None,
+    chosen=None,
+) -> SensitivityResult:
+    # local sensitivities by central differences: column 0 is the scenario
+    # itself, then each parameter scaled by 1 + step and 1 - step, all run
+    # as one batch
+    for name in outputs:
+        check_output(name)
+    if not 0 < step < 1:
+        raise ValueError("step must be between 0 and 1")
+    chosen = parameters(simulation, reactions) if chosen is None else chosen
+    columns = [simulation]
+    for parameter in chosen:
+        for factor in (1 + step, 1 - step):
+            column = simulation.copy()
+            if parameter.field is None:
+                setattr(column, parameter.name, parameter.value * factor)
+            columns.append(column)
+    batch = BatchSimulation(columns, reactions)
+    for row, parameter in enumerate(chosen):
+        if parameter.field is not None:
+            values = np.full(batch.size, float(parameter.value))
+            values[2 * row + 1] *= 1 + step
+            values[2 * row + 2] *= 1 - step
+            batch.set_constant(parameter.name, parameter.field, values)
+    batch.prune()
+    summary = summarise(batch, steps)
+    results = np.array([summary.output(name) for name in outputs])
+    base = results[:, 0]
+    up = results[:, 1::2].T
+    down = results[:, 2::2].T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coefficients = (up - down) / (2 * step * base)
+    coefficients[:, (base == 0) | ~np.isfinite(base)] = np.nan
+    return SensitivityResult(chosen, tuple(outputs), base, coefficients)
@@ -0,0 +1,580 @@
+import argparse
+import asyncio
+import base64
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import struct
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from urllib.parse import parse_qs, urlsplit
+
+from constants import (
+    SERVICE_CHUNK_ROWS,
+    SERVICE_MAX_PAYLOAD,
+    SERVICE_MAX_STEPS,
+    SERVICE_MEMORY_BYTES,
+    SERVICE_PORT,
+    disorders,
+    simulation_modes,
+)
+from runner import build_simulation, run_simulation, tick_times
+from simulation_variables import SimulationVariables, load_parameters
+from species import SPECIES, SPECIES_INDEX
+from trajectory_cache import TrajectoryCache, default_directory
+
+BACKENDS = ("discrete", "ode")
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OPCODE_TEXT = 0x1
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+CLOSE_TOO_BIG = 1009
+REASONS = {
+    101: "Switching Protocols",
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    413: "Content Too Large",
+    500: "Internal Server Error",
+}
+
+
+class RequestError(ValueError):
+    # an HTTP request refused before its body is read, with the status to
+    # answer it with
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class FrameTooLarge(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class RunRequest:
+    # everything that decides a trajectory, so equal requests share results
+    preset: str = "None"
+    disorder: str = "None"
+    overrides: tuple = ()
+    steps: int = 2000
+    species: tuple = SPECIES
+    backend: str = "discrete"
+
+    def __post_init__(self):
+        if self.preset not in simulation_modes:
+            raise ValueError(f"unknown preset '{self.preset}'")
+        if self.disorder not in disorders:
+            raise ValueError(f"unknown disorder '{self.disorder}'")
+        if not 0 <= self.steps <= SERVICE_MAX_STEPS:
+            raise ValueError(f"steps must be between 0 and {SERVICE_MAX_STEPS}")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"unknown backend '{self.backend}'")
+        unknown = [
+            name
+            for name in (*self.species, *(name for name, _ in self.overrides))
+            if name not in SPECIES_INDEX
+        ]
+        if unknown:
+            raise ValueError(f"unknown species: {', '.join(unknown)}")
+
+    @classmethod
+    def from_json(cls, data):
+        if not isinstance(data, dict):
+            raise ValueError("expected a JSON object")
+        try:
+            return cls(
+                preset=data.get("preset", "None"),
+                disorder=data.get("disorder", "None"),
+                overrides=tuple(
+                    sorted(
+                        (name, float(value))
+                        for name, value in data.get("overrides", {}).items()
+                    )
+                ),
+                steps=int(data.get("steps", 2000)),
+                species=tuple(data.get("species") or SPECIES),
+                backend=data.get("backend", "discrete"),
+            )
+        except (AttributeError, TypeError) as error:
+            raise ValueError(f"malformed request: {error}") from None
+
+    @classmethod
+    def from_query(cls, query):
+        # /run?preset=...&disorder=...&set=factor8=0&steps=...&species=a,b
+        fields = parse_qs(query)
+        overrides = {}
+        for pair in fields.get("set", []):
+            name, _, value = pair.partition("=")
+            overrides[name] = value
+        data = {name: values[-1] for name, values in fields.items() if name != "set"}
+        if "species" in data:
+            data["species"] = [name for name in data["species"].split(",") if name]
+        try:
+            data["overrides"] = {
+                name: float(value) for name, value in overrides.items()
+            }
+        except ValueError:
+            raise ValueError("expected set=NAME=VALUE") from None
+        return cls.from_json(data)
+
+    def header(self, source) -> dict:
+        return {
+            "preset": self.preset,
+            "disorder": self.disorder,
+            "overrides": dict(self.overrides),
+            "steps": self.steps,
+            "species": list(self.species),
+            "backend": self.backend,
+            "source": source,
+        }
+
+
+def compute(request, cache_directory=None):
+    # runs in a worker process: the trajectory, from the on-disk cache when
+    # one is given and holds it, already encoded as the JSON messages every
+    # client of this request is sent, so the event loop only copies bytes
+    simulation = build_simulation(
+        request.preset, request.disorder, dict(request.overrides)
+    )
+    start_tick = simulation.current_time
+    hit = False
+    if cache_directory is None:
+        trajectory = run_simulation(
+            simulation, request.steps, request.species, request.backend
+        )
+    else:
+        cache = TrajectoryCache(cache_directory)
+        trajectory = cache.run(
+            simulation, request.steps, request.species, request.backend
+        )
+        hit = bool(cache.hits)
+    times = tick_times(start_tick, request.steps)
+    chunks = tuple(
+        json.dumps(
+            {
+                "time": times[start : start + SERVICE_CHUNK_ROWS].tolist(),
+                "values": trajectory[start : start + SERVICE_CHUNK_ROWS].tolist(),
+            }
+        ).encode()
+        for start in range(0, len(times), SERVICE_CHUNK_ROWS)
+    )
+    return hit, chunks
+
+
+class SimulationService:
+    # hands runs to a process pool so the event loop only parses requests
+    # and writes bytes. A request equal to one being computed waits for that
+    # computation instead of starting another, and finished results are kept
+    # in memory (least recently used go first past memory_bytes) on top of
+    # the on-disk trajectory cache.
+    def __init__(
+        self,
+        workers=None,
+        cache_directory=None,
+        memory_bytes=SERVICE_MEMORY_BYTES,
+        executor=None,
+    ):
+        # spawned rather than forked workers, which would hold on to the
+        # listening socket and every client connection open at the time;
+        # they are handed the reactions so loaded constants still apply
+        self.executor = executor or ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=SimulationVariables.use_reactions,
+            initargs=(SimulationVariables.reactions,),
+        )
+        self.cache_directory = cache_directory
+        self.memory_bytes = memory_bytes
+        self._results = OrderedDict()
+        self._held = 0
+        self._inflight = {}
+        # handler tasks of the open client connections
+        self.connections = set()
+        self.counts = {
+            "requests": 0,
+            "computed": 0,
+            "disk_hits": 0,
+            "memory_hits": 0,
+            "shared": 0,
+            "errors": 0,
+        }
+
+    async def result(self, request):
+        # (source, encoded chunks); source says where they came from
+        self.counts["requests"] += 1
+        chunks = self._results.get(request)
+        if chunks is not None:
+            self._results.move_to_end(request)
+            self.counts["memory_hits"] += 1
+            return "memory", chunks
+        task = self._inflight.get(request)
+        if task is not None:
+            self.counts["shared"] += 1
+            _, chunks = await asyncio.shield(task)
+            return "shared", chunks
+        task = asyncio.ensure_future(self._compute(request))
+        self._inflight[request] = task
+        task.add_done_callback(lambda _: self._inflight.pop(request, None))
+        # shielded: a client hanging up must not cancel a shared computation
+        return await asyncio.shield(task)
+
+    async def _compute(self, request):
+        loop = asyncio.get_running_loop()
+        hit, chunks = await loop.run_in_executor(
+            self.executor, compute, request, self.cache_directory
+        )
+        self.counts["disk_hits" if hit else "computed"] += 1
+        self._remember(request, chunks)
+        return ("disk" if hit else "computed"), chunks
+
+    def _remember(self, request, chunks):
+        size = sum(len(chunk) for chunk in chunks)
+        if size > self.memory_bytes:
+            return
+        self._results[request] = chunks
+        self._held += size
+        while self._held > self.memory_bytes:
+            _, dropped = self._results.popitem(last=False)
+            self._held -= sum(len(chunk) for chunk in dropped)
+
+    def stats(self) -> dict:
+        return {
+            **self.counts,
+            "in_flight": len(self._inflight),
+            "results_held": len(self._results),
+            "memory_bytes": self._held,
+        }
+
+    def options(self) -> dict:
+        return {
+            "presets": simulation_modes,
+            "disorders": disorders,
+            "species": SPECIES,
+            "backends": BACKENDS,
+            "max_steps": SERVICE_MAX_STEPS,
+        }
+
+    async def handle(self, reader, writer):
+        # one client connection: HTTP/1.1 requests with keep-alive until the
+        # client closes or upgrades to a WebSocket
+        self.connections.add(asyncio.current_task())
+        try:
+            while True:
+                message = await read_request(reader)
+                if message is None:
+                    break
+                method, target, headers, body = message
+                url = urlsplit(target)
+                if (
+                    url.path == "/ws"
+                    and headers.get("upgrade", "").lower() == "websocket"
+                ):
+                    await self.websocket(reader, writer, headers)
+                    break
+                if not await self.respond(writer, method, url, body):
+                    break
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except RequestError as error:
+            # the body was not read, so the connection cannot carry on
+            self.counts["errors"] += 1
+            with contextlib.suppress(ConnectionError):
+                await send_json(writer, error.status, {"error": str(error)})
+        except (
+            ConnectionError,
+            ValueError,
+            asyncio.IncompleteReadError,
+            asyncio.LimitOverrunError,
+        ):
+            # a dropped connection or a request that is not HTTP
+            pass
+        finally:
+            writer.close()
+            self.connections.discard(asyncio.current_task())
+
+    async def respond(self, writer, method, url, body) -> bool:
+        match method, url.path:
+            case "GET", "/":
+                await send(writer, 200, INDEX_PAGE.encode(), "text/html")
+            case "GET", "/health":
+                await send_json(writer, 200, {"status": "ok"})
+            case "GET", "/stats":
+                await send_json(writer, 200, self.stats())
+            case "GET", "/options":
+                await send_json(writer, 200, self.options())
+            case ("GET" | "POST"), "/run":
+                try:
+                    request = (
+                        RunRequest.from_json(json.loads(body or b"{}"))
+                        if method == "POST"
+                        else RunRequest.from_query(url.query)
+                    )
+                except ValueError as error:
+                    self.counts["errors"] += 1
+                    await send_json(writer, 400, {"error": str(error)})
+                    return True
+                try:
+                    source, chunks = await self.result(request)
+                except Exception as error:
+                    self.counts["errors"] += 1
+                    await send_json(writer, 500, {"error": str(error)})
+                    return True
+                await self.stream(writer, request.header(source), chunks)
+            case _:
+                await send_json(writer, 404, {"error": f"no route {url.path}"})
+        return True
+
+    async def stream(self, writer, header, chunks):
+        # newline-delimited JSON over chunked transfer encoding: the header,
+        # one line per block of rows, then {"done": true}
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        for payload in (json.dumps(header).encode(), *chunks, b'{"done": true}'):
+            writer.write(b"%x\r\n%s\n\r\n" % (len(payload) + 1, payload))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def websocket(self, reader, writer, headers):
+        # each text message from the client is a run request; the reply is
+        # the header, one message per block of rows, then {"done": true}
+        key = headers.get("sec-websocket-key", "")
+        if not key:
+            self.counts["errors"] += 1
+            await send_json(writer, 400, {"error": "missing Sec-WebSocket-Key"})
+            return
+        accept = base64.b64encode(
+            hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()
+        ).decode()
+        writer.write(
+            b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+            b"Connection: Upgrade\r\nSec-WebSocket-Accept: %s\r\n\r\n" % accept.encode()
+        )
+        await writer.drain()
+        while True:
+            try:
+                opcode, payload = await read_frame(reader)
+            except FrameTooLarge:
+                self.counts["errors"] += 1
+                writer.write(
+                    encode_frame(struct.pack("!H", CLOSE_TOO_BIG), OPCODE_CLOSE)
+                )
+                await writer.drain()
+                return
+            if opcode == OPCODE_CLOSE:
+                writer.write(encode_frame(payload[:2], OPCODE_CLOSE))
+                await writer.drain()
+                return
+            if opcode == OPCODE_PING:
+                writer.write(encode_frame(payload, OPCODE_PONG))
+                await writer.drain()
+                continue
+            if opcode != OPCODE_TEXT:
+                continue
+            try:
+                request = RunRequest.from_json(json.loads(payload))
+                source, chunks = await self.result(request)
+            except Exception as error:
+                # a bad request or failed run is reported, not fatal
+                self.counts["errors"] += 1
+                writer.write(encode_frame(json.dumps({"error": str(error)}).encode()))
+                await writer.drain()
+                continue
+            for message in (
+                json.dumps(request.header(source)).encode(),
+                *chunks,
+                b'{"done": true}',
+            ):
+                writer.write(encode_frame(message))
+                await writer.drain()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+async def read_request(reader):
+    # (method, target, lower-cased headers, body), or None once the client
+    # has closed the connection between requests
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as error:
+        if error.partial.strip():
+            raise
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name:
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise RequestError(400, "Content-Length is not a number") from None
+    if length < 0:
+        raise RequestError(400, "Content-Length is negative")
+    if length > SERVICE_MAX_PAYLOAD:
+        raise RequestError(413, f"the body may be at most {SERVICE_MAX_PAYLOAD} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method, target, headers, body
+
+
+async def send(writer, status, body, content_type):
+    writer.write(
+        b"HTTP/1.1 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n%s"
+        % (status, REASONS[status].encode(), content_type.encode(), len(body), body)
+    )
+    await writer.drain()
+
+
+async def send_json(writer, status, document):
+    await send(writer, status, json.dumps(document).encode(), "application/json")
+
+
+def encode_frame(payload, opcode=OPCODE_TEXT, mask=None) -> bytes:
+    # one final WebSocket frame; clients must pass a 4 byte mask
+    length = len(payload)
+    masked = 0x80 if mask else 0
+    if length < 126:
+        head = struct.pack("!BB", 0x80 | opcode, masked | length)
+    elif length < 1 << 16:
+        head = struct.pack("!BBH", 0x80 | opcode, masked | 126, length)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, masked | 127, length)
+    if not mask:
+        return head + payload
+    return head + mask + _apply_mask(payload, mask)
+
+
+def _apply_mask(payload, mask) -> bytes:
+    repeated = (mask * (len(payload) // 4 + 1))[: len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(
+        len(payload), "big"
+    )
+
+
+async def read_frame(reader, max_payload=SERVICE_MAX_PAYLOAD):
+    # (opcode, payload) of the next message, joining continuation frames;
+    # FrameTooLarge before reading a message longer than max_payload
+    message = b""
+    opcode = None
+    while True:
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            (length,) = struct.unpack("!H", await reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack("!Q", await reader.readexactly(8))
+        if len(message) + length > max_payload:
+            raise FrameTooLarge(f"a message may be at most {max_payload} bytes")
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask:
+            payload = _apply_mask(payload, mask)
+        if first & 0x0F:
+            opcode = first & 0x0F
+        message += payload
+        if first & 0x80:
+            return opcode, message
+
+
+INDEX_PAGE = """<!doctype html>
+<meta charset="utf-8">
+<title>Coagulation Simulator</title>
+<style>body{font-family:sans-serif;background:#FFFDD0;margin:2em}
+select,input,button{margin:0 1em .5em 0}canvas{background:#fff;display:block}</style>
+<h1>Coagulation Simulator</h1>
+<label>Preset <select id="preset"></select></label>
+<label>Disorder <select id="disorder"></select></label>
+<label>Species <select id="species"></select></label>
+<label>Steps <input id="steps" type="number" value="2000" min="0"></label>
+<button id="run">Run</button> <span id="status"></span>
+<canvas id="plot" width="900" height="400"></canvas>
+<script>
+const $ = (id) => document.getElementById(id);
+const fill = (select, names, chosen) => names.forEach((name) =>
+  select.add(new Option(name, name, false, name === chosen)));
+fetch("/options").then((r) => r.json()).then((options) => {
+  fill($("preset"), options.presets, "Haemostasis (Pro-thrombotic)");
+  fill($("disorder"), options.disorders, "None");
+  fill($("species"), options.species, "thrombin");
+});
+const socket = new WebSocket(`ws://${location.host}/ws`);
+let time = [], values = [];
+socket.onmessage = (event) => {
+  const message = JSON.parse(event.data);
+  if (message.error) { $("status").textContent = message.error; return; }
+  if (message.source) { time = []; values = []; $("status").textContent = message.source; }
+  if (message.time) { time.push(...message.time); values.push(...message.values.map((row) => row[0])); }
+  if (message.done) draw();
+};
+function draw() {
+  const canvas = $("plot"), context = canvas.getContext("2d");
+  const top = Math.max(...values, 1e-9), end = Math.max(time[time.length - 1], 1e-9);
+  context.clearRect(0, 0, canvas.width, canvas.height);
+  context.strokeStyle = "#4169E1";
+  context.beginPath();
+  time.forEach((t, i) => context.lineTo(t / end * canvas.width,
+    canvas.height - values[i] / top * (canvas.height - 10)));
+  context.stroke();
+  context.fillText(`max ${top.toFixed(2)} at ${end} s`, 10, 15);
+}
+$("run").onclick = () => socket.send(JSON.stringify({
+  preset: $("preset").value, disorder: $("disorder").value,
+  steps: Number($("steps").value), species: [$("species").value],
+}));
+</script>
+"""
+
+
+async def serve(host, port, service):
+    server = await asyncio.start_server(service.handle, host, port)
+    addresses = ", ".join(str(socket.getsockname()) for socket in server.sockets)
+    print(f"serving on {addresses}", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m server",
+        description="Serve simulations over HTTP and WebSocket to many browsers",
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="0.0.0.0 to accept other machines"
+    )
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument(
+        "--workers", type=int, help="worker processes (default: all cores)"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="keep results in memory only, not in the on-disk trajectory cache",
+    )
+    parser.add_argument(
+        "--parameters", metavar="JSON", help="reaction constants written by calibrate"
+    )
+    args = parser.parse_args(argv)
+    load_parameters(args.parameters)
+    service = SimulationService(
+        args.workers, None if args.no_cache else default_directory()
+    )
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
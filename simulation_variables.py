@@ -1,327 +1,258 @@
-from dataclasses import dataclass
-from constants import SIMULATION_END
-
+import os
+import sys
 
-line_1_y = []
-line_2_y = []
-
-
-@dataclass
-class ReactionVariables:
-    catalyst_amount: float
-    source_amount: float
-    divisor: float
-    catalyst_2_amount: float = 0.0
-    calcium_ions: float = 1.2
-    reaction_affected_by_calcium: bool = False
-    multiplier: float = 1.0
-    inhibitor_1_amount: float = 0.0
-    multiplier_i1: float = 0.0
-    inhibitor_2_amount: float = 0.0
-    multiplier_i2: float = 0.0
-    tail: float = 100.0
-    vitamin_k: bool = False
-    maximum_inhibitor_amount: float = 0.0
-
-    def get_reaction_size(self) -> float:
-        maximum_source_available = self.source_amount / self.tail
-        if self.source_amount < 0.005:
-            return 0
-        self.maximum_inhibitor_amount = self.get_maximum_inhibitor_amount()
-        maximum_catalyst_available = self.get_maximum_catalyst_available()
-        change = min(maximum_source_available, maximum_catalyst_available)
-        return change
-
-    def get_maximum_catalyst_available(self):
-        maximum_catalyst_available = (
-            max(
-                self.catalyst_amount,
-                self.catalyst_2_amount,
-                min(self.catalyst_amount, self.catalyst_2_amount) * self.multiplier,
-            )
-            / self.divisor
-            - self.maximum_inhibitor_amount
-        )
-        return max(maximum_catalyst_available * self.calcium_multiplier(), 0)
-
-    def calcium_multiplier(self) -> float:
-        if not self.reaction_affected_by_calcium:
-            return 1.0
-        if self.calcium_ions > 1.199:
-            return 1.0
-        return (self.calcium_ions / 1.2) ** 3
-
-    def get_maximum_inhibitor_amount(self):
-        return max(
-            self.inhibitor_1_amount * self.multiplier_i1,
-            self.inhibitor_2_amount * self.multiplier_i2,
-        )
+from constants import SIMULATION_END
+from reactions import (
+    REACTIONS,
+    Reaction,
+    ReactionVariables,
+    compile_reactions,
+    load_constants,
+    possible_reactions,
+    step,
+    with_constants,
+)
+from species import SPECIES, SPECIES_DEFAULTS, SPECIES_INDEX
+
+DEFAULT_VALUES = [*SPECIES_DEFAULTS.values(), 0.0]
+ZERO_VALUES = [0.0] * len(DEFAULT_VALUES)
+FIELD_NAMES = ("speed", "current_time", "injury_stage", *SPECIES)
 
 
-@dataclass
 class SimulationVariables:
-    # values of compounds are roughly aiming to be in ratio of 1AU = 0.1ng/mL
-    speed: int = 64
-    vWF: float = 100000
-    activated_platelets: float = 0
-    glyc1b: float = 0
-    glyc2b3a: float = 0
-    prostacyclin: float = 0
-    endothelin: float = 0
-    nitric_oxide: float = 0
-    alpha_granules: float = 0
-    dense_granules: float = 0
-    serotonin: float = 0
-    aDP: float = 0
-    subendothelium: float = 0
-    current_time: int = 0
-    injury_stage: int = -1
-    iNR: float = 1.0
-    aPTT: float = 30
-    calcium_ions: float = 1.2
-    fibrinogen: float = 50000
-    fibrin: float = 0
-    prothrombin: float = 10000
-    thrombin: float = 0
-    tissue_factor: float = 0
-    factor5: float = 1000
-    factor5a: float = 0
-    factor7: float = 100
-    factor7a: float = 0
-    factor8: float = 1000
-    factor8a: float = 0
-    factor9: float = 1000
-    factor9a: float = 0
-    factor10: float = 1000
-    factor10a: float = 0
-    factor11: float = 1000
-    factor11a: float = 0
-    factor12: float = 1000
-    factor12a: float = 0
-    factor13: float = 10000
-    factor13a: float = 0
-    cross_linked_fibrin: float = 0
-    platelets: float = 300
-    protein_c: float = 10000
-    protein_ca: float = 0
-    tFPI: float = 0
-    antithrombin3: float = 0
-    thrombomodulin: float = 0
-    protein_s: float = 0
-    c1_esterase_inhibitor: float = 0
-    plasmin: float = 0
-    plasminogen: float = 10000
-    tAFI: float = 1000
-    tAFIa: float = 0
-    tPA: float = 0
-    pAI1: float = 100
-    a2A: float = 100
-    fDP: float = 0
-    dummy: float = 0
+    # species amounts live in one flat list in SPECIES order (plus the zero
+    # slot read by the reaction table); each species is exposed as a property.
+    # A list rather than array('d') because the step reads every amount
+    # several times and a list hands back the stored float without boxing.
+    __slots__ = (
+        "speed",
+        "current_time",
+        "injury_stage",
+        "profiler",
+        "_values",
+        "_possible_table",
+    )
+    reactions = REACTIONS
+    reaction_table = compile_reactions(REACTIONS)
+    _reaction_lookup = {
+        reaction.name: compiled for reaction, compiled in zip(REACTIONS, reaction_table)
+    }
+
+    def __init__(self, speed=64, current_time=0, injury_stage=-1, **species):
+        self.speed = speed
+        self.current_time = current_time
+        self.injury_stage = injury_stage
+        # an instrumentation.ReactionProfiler while profiling is switched on
+        self.profiler = None
+        self._values = DEFAULT_VALUES.copy()
+        # the part of reaction_table that can fire from the current state,
+        # worked out again whenever a species is set from outside the model
+        self._possible_table = None
+        for name, value in species.items():
+            if name not in SPECIES_INDEX:
+                raise TypeError(f"unknown simulation variable '{name}'")
+            self._values[SPECIES_INDEX[name]] = value
+
+    @classmethod
+    def use_reactions(cls, reactions):
+        # swaps the reaction table for every simulation made from now on;
+        # meant for startup, before any simulation has been stepped
+        reactions = tuple(reactions)
+        missing = {reaction.name for reaction in REACTIONS} - {
+            reaction.name for reaction in reactions
+        }
+        if missing:
+            raise ValueError(f"missing reactions: {', '.join(sorted(missing))}")
+        cls.reactions = reactions
+        cls.reaction_table = compile_reactions(reactions)
+        cls._reaction_lookup = {
+            reaction.name: compiled
+            for reaction, compiled in zip(reactions, cls.reaction_table)
+        }
+
+    def __eq__(self, other):
+        # equal states, as when this was a dataclass; the profiler and the
+        # cached reaction table are not part of the state
+        if not isinstance(other, SimulationVariables):
+            return NotImplemented
+        return self.field_values() == other.field_values()
+
+    # mutable, so unhashable like the dataclass it replaced
+    __hash__ = None
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in FIELD_NAMES)
+        return f"SimulationVariables({fields})"
+
+    def field_values(self) -> tuple:
+        # values in FIELD_NAMES order
+        return (self.speed, self.current_time, self.injury_stage, *self._values[:-1])
+
+    def restore(self, values):
+        # the inverse of field_values()
+        self.speed = values[0]
+        self.current_time = int(values[1])
+        self.injury_stage = int(values[2])
+        self.load_amounts(values[3:])
+
+    def load_amounts(self, amounts):
+        # every species amount at once, in SPECIES order
+        self._values[:-1] = amounts
+        self._possible_table = None
+
+    def copy(self):
+        other = SimulationVariables.__new__(SimulationVariables)
+        other.speed = self.speed
+        other.current_time = self.current_time
+        other.injury_stage = self.injury_stage
+        other.profiler = None
+        other._values = self._values.copy()
+        other._possible_table = self._possible_table
+        return other
+
+    __copy__ = copy
+
+    def nbytes(self) -> int:
+        # memory held by this state: the instance, the list and each
+        # distinct float object in it
+        floats = {id(value): value for value in self._values}
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self._values)
+            + sum(sys.getsizeof(value) for value in floats.values())
+        )
 
     def reset(self):
-        self.__dict__ = SimulationVariables().__dict__
+        self.speed = 64
+        self.current_time = 0
+        self.injury_stage = -1
+        self._values[:] = DEFAULT_VALUES
+        self._possible_table = None
 
     def clear(self):
-        self.__dict__ = {i: 0 for i in self.__dict__.keys()}
+        self.speed = 0
+        self.current_time = 0
+        self.injury_stage = 0
+        self._values[:] = ZERO_VALUES
+        self._possible_table = None
+
+    def apply_reaction(self, name):
+        step(self._values, (self._reaction_lookup[name],))
+        self._possible_table = None
+
+    def catalyze(self, catalyst, source, destination, divisor, **options):
+        # a one-off reaction outside the table; options are the optional
+        # Reaction fields (catalyst_2, multiplier, inhibitors, tail, ...)
+        reaction = Reaction(
+            "catalyze", catalyst, source, destination, divisor, **options
+        )
+        moved = step(self._values, (reaction.compile(),))
+        self._possible_table = None
+        return moved
 
     def convert_factor12(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.subendothelium,
-            source_amount=self.factor12,
-            divisor=100,
-        )
-        self.perform_reaction("factor12", "factor12a", reaction.get_reaction_size())
+        self.apply_reaction("convert_factor12")
 
     def convert_factor11(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.factor12a,
-            source_amount=self.factor11,
-            divisor=500,
-        )
-        self.perform_reaction("factor11", "factor11a", reaction.get_reaction_size())
+        self.apply_reaction("convert_factor11")
 
     def convert_factor9(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.factor11a,
-            source_amount=self.factor9,
-            divisor=2000,
-            reaction_affected_by_calcium=True,
-            catalyst_2_amount=self.factor7a,
-            multiplier=200,
-        )
-        self.perform_reaction("factor9", "factor9a", reaction.get_reaction_size())
+        self.apply_reaction("convert_factor9")
 
     def convert_factor10_intrinsic(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.factor9a,
-            catalyst_2_amount=self.factor8a,
-            source_amount=self.factor10,
-            divisor=120000,
-            multiplier=3000,
-            reaction_affected_by_calcium=True,
-        )
-        self.perform_reaction("factor10", "factor10a", reaction.get_reaction_size())
+        self.apply_reaction("convert_factor10_intrinsic")
 
     def convert_factor7(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.tissue_factor,
-            source_amount=self.factor7,
-            divisor=1000,
-        )
-        self.perform_reaction("factor7", "factor7a", reaction.get_reaction_size())
+        self.apply_reaction("convert_factor7")
 
     def convert_factor10_extrinsic(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.factor7a,
-            source_amount=self.factor10,
-            divisor=1000,
-        )
-        self.perform_reaction("factor10", "factor10a", reaction.get_reaction_size())
+        self.apply_reaction("convert_factor10_extrinsic")
 
     def convert_prothrombin(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.factor10a,
-            catalyst_2_amount=self.factor5a,
-            source_amount=self.prothrombin,
-            divisor=120000,
-            multiplier=6000,
-            reaction_affected_by_calcium=True,
-            inhibitor_1_amount=self.tFPI,
-            multiplier_i1=0.1,
-        )
-        self.perform_reaction("prothrombin", "thrombin", reaction.get_reaction_size())
+        self.apply_reaction("convert_prothrombin")
 
     def thrombin_convert_factor11(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.thrombin,
-            source_amount=self.factor11,
-            divisor=1000,
-        )
-        self.perform_reaction("factor11", "factor11a", reaction.get_reaction_size())
+        self.apply_reaction("thrombin_convert_factor11")
 
     def thrombin_convert_factor8(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.thrombin,
-            source_amount=self.factor8,
-            divisor=1000,
-        )
-        self.perform_reaction("factor8", "factor8a", reaction.get_reaction_size())
+        self.apply_reaction("thrombin_convert_factor8")
 
     def thrombin_convert_factor7(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.thrombin,
-            source_amount=self.factor7,
-            divisor=1000,
-        )
-        self.perform_reaction("factor7", "factor7a", reaction.get_reaction_size())
+        self.apply_reaction("thrombin_convert_factor7")
 
     def convert_factor5(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.thrombin,
-            catalyst_2_amount=self.factor10a,
-            source_amount=self.factor5,
-            divisor=120_000,
-            multiplier=6000,
-        )
-        self.perform_reaction("factor5", "factor5a", reaction.get_reaction_size())
+        self.apply_reaction("convert_factor5")
 
     def convert_fibrinogen(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.thrombin,
-            source_amount=self.fibrinogen,
-            divisor=15,
-            reaction_affected_by_calcium=True,
-        )
-        self.perform_reaction("fibrinogen", "fibrin", reaction.get_reaction_size())
+        self.apply_reaction("convert_fibrinogen")
 
     def convert_factor13(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.thrombin,
-            source_amount=self.factor13,
-            divisor=20,
-        )
-        self.perform_reaction("factor13", "factor13a", reaction.get_reaction_size())
+        self.apply_reaction("convert_factor13")
 
     def convert_fibrin(self):
-        reaction = ReactionVariables(
-            catalyst_amount=self.factor13a, source_amount=self.fibrin, divisor=50
-        )
-        self.perform_reaction(
-            "fibrin", "cross_linked_fibrin", reaction.get_reaction_size()
-        )
+        self.apply_reaction("convert_fibrin")
+
+    def tpa_convert_plasminogen(self):
+        self.apply_reaction("tpa_convert_plasminogen")
+
+    def plasmin_degrade_cross_linked_fibrin(self):
+        self.apply_reaction("plasmin_degrade_cross_linked_fibrin")
 
-    def time_passes(self):
-        self.convert_fibrinogen()
-        self.convert_fibrin()
-        self.convert_prothrombin()
-        self.thrombin_convert_factor7()
-        self.thrombin_convert_factor8()
-        self.thrombin_convert_factor11()
-        self.convert_factor5()
-        self.convert_factor7()
-        self.convert_factor9()
-        self.convert_factor10_extrinsic()
-        self.convert_factor10_intrinsic()
-        self.convert_factor11()
-        self.convert_factor12()
-        self.convert_factor13()
-        # TODO: add remaining reactions
-        # self.catalyze("factor13a", "fibrin", "cross_linked_fibrin", 50)
-        # self.catalyze("tPA", "plasminogen", "plasmin", 20, tail=500)
-        # self.catalyze(
-        #     "plasmin",
-        #     "cross_linked_fibrin",
-        #     "fDP",
-        #     20,
-        #     inhibitor_1="tAFIa",
-        #     multiplier_i1=0.15,
-        # )
-        # self.catalyze(
-        #     "plasmin",
-        #     "fibrin",
-        #     "fDP",
-        #     40,
-        #     inhibitor_1="tAFIa",
-        #     multiplier_i1=0.15,
-        # )
-        # self.catalyze("thrombin", "tAFI", "tAFIa", 400)
-        # self.catalyze("pAI1", "tPA", "dummy", 500)
-        # self.catalyze("a2A", "plasmin", "dummy", 100)
-        # if self.thrombomodulin > 0.01:
-        #     self.catalyze(
-        #         "thrombomodulin",
-        #         "protein_c",
-        #         "protein_ca",
-        #         100,
-        #         catalyst_2="thrombin",
-        #         multiplier=100,
-        #     )
-        # self.catalyze(
-        #     "protein_ca",
-        #     "factor8a",
-        #     "dummy",
-        #     2000,
-        #     catalyst_2="protein_s",
-        #     multiplier=2000,
-        # )
-        # self.catalyze(
-        #     "protein_ca",
-        #     "factor5a",
-        #     "dummy",
-        #     2000,
-        #     catalyst_2="protein_s",
-        #     multiplier=2000,
-        # )
-        # self.catalyze("tFPI", "factor7a", "dummy", 2000)
-        # self.catalyze("tFPI", "factor10a", "dummy", 2000)
-        # self.catalyze("c1_esterase_inhibitor", "factor11a", "dummy", 2000)
-        # self.catalyze("c1_esterase_inhibitor", "factor12a", "dummy", 2000)
-        # self.catalyze("antithrombin3", "thrombin", "dummy", 2000)
-        # self.catalyze("antithrombin3", "factor10a", "dummy", 2000)
-        # self.catalyze("antithrombin3", "factor9a", "dummy", 2000)
+    def plasmin_degrade_fibrin(self):
+        self.apply_reaction("plasmin_degrade_fibrin")
 
+    def thrombin_convert_tafi(self):
+        self.apply_reaction("thrombin_convert_tafi")
+
+    def pai1_inhibit_tpa(self):
+        self.apply_reaction("pai1_inhibit_tpa")
+
+    def a2a_inhibit_plasmin(self):
+        self.apply_reaction("a2a_inhibit_plasmin")
+
+    def thrombomodulin_convert_protein_c(self):
+        self.apply_reaction("thrombomodulin_convert_protein_c")
+
+    def protein_ca_inhibit_factor8a(self):
+        self.apply_reaction("protein_ca_inhibit_factor8a")
+
+    def protein_ca_inhibit_factor5a(self):
+        self.apply_reaction("protein_ca_inhibit_factor5a")
+
+    def tfpi_inhibit_factor7a(self):
+        self.apply_reaction("tfpi_inhibit_factor7a")
+
+    def tfpi_inhibit_factor10a(self):
+        self.apply_reaction("tfpi_inhibit_factor10a")
+
+    def c1_esterase_inhibit_factor11a(self):
+        self.apply_reaction("c1_esterase_inhibit_factor11a")
+
+    def c1_esterase_inhibit_factor12a(self):
+        self.apply_reaction("c1_esterase_inhibit_factor12a")
+
+    def antithrombin3_inhibit_thrombin(self):
+        self.apply_reaction("antithrombin3_inhibit_thrombin")
+
+    def antithrombin3_inhibit_factor10a(self):
+        self.apply_reaction("antithrombin3_inhibit_factor10a")
+
+    def antithrombin3_inhibit_factor9a(self):
+        self.apply_reaction("antithrombin3_inhibit_factor9a")
+
+    def time_passes(self) -> float:
+        # returns the total amount converted this tick; once that is 0 no
+        # reaction can fire again until something outside the model changes
+        if self.profiler is None:
+            table = self._possible_table
+            if table is None:
+                table = possible_reactions(self.reaction_table, self._values)
+                self._possible_table = table
+            moved = step(self._values, table)
+        else:
+            moved = self.profiler.step(self._values, self.reaction_table)
         self.current_time += 1
+        return moved
 
     def perform_reaction(self, source, destination, change):
         source_amount = getattr(self, source)
@@ -353,6 +284,17 @@ class SimulationVariables:
         self.fibrinogen = 0
         self.cross_linked_fibrin = SIMULATION_END
 
+    def set_simulation_mode(self, text):
+        match text.upper():
+            case "HAEMOSTASIS (PRO-THROMBOTIC)":
+                self.set_haemostasis_mode(prothrombotic=True)
+            case "HAEMOSTASIS (ANTI-THROMBOTIC)":
+                self.set_haemostasis_mode(prothrombotic=False)
+            case "FIBRINOLYSIS":
+                self.set_fibrinolysis_mode()
+            case _:
+                pass
+
     def set_disorder(self, text):
         match text.upper():
             case "LIVER DISORDER":
@@ -375,3 +317,30 @@ class SimulationVariables:
                 self.calcium_ions = 0.9
             case _:
                 pass
+
+
+def _species_property(index):
+    def getter(self):
+        return self._values[index]
+
+    def setter(self, value):
+        self._values[index] = value
+        self._possible_table = None
+
+    return property(getter, setter)
+
+
+for _name, _index in SPECIES_INDEX.items():
+    setattr(SimulationVariables, _name, _species_property(_index))
+
+
+def load_parameters(path=None):
+    # fitted constants from a parameter file (see calibration.py), given
+    # directly or through $COAGULATION_PARAMETERS; without either the
+    # built-in constants stay
+    path = path or os.environ.get("COAGULATION_PARAMETERS")
+    if path:
+        SimulationVariables.use_reactions(
+            with_constants(REACTIONS, load_constants(path))
+        )
+    return path
@@ -0,0 +1,158 @@
+import queue
+from concurrent.futures import Future
+
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from constants import (
+    FRAME_RATE,
+    TICKS_PER_SECOND,
+    TIME_LIMIT_SECONDS,
+    WORKER_QUEUE_BATCHES,
+)
+from scheduler import StepScheduler
+from simulation_variables import FIELD_NAMES
+
+
+class SimulationWorker(QThread):
+    # steps the simulation off the GUI thread. Stepped states reach the GUI
+    # as (times, states) batches of field_values() rows through a bounded
+    # queue it drains once a frame; while the queue is full the worker waits
+    # instead of running ahead of what has been drawn. Resuming, pausing and
+    # single steps are commands carried out between batches, and the GUI
+    # only touches the simulation itself while the worker is paused.
+    stopped = pyqtSignal()
+
+    def __init__(self, simulation, cache=None, max_batches=WORKER_QUEUE_BATCHES):
+        super().__init__()
+        self.simulation = simulation
+        # at full speed with the time limit on, runs come from here whole
+        self.cache = cache
+        self.batches = queue.Queue(max_batches)
+        self.scheduler = StepScheduler()
+        self.time_limit = True
+        self.running = False
+        self._commands = queue.Queue()
+        self._quit = False
+
+    def call(self, function, *args):
+        # function(*args) on the worker thread between batches, waiting for
+        # its result; straight away when the thread is not started
+        if not self.isRunning():
+            return function(*args)
+        future = Future()
+        self._commands.put((function, args, future))
+        return future.result()
+
+    def resume(self, speed, time_limit=True):
+        self.call(self._resume, speed, time_limit)
+
+    def pause(self):
+        # returns once the worker has stopped touching the simulation
+        self.call(setattr, self, "running", False)
+
+    def step(self, time_limit=True):
+        # one tick as a (times, states) batch, handed back rather than queued
+        return self.call(self._step_once, time_limit)
+
+    def shutdown(self):
+        self.call(setattr, self, "_quit", True)
+        self.wait()
+
+    def run(self):
+        while not self._quit:
+            if not self.running:
+                self._serve(None)
+            elif self.batches.full():
+                # drawing has fallen behind: wait for it rather than run on
+                self._serve(1 / FRAME_RATE)
+            else:
+                self._serve(0)
+                if self.running:
+                    self._advance()
+                if self.running and not self.scheduler.unthrottled:
+                    # a frame's worth of ticks at a time at set speeds
+                    self._serve(1 / FRAME_RATE)
+
+    def _serve(self, timeout):
+        # runs the queued commands, first waiting up to timeout for one
+        # (None waits as long as it takes)
+        try:
+            command = self._commands.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            function, args, future = command
+            try:
+                future.set_result(function(*args))
+            except Exception as error:
+                future.set_exception(error)
+            try:
+                command = self._commands.get_nowait()
+            except queue.Empty:
+                return
+
+    def _resume(self, speed, time_limit):
+        self.scheduler.speed = speed
+        self.scheduler.start()
+        self.time_limit = time_limit
+        self.running = True
+
+    def _step_once(self, time_limit):
+        self.time_limit = time_limit
+        return self._batch(lambda step: step())
+
+    def _advance(self):
+        cached = (
+            self.scheduler.unthrottled
+            and self.time_limit
+            and self.cache is not None
+            and self.simulation.profiler is None
+        )
+        batch = self._cached_run() if cached else self._batch(self.scheduler.run_frame)
+        if batch is not None:
+            self.batches.put_nowait(batch)
+        if cached or self.limit_reached():
+            self.running = False
+            self.stopped.emit()
+
+    def _batch(self, run):
+        # run(step) steps the simulation; the states it went through
+        rows = []
+        run(lambda: self._step(rows))
+        if not rows:
+            return None
+        states = np.array(rows, dtype=float)
+        return states[:, 1] / TICKS_PER_SECOND, states
+
+    def _step(self, rows) -> bool:
+        # tick by tick even once nothing reacts: the user may still choose a
+        # mode or disorder and carry on, so only headless runs fast-forward
+        self.simulation.time_passes()
+        rows.append(self.simulation.field_values())
+        return not self.limit_reached()
+
+    def _cached_run(self):
+        # the rest of the run up to the time limit is known in advance, so it
+        # comes from the trajectory cache in one go. Either way the simulation
+        # ends at the time limit: run there on a miss, or given the cached
+        # final state on a hit
+        simulation = self.simulation
+        start_tick = simulation.current_time
+        steps = (TIME_LIMIT_SECONDS + 1) * TICKS_PER_SECOND - start_tick
+        if steps <= 0:
+            return None
+        trajectory = self.cache.run(simulation, steps)
+        ticks = np.arange(start_tick + 1, start_tick + steps + 1)
+        states = np.empty((steps, len(FIELD_NAMES)))
+        states[:, 0] = simulation.speed
+        states[:, 1] = ticks
+        states[:, 2] = simulation.injury_stage
+        states[:, 3:] = trajectory[1:]
+        return ticks / TICKS_PER_SECOND, states
+
+    def limit_reached(self) -> bool:
+        return (
+            self.time_limit
+            and self.simulation.current_time // TICKS_PER_SECOND > TIME_LIMIT_SECONDS
+        )
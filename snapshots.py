@@ -0,0 +1,120 @@
+import numpy as np
+
+from constants import CHECKPOINT_INTERVAL, CHECKPOINT_LIMIT
+from simulation_variables import FIELD_NAMES
+
+
+class CheckpointTimeline:
+    # packed copies of a run's state (field_values() rows) every `interval`
+    # ticks; any earlier tick is rebuilt by restoring the checkpoint at or
+    # before it and replaying the rest. When `limit` checkpoints are held the
+    # interval doubles and the checkpoints off the new interval are dropped,
+    # so memory stays fixed however long the run. Pinned checkpoints are
+    # never dropped; with nothing else to drop the timeline grows instead.
+    def __init__(self, interval=CHECKPOINT_INTERVAL, limit=CHECKPOINT_LIMIT):
+        if interval < 1:
+            raise ValueError("checkpoint interval must be at least 1")
+        if limit < 2:
+            raise ValueError("checkpoint limit must be at least 2")
+        self.interval = interval
+        self.limit = limit
+        self._data = np.zeros((limit, len(FIELD_NAMES)))
+        # pinned checkpoints mark states changed from outside the model,
+        # which replaying could not reproduce, so thinning keeps them
+        self._pinned = np.zeros(limit, dtype=bool)
+        self.count = 0
+        # the furthest tick the run has reached
+        self.end = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes + self._pinned.nbytes
+
+    def ticks(self) -> np.ndarray:
+        return self._data[: self.count, 1]
+
+    def record(self, simulation):
+        # called after every tick; only ticks on the interval are kept
+        self._record(simulation.current_time, simulation.field_values())
+
+    def extend(self, states):
+        # field_values() rows for consecutive ticks, e.g. a run loaded whole
+        states = np.asarray(states)
+        for row in states[states[:, 1] % self.interval == 0]:
+            self._record(int(row[1]), row)
+        self.end = max(self.end, int(states[-1, 1]))
+
+    def _record(self, tick, state):
+        if tick > self.end:
+            self.end = tick
+        if tick % self.interval:
+            return
+        if self.count and tick <= self._data[self.count - 1, 1]:
+            return
+        if self.count == len(self._data):
+            self._thin()
+            if tick % self.interval:
+                return
+        self._write(state, pinned=False)
+
+    def pin(self, simulation):
+        # a checkpoint at the current tick whatever the interval, for a state
+        # set from outside the model; anything after it no longer applies
+        self.truncate(simulation.current_time - 1)
+        if self.count == len(self._data):
+            self._thin()
+        self._write(simulation.field_values(), pinned=True)
+        self.end = simulation.current_time
+
+    def _write(self, state, pinned):
+        self._data[self.count] = state
+        self._pinned[self.count] = pinned
+        self.count += 1
+
+    def _thin(self):
+        # makes room for one more checkpoint; tick 0 is on every interval,
+        # so only unpinned checkpoints after it can go
+        droppable = ~self._pinned[: self.count] & (self.ticks() > 0)
+        if not droppable.any():
+            # every checkpoint marks an outside change, and replaying across
+            # one would show the wrong state: go over the limit instead
+            self._data = np.concatenate([self._data, np.zeros_like(self._data)])
+            self._pinned = np.concatenate([self._pinned, np.zeros_like(self._pinned)])
+            return
+        while self.count == len(self._data):
+            self.interval *= 2
+            keep = self._pinned[: self.count] | (self.ticks() % self.interval == 0)
+            kept = np.flatnonzero(keep)
+            self._data[: len(kept)] = self._data[kept]
+            self._pinned[: len(kept)] = self._pinned[kept]
+            self.count = len(kept)
+
+    def truncate(self, tick):
+        # forgets everything after tick
+        self.count = int(np.searchsorted(self.ticks(), tick, side="right"))
+        self.end = min(self.end, max(tick, 0))
+
+    def clear(self):
+        self.count = 0
+        self.end = 0
+        if len(self._data) > self.limit:
+            self._data = np.zeros((self.limit, len(FIELD_NAMES)))
+            self._pinned = np.zeros(self.limit, dtype=bool)
+
+    def seek(self, simulation, tick) -> int:
+        # puts the simulation in its state at tick and returns the number of
+        # ticks replayed to get there (at most one interval)
+        index = int(np.searchsorted(self.ticks(), tick, side="right")) - 1
+        if index < 0:
+            raise ValueError(f"no checkpoint at or before tick {tick}")
+        simulation.restore(self._data[index].tolist())
+        replayed = 0
+        while simulation.current_time < tick:
+            replayed += 1
+            if not simulation.time_passes():
+                # nothing changes from here on
+                simulation.current_time = tick
+        return replayed
@@ -0,0 +1,62 @@
+# values of compounds are roughly aiming to be in ratio of 1AU = 0.1ng/mL
+SPECIES_DEFAULTS = {
+    "vWF": 100000,
+    "activated_platelets": 0,
+    "glyc1b": 0,
+    "glyc2b3a": 0,
+    "prostacyclin": 0,
+    "endothelin": 0,
+    "nitric_oxide": 0,
+    "alpha_granules": 0,
+    "dense_granules": 0,
+    "serotonin": 0,
+    "aDP": 0,
+    "subendothelium": 0,
+    "iNR": 1.0,
+    "aPTT": 30,
+    "calcium_ions": 1.2,
+    "fibrinogen": 50000,
+    "fibrin": 0,
+    "prothrombin": 10000,
+    "thrombin": 0,
+    "tissue_factor": 0,
+    "factor5": 1000,
+    "factor5a": 0,
+    "factor7": 100,
+    "factor7a": 0,
+    "factor8": 1000,
+    "factor8a": 0,
+    "factor9": 1000,
+    "factor9a": 0,
+    "factor10": 1000,
+    "factor10a": 0,
+    "factor11": 1000,
+    "factor11a": 0,
+    "factor12": 1000,
+    "factor12a": 0,
+    "factor13": 10000,
+    "factor13a": 0,
+    "cross_linked_fibrin": 0,
+    "platelets": 300,
+    "protein_c": 10000,
+    "protein_ca": 0,
+    "tFPI": 0,
+    "antithrombin3": 0,
+    "thrombomodulin": 0,
+    "protein_s": 0,
+    "c1_esterase_inhibitor": 0,
+    "plasmin": 0,
+    "plasminogen": 10000,
+    "tAFI": 1000,
+    "tAFIa": 0,
+    "tPA": 0,
+    "pAI1": 100,
+    "a2A": 100,
+    "fDP": 0,
+    "dummy": 0,
+}
+
+SPECIES = tuple(SPECIES_DEFAULTS)
+SPECIES_INDEX = {name: index for index, name in enumerate(SPECIES)}
+# reactions without a second catalyst or inhibitor read this always-zero slot
+ZERO_SLOT = len(SPECIES)
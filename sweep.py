@@ -0,0 +1,111 @@
+import itertools
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from constants import disorders, simulation_modes
+from runner import build_simulation, run_simulation, tick_times
+from species import SPECIES
+from trajectory_store import TrajectoryStoreWriter
+
+
+def build_jobs(modes=simulation_modes, disorder_names=disorders, grid=None):
+    # grid maps species name -> starting amounts to try; every combination is
+    # crossed with every mode and disorder
+    grid = grid or {}
+    names = tuple(grid)
+    jobs = []
+    for mode, disorder in itertools.product(modes, disorder_names):
+        for values in itertools.product(*(grid[name] for name in names)):
+            jobs.append(
+                {
+                    "mode": mode,
+                    "disorder": disorder,
+                    "overrides": dict(zip(names, values)),
+                }
+            )
+    return jobs
+
+
+def run_job(job, steps, species=SPECIES):
+    start = time.perf_counter()
+    simulation = build_simulation(job["mode"], job["disorder"], job["overrides"])
+    trajectory = run_simulation(simulation, steps, species).astype(np.float32)
+    return trajectory, time.perf_counter() - start
+
+
+class ProgressBar:
+    def __init__(self, total, stream=sys.stderr, width=30):
+        self.total = total
+        self.stream = stream
+        self.width = width
+        self.done = 0
+        self.start = time.perf_counter()
+
+    def advance(self):
+        self.done += 1
+        filled = self.width * self.done // self.total
+        elapsed = time.perf_counter() - self.start
+        self.stream.write(
+            f"\r[{'#' * filled}{'.' * (self.width - filled)}] "
+            f"{self.done}/{self.total} jobs {elapsed:.1f}s"
+        )
+        if self.done == self.total:
+            self.stream.write("\n")
+        self.stream.flush()
+
+
+def iter_sweep(jobs, steps, species=SPECIES, workers=None, progress=True):
+    # yields (trajectory, seconds) per job, in job order, as the pool
+    # finishes them
+    bar = ProgressBar(len(jobs)) if progress and jobs else None
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(
+            run_job, jobs, itertools.repeat(steps), itertools.repeat(species)
+        ):
+            if bar is not None:
+                bar.advance()
+            yield result
+
+
+def run_sweep(jobs, steps, species=SPECIES, workers=None, progress=True):
+    trajectories = np.empty((len(jobs), steps + 1, len(species)), dtype=np.float32)
+    job_seconds = np.empty(len(jobs))
+    start = time.perf_counter()
+    for index, result in enumerate(iter_sweep(jobs, steps, species, workers, progress)):
+        trajectories[index], job_seconds[index] = result
+    return trajectories, job_seconds, time.perf_counter() - start
+
+
+def stream_sweep(
+    path, jobs, steps, species=SPECIES, workers=None, progress=True, compress=False
+):
+    # like run_sweep, but each trajectory goes straight to a trajectory store
+    # on disk, so the ensemble never has to fit in memory
+    job_seconds = np.empty(len(jobs))
+    start = time.perf_counter()
+    with TrajectoryStoreWriter(
+        path, species, steps, compress=compress, attributes={"source": "sweep"}
+    ) as writer:
+        for index, (trajectory, seconds) in enumerate(
+            iter_sweep(jobs, steps, species, workers, progress)
+        ):
+            writer.append(trajectory, {**jobs[index], "seconds": seconds})
+            job_seconds[index] = seconds
+    return job_seconds, time.perf_counter() - start
+
+
+def save_sweep(path, jobs, steps, species, trajectories, job_seconds):
+    np.savez(
+        path,
+        time=tick_times(0, steps),
+        species=np.array(species),
+        trajectories=trajectories,
+        modes=np.array([job["mode"] for job in jobs]),
+        disorders=np.array([job["disorder"] for job in jobs]),
+        overrides=json.dumps([job["overrides"] for job in jobs]),
+        job_seconds=job_seconds,
+    )
@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pytest
+
+from assays import APTT, PT, apply, clotting_times, measure, normal_times, prepare
+from runner import build_simulation
+from simulation_variables import SimulationVariables
+
+
+def test_normal_plasma_reads_reference_values():
+    (result,) = measure([SimulationVariables()])
+    assert result.inr == pytest.approx(1.0)
+    assert result.aptt == pytest.approx(30)
+    assert (result.pt_seconds, result.aptt_raw_seconds) == normal_times()
+
+
+def test_disorders_prolong_their_own_pathway():
+    normal, liver, haemophilia_a, haemophilia_b = measure(
+        build_simulation("None", disorder)
+        for disorder in (
+            "None",
+            "Liver Disorder",
+            "Haemophilia A (Severe)",
+            "Haemophilia B",
+        )
+    )
+    assert liver.inr > 1.1
+    assert haemophilia_a.aptt > normal.aptt + 5
+    assert haemophilia_a.inr < 1.05
+    assert math.isinf(haemophilia_b.aptt)
+
+
+def test_batched_times_match_single_runs():
+    samples = [
+        prepare(build_simulation("None", disorder), assay)
+        for disorder in ("None", "Liver Disorder", "Haemophilia A (Severe)")
+        for assay in (PT, APTT)
+    ]
+    batched = clotting_times(samples)
+    single = [clotting_times([sample])[0] for sample in samples]
+    np.testing.assert_allclose(batched, single)
+
+
+def test_clotting_stops_at_the_threshold():
+    sample = prepare(SimulationVariables(), PT)
+    (seconds,) = clotting_times([sample], threshold=500)
+    simulation = sample.copy()
+    ticks = math.ceil(seconds * 2)
+    for _ in range(ticks - 1):
+        simulation.time_passes()
+    assert simulation.fibrin + simulation.cross_linked_fibrin < 500
+    simulation.time_passes()
+    assert simulation.fibrin + simulation.cross_linked_fibrin >= 500
+
+
+def test_apply_fills_the_fields():
+    simulation = build_simulation("None", "Liver Disorder")
+    result = apply(simulation)
+    assert simulation.iNR == result.inr
+    assert simulation.aPTT == result.aptt
+
+
+def test_a_running_simulation_is_measured_without_its_products():
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    for _ in range(400):
+        simulation.time_passes()
+    assert simulation.fibrin > 0
+    (result,) = measure([simulation])
+    assert result.inr == pytest.approx(1.0, rel=0.01)
+
+
+def test_samples_clotted_from_the_start_have_no_results(monkeypatch):
+    monkeypatch.setattr("assays.clotting_times", lambda *_, **__: np.zeros(2))
+    (result,) = measure([SimulationVariables()])
+    assert math.isnan(result.inr)
+    assert math.isnan(result.aptt)
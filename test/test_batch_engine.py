@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from batch_engine import BatchSimulation
+from constants import disorders
+from simulation_variables import SimulationVariables
+from species import SPECIES, SPECIES_INDEX
+
+
+def make_simulation(disorder, prothrombotic=True):
+    simulation = SimulationVariables()
+    simulation.set_haemostasis_mode(prothrombotic=prothrombotic)
+    simulation.set_disorder(disorder)
+    return simulation
+
+
+@pytest.fixture()
+def simulations():
+    return [make_simulation(disorder) for disorder in disorders] + [
+        make_simulation("None", prothrombotic=False),
+        SimulationVariables(),
+    ]
+
+
+def test_species_excludes_bookkeeping_fields():
+    assert "thrombin" in SPECIES
+    assert "current_time" not in SPECIES
+    assert "speed" not in SPECIES
+
+
+def test_batch_matches_scalar_path(simulations):
+    batch = BatchSimulation(simulations)
+    for _ in range(600):
+        batch.time_passes()
+        for simulation in simulations:
+            simulation.time_passes()
+    for patient, simulation in enumerate(simulations):
+        expected = [getattr(simulation, name) for name in SPECIES]
+        np.testing.assert_allclose(
+            batch.values[: len(SPECIES), patient], expected, rtol=1e-12
+        )
+        assert batch.current_time[patient] == simulation.current_time
+
+
+def test_to_simulation_round_trips(simulations):
+    batch = BatchSimulation(simulations)
+    batch.run(10)
+    restored = batch.to_simulation(3)
+    assert restored.thrombin == pytest.approx(batch.species("thrombin")[3])
+    assert restored.current_time == 10
+
+
+def test_from_default():
+    batch = BatchSimulation.from_default(5)
+    assert batch.size == 5
+    assert np.all(batch.species("prothrombin") == 10000)
+
+
+def test_run_stops_once_nothing_changes():
+    batch = BatchSimulation([SimulationVariables(), SimulationVariables()])
+    assert batch.run(50_000) == 1
+    assert list(batch.current_time) == [50_000, 50_000]
+    assert np.all(batch.species("prothrombin") == 10000)
+
+
+def test_keep_and_prune_leave_results_unchanged():
+    simulations = [make_simulation("None") for _ in range(3)]
+    simulations[1].factor8 = 0
+    full = BatchSimulation(simulations)
+    pruned = BatchSimulation(simulations)
+    pruned.prune()
+    assert len(pruned.reaction_table) < len(full.reaction_table)
+    pruned.keep([0, 1])
+    for _ in range(300):
+        full.time_passes()
+        pruned.time_passes()
+    np.testing.assert_array_equal(pruned.values, full.values[:, :2])
+
+
+def test_keep_slices_per_patient_constants():
+    batch = BatchSimulation([make_simulation("None") for _ in range(3)])
+    batch.set_constant("convert_prothrombin", "divisor", [1.0, 2.0, 3.0])
+    batch.prune()
+    batch.keep([0, 2])
+    assert list(batch.constants["convert_prothrombin", "divisor"]) == [1.0, 3.0]
+    (compiled,) = (
+        reaction
+        for reaction in batch.reaction_table
+        if reaction[0] == SPECIES_INDEX["prothrombin"]
+    )
+    assert list(compiled[4]) == [1.0, 3.0]
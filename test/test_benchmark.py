@@ -0,0 +1,48 @@
+import json
+
+import benchmark
+from benchmark import compare, metric, run_benchmarks
+
+
+def report(**results):
+    return {"environment": {}, "results": results}
+
+
+def test_compare_flags_results_worse_than_threshold():
+    baseline = report(
+        steps=metric(1000, "steps/s", higher_is_better=True),
+        frame=metric(10, "ms"),
+        run=metric(10, "ms"),
+    )
+    current = report(
+        steps=metric(800, "steps/s", higher_is_better=True),
+        frame=metric(10.5, "ms"),
+        run=metric(5, "ms"),
+        new=metric(1, "ms"),
+    )
+    rows = {name: row for name, *row in compare(current, baseline, threshold=0.1)}
+    assert set(rows) == {"steps", "frame", "run"}
+    assert rows["steps"][3]
+    assert rows["steps"][2] == 0.25
+    assert not rows["frame"][3]
+    assert not rows["run"][3]
+
+
+def test_main_writes_results_and_fails_on_regression(tmp_path, capsys):
+    output = tmp_path / "results.json"
+    arguments = ["--groups", "engine,reactions", "--steps", "200", "--calls", "50"]
+    assert benchmark.main([*arguments, "--output", str(output)]) == 0
+    saved = json.loads(output.read_text())
+    assert "engine.time_passes" in saved["results"]
+    assert "reactions.convert_factor12" in saved["results"]
+
+    saved["results"]["engine.time_passes"]["value"] *= 100
+    output.write_text(json.dumps(saved))
+    assert benchmark.main([*arguments, "--compare", str(output)]) == 1
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_groups_are_selectable():
+    results = run_benchmarks(["engine"], steps=100)["results"]
+    assert {name.split(".")[0] for name in results} == {"engine"}
+    assert results["engine.state_memory"]["value"] > 0
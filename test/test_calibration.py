@@ -0,0 +1,166 @@
+import json
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+import headless
+from calibration import (
+    Calibration,
+    Scenario,
+    Targets,
+    evaluate,
+    parse_parameter,
+    write_parameters,
+)
+from reactions import ENGINE_VERSION, REACTIONS, with_constants
+from runner import run_simulation, save_trajectory, tick_times
+from simulation_variables import SimulationVariables, load_parameters
+
+SPECIES = ("thrombin", "cross_linked_fibrin")
+STEPS = 700
+
+
+@pytest.fixture(autouse=True)
+def builtin_reactions():
+    yield
+    SimulationVariables.use_reactions(REACTIONS)
+
+
+def write_targets(path, constants=None):
+    SimulationVariables.use_reactions(with_constants(REACTIONS, constants or {}))
+    trajectory = run_simulation(Scenario().simulation(), STEPS, SPECIES)
+    SimulationVariables.use_reactions(REACTIONS)
+    save_trajectory(path, tick_times(0, STEPS)[::25], SPECIES, trajectory[::25])
+    return Targets.load(path)
+
+
+@pytest.fixture()
+def targets(tmp_path):
+    return write_targets(
+        tmp_path / "targets.csv", {"convert_prothrombin": {"divisor": 240000.0}}
+    )
+
+
+def test_targets_load_and_reject_bad_files(tmp_path, targets):
+    assert targets.species == SPECIES
+    assert targets.steps == STEPS
+    path = tmp_path / "bad.csv"
+    path.write_text("seconds,thrombin\n0,1\n")
+    with pytest.raises(ValueError):
+        Targets.load(path)
+    path.write_text("time,nothing\n0,1\n")
+    with pytest.raises(ValueError):
+        Targets.load(path)
+
+
+def test_error_is_zero_at_the_true_constants(targets):
+    errors = evaluate(
+        Scenario(),
+        targets,
+        ("convert_prothrombin.divisor",),
+        [[240000.0], [120000.0], [480000.0]],
+    )
+    assert errors[0] == pytest.approx(0, abs=1e-9)
+    assert errors[1] > 0.01 and errors[2] > 0.01
+
+
+def test_fit_recovers_the_constant(targets):
+    calibration = Calibration(
+        targets, ["convert_prothrombin.divisor"], population=8, workers=1
+    )
+    best = calibration.run(15)
+    assert best["convert_prothrombin"]["divisor"] == pytest.approx(240000, rel=0.05)
+    assert calibration.history == sorted(calibration.history, reverse=True)
+
+
+def test_resumed_fit_matches_an_uninterrupted_one(tmp_path, targets):
+    labels = ["convert_prothrombin.divisor", "convert_factor5.multiplier"]
+    checkpoint = tmp_path / "fit.json"
+    Calibration(targets, labels, population=8, workers=1, checkpoint=checkpoint).run(2)
+    resumed = Calibration(
+        targets, labels, population=8, workers=1, checkpoint=checkpoint
+    )
+    resumed.run(4)
+    straight = Calibration(targets, labels, population=8, workers=1)
+    straight.run(4)
+    np.testing.assert_array_equal(resumed.population, straight.population)
+    assert resumed.history == straight.history
+    with pytest.raises(ValueError):
+        Calibration(targets, labels, population=10, checkpoint=checkpoint).run(4)
+
+
+def test_parameter_file_is_loaded_at_startup(tmp_path, monkeypatch):
+    path = tmp_path / "parameters.json"
+    write_parameters(path, {"convert_factor13": {"divisor": 40.0}}, 0.1)
+    monkeypatch.setenv("COAGULATION_PARAMETERS", str(path))
+    load_parameters()
+    (reaction,) = (
+        r for r in SimulationVariables.reactions if r.name == "convert_factor13"
+    )
+    assert reaction.divisor == 40
+    simulation = SimulationVariables(thrombin=100)
+    simulation.time_passes()
+    assert simulation.factor13a == pytest.approx(100 / 40)
+    document = json.loads(path.read_text())
+    document["reactions"] = {"convert_factor13": {"catalyst": 1}}
+    path.write_text(json.dumps(document))
+    with pytest.raises(ValueError):
+        load_parameters(path)
+    # constants fitted against another engine do not apply to this one
+    document["reactions"] = {"convert_factor13": {"divisor": 40.0}}
+    document["engine_version"] = ENGINE_VERSION - 1
+    path.write_text(json.dumps(document))
+    with pytest.raises(ValueError, match="engine version"):
+        load_parameters(path)
+
+
+def test_only_used_nonzero_constants_can_be_fitted(tmp_path, targets, capsys):
+    assert parse_parameter("convert_prothrombin.multiplier_i1")
+    with pytest.raises(ValueError, match="does not use"):
+        parse_parameter("convert_factor12.multiplier_i1")
+    # a clean usage error rather than a traceback
+    with pytest.raises(SystemExit):
+        headless.main(
+            [
+                "calibrate",
+                str(tmp_path / "targets.csv"),
+                "--fit",
+                "convert_factor12.multiplier_i1",
+            ]
+        )
+    assert "does not use its multiplier_i1" in capsys.readouterr().err
+    SimulationVariables.use_reactions(
+        tuple(
+            (
+                replace(reaction, multiplier_i1=0.0)
+                if reaction.name == "convert_prothrombin"
+                else reaction
+            )
+            for reaction in REACTIONS
+        )
+    )
+    with pytest.raises(ValueError, match="log scale"):
+        Calibration(targets, ["convert_prothrombin.multiplier_i1"])
+
+
+def test_calibrate_command_writes_parameters(tmp_path, targets, capsys):
+    output = tmp_path / "parameters.json"
+    headless.main(
+        [
+            "calibrate",
+            str(tmp_path / "targets.csv"),
+            "--fit",
+            "convert_prothrombin.divisor",
+            "--generations",
+            "1",
+            "--population",
+            "4",
+            "--workers",
+            "1",
+            "--output",
+            str(output),
+        ]
+    )
+    assert "generation 1" in capsys.readouterr().out
+    assert "convert_prothrombin" in json.loads(output.read_text())["reactions"]
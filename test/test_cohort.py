@@ -0,0 +1,115 @@
+import math
+
+import numpy as np
+import pytest
+
+import headless
+from cohort import (
+    Cohort,
+    CohortSummary,
+    Distribution,
+    Threshold,
+    chunk_sizes,
+    run_chunk,
+    run_cohort,
+    sample_patients,
+)
+from runner import build_simulation
+from species import SPECIES_INDEX
+
+
+@pytest.fixture()
+def cohort():
+    return Cohort(
+        disorders=(("None", 3), ("Haemophilia B", 1)),
+        steps=1000,
+        stride=100,
+        thresholds=(Threshold.parse("thrombin>1000"), Threshold.parse("tPA>1")),
+    )
+
+
+def test_lognormal_spread_keeps_the_mean():
+    factors = Distribution("lognormal", 0.2).factors(np.random.default_rng(0), 200_000)
+    assert factors.mean() == pytest.approx(1, abs=0.005)
+    assert factors.std() == pytest.approx(0.2, abs=0.005)
+    with pytest.raises(ValueError):
+        Distribution.parse("uniform:0.1")
+
+
+def test_patients_vary_around_their_disorder(cohort):
+    values, counts = sample_patients(cohort, 4000, np.random.default_rng(0))
+    assert sum(counts.values()) == 4000
+    assert counts["Haemophilia B"] == pytest.approx(1000, abs=100)
+    factor9 = values[SPECIES_INDEX["factor9"]]
+    assert (factor9 == 0).sum() == counts["Haemophilia B"]
+    healthy = factor9[factor9 > 0]
+    assert healthy.mean() == pytest.approx(1000, rel=0.03)
+    # not in the variation: every patient gets the preset value
+    assert np.all(values[SPECIES_INDEX["tissue_factor"]] == 100)
+
+
+def test_chunk_without_variation_matches_a_single_run(cohort):
+    fixed = Cohort(disorders=(("None", 1),), variation=(), steps=400, stride=50)
+    summary = run_chunk(fixed, 8, np.random.SeedSequence(0))
+    simulation = build_simulation(fixed.mode)
+    thrombin = []
+    for tick in range(fixed.steps + 1):
+        if tick % fixed.stride == 0:
+            thrombin.append(simulation.thrombin)
+        simulation.time_passes()
+    np.testing.assert_allclose(summary.mean[:, 0], thrombin)
+    np.testing.assert_allclose(
+        summary.sketch.quantile(0.5)[:, 0], thrombin, rtol=0.01, atol=1e-3
+    )
+    assert summary.std[-1, 0] == pytest.approx(0)
+
+
+def test_summaries_merge_and_stay_bounded(cohort):
+    summary = run_cohort(cohort, 700, chunk=256, workers=1, progress=False)
+    assert chunk_sizes(700, 256) == [256, 256, 188]
+    assert summary.patients == 700
+    assert summary.sketch.count[0, 0] == 700
+    small = run_cohort(cohort, 100, chunk=256, workers=1, progress=False)
+    assert summary.sketch.counts.shape == small.sketch.counts.shape
+    # thrombin reaches 1000 in most patients; tPA never appears
+    assert summary.never[0] < 700 / 4
+    assert summary.time_counts[0].sum() + summary.never[0] == 700
+    assert summary.never[1] == 700
+    assert math.isinf(summary.time_percentile(1, 50))
+    assert 0 < summary.time_percentile(0, 50) <= cohort.steps / 2
+    with pytest.raises(ValueError):
+        summary.merge(CohortSummary(Cohort()))
+
+
+def test_workers_draw_the_same_patients(cohort):
+    inline = run_cohort(cohort, 300, chunk=100, workers=1, progress=False)
+    pooled = run_cohort(cohort, 300, chunk=100, workers=2, progress=False)
+    np.testing.assert_array_equal(inline.sketch.counts, pooled.sketch.counts)
+    np.testing.assert_array_equal(inline.time_counts, pooled.time_counts)
+    np.testing.assert_allclose(inline.mean, pooled.mean)
+
+
+def test_cohort_command_saves_summary(tmp_path, capsys):
+    path = tmp_path / "cohort.npz"
+    headless.main(
+        [
+            "cohort",
+            "--patients",
+            "50",
+            "--steps",
+            "100",
+            "--disorder",
+            "Haemophilia A (Severe)=1",
+            "--vary",
+            "factor8=lognormal:0.5",
+            "--workers",
+            "1",
+            "--quiet",
+            "--output",
+            str(path),
+        ]
+    )
+    assert "50 patients" in capsys.readouterr().out
+    with np.load(path) as data:
+        assert data["values"].shape == (5, 11, 3)
+        assert int(data["patients"]) == 50
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from history import HistoryBuffer, TrajectoryHistory
+
+
+def test_append_and_view():
+    history = HistoryBuffer(columns=2, capacity=5)
+    history.append((0.5, 10))
+    history.append((1.0, 20))
+    assert len(history) == 2
+    assert history.view().tolist() == [[0.5, 10], [1.0, 20]]
+    assert history.column(1).tolist() == [10, 20]
+
+
+def test_rolls_over_keeping_newest_rows():
+    history = HistoryBuffer(capacity=4)
+    for value in range(23):
+        history.append(value)
+    assert len(history) == 4
+    assert history.column(0).tolist() == [19, 20, 21, 22]
+
+
+def test_view_is_zero_copy():
+    history = HistoryBuffer(capacity=3)
+    for value in range(5):
+        history.append(value)
+    view = history.view()
+    assert np.shares_memory(view, history._data)
+    assert view.flags["C_CONTIGUOUS"]
+
+
+def test_memory_does_not_grow():
+    history = HistoryBuffer(columns=2, capacity=100)
+    nbytes = history.nbytes
+    for value in range(10_000):
+        history.append((value, value))
+    assert history.nbytes == nbytes
+
+
+def test_clear():
+    history = HistoryBuffer(capacity=3)
+    history.append(1)
+    history.clear()
+    assert len(history) == 0
+    history.append(2)
+    assert history.column(0).tolist() == [2]
+
+
+def test_rejects_empty_capacity():
+    with pytest.raises(ValueError):
+        HistoryBuffer(capacity=0)
+
+
+def test_grows_in_chunks_up_to_capacity():
+    history = HistoryBuffer(columns=3, capacity=10, dtype=np.float32, chunk=4)
+    assert history.nbytes == 4 * 3 * 4
+    for value in range(7):
+        history.append((value, value, value))
+    assert history.nbytes == 8 * 3 * 4
+    for value in range(7, 50):
+        history.append((value, value, value))
+    assert history.nbytes == 20 * 3 * 4
+    assert history.column(2).tolist() == list(range(40, 50))
+
+
+def test_trajectory_history_records_every_variable():
+    history = TrajectoryHistory(("thrombin", "fibrin"), capacity=10, chunk=2)
+    for tick in range(5):
+        history.record(tick / 2, (tick, 10 * tick))
+    assert history.times().tolist() == [0, 0.5, 1, 1.5, 2]
+    assert history.series("fibrin").tolist() == [0, 10, 20, 30, 40]
+    assert history.series("thrombin").dtype == np.float32
+
+
+def test_extend_matches_repeated_append():
+    appended = HistoryBuffer(capacity=7, chunk=3)
+    extended = HistoryBuffer(capacity=7, chunk=3)
+    for value in range(5):
+        appended.append(value)
+    extended.extend(range(5))
+    for value in range(5, 30):
+        appended.append(value)
+    extended.extend(range(5, 30))
+    assert extended.column(0).tolist() == appended.column(0).tolist()
+    assert extended.total == appended.total == 30
+    assert extended.first_index == 23
+
+
+def test_hold_repeats_values():
+    history = TrajectoryHistory(("a", "b"), capacity=10)
+    history.hold([1.0, 1.5, 2.0], (3, 4))
+    assert history.times().tolist() == [1.0, 1.5, 2.0]
+    assert history.series("b").tolist() == [4, 4, 4]
+
+
+def test_truncate_after_drops_later_rows():
+    history = TrajectoryHistory(("a",), capacity=50)
+    for tick in range(80):
+        history.record(tick / 2, (tick,))
+    history.truncate_after(35)
+    assert history.times()[-1] == 35
+    assert history.total == 71
+    history.record(35.5, (0,))
+    assert history.series("a")[-2:].tolist() == [70, 0]
+    history.truncate_after(5)
+    assert len(history) == 0
+    assert history.total == history.first_index
@@ -0,0 +1,68 @@
+import csv
+
+import pytest
+
+from instrumentation import PROFILE_COLUMNS, ReactionProfiler
+from runner import build_simulation
+
+
+@pytest.fixture()
+def profiled():
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    profiler = ReactionProfiler.attach(simulation)
+    for _ in range(400):
+        simulation.time_passes()
+    return simulation, profiler
+
+
+def test_profiled_run_matches_plain_run(profiled):
+    simulation, profiler = profiled
+    plain = build_simulation("Haemostasis (Pro-thrombotic)")
+    for _ in range(400):
+        plain.time_passes()
+    assert simulation.field_values() == plain.field_values()
+    assert profiler.ticks == 400
+    assert all(profiler.calls == 400)
+
+
+def test_counts_skips_and_flux(profiled):
+    simulation, profiler = profiled
+    rows = {row[0]: row for row in profiler.rows()}
+    _, calls, skipped, seconds, flux = rows["convert_fibrinogen"]
+    assert skipped == 0
+    assert seconds > 0
+    assert flux == pytest.approx(simulation.fibrin + simulation.cross_linked_fibrin)
+    # there is no fibrin to cross-link until thrombin has formed some
+    assert rows["convert_fibrin"][2] > 0
+
+
+def test_detach_stops_counting(profiled):
+    simulation, profiler = profiled
+    assert ReactionProfiler.detach(simulation) is profiler
+    simulation.time_passes()
+    assert profiler.ticks == 400
+
+
+def test_exports(profiled, tmp_path):
+    _, profiler = profiled
+    path = tmp_path / "profile.csv"
+    profiler.write_csv(path)
+    with path.open() as file:
+        rows = list(csv.reader(file))
+    assert tuple(rows[0]) == PROFILE_COLUMNS
+    reactions = len(profiler.names)
+    assert len(rows) == reactions + 1
+    assert "time_passes  400 ticks" in profiler.format_flame()
+    assert len(profiler.collapsed().splitlines()) == reactions
+    assert profiler.format_table().count("\n") == reactions
+
+
+def test_columns_fit_the_longest_name(profiled):
+    _, profiler = profiled
+    longest = max(profiler.names, key=len)
+    lines = profiler.format_table().splitlines()
+    # every row lines up, the longest name included
+    assert len({len(line) for line in lines}) == 1
+    assert any(line.startswith(longest + "  ") for line in lines)
+    flame = profiler.format_flame().splitlines()[1:]
+    assert len({line.index("%") for line in flame}) == 1
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from history import TrajectoryHistory
+from lod import LevelOfDetail
+
+
+@pytest.fixture()
+def random_walk():
+    return np.random.default_rng(0).normal(size=30_000).cumsum()
+
+
+def fill(history, lod, values, update_every=37):
+    for tick, value in enumerate(values):
+        history.record(tick / 2, (value,))
+        if tick % update_every == 0:
+            lod.update()
+    lod.update()
+
+
+def test_small_ranges_return_raw_views(random_walk):
+    history = TrajectoryHistory(("a",), capacity=50_000)
+    lod = LevelOfDetail(history)
+    fill(history, lod, random_walk[:300])
+    x, y = lod.select(1, 0, 1000, 500)
+    assert len(x) == 300
+    assert np.shares_memory(y, history.view())
+
+
+def test_envelope_is_bounded_and_keeps_extremes(random_walk):
+    history = TrajectoryHistory(("a",), capacity=50_000)
+    lod = LevelOfDetail(history, factor=4, levels=6)
+    fill(history, lod, random_walk)
+    x, y = lod.select(1, -np.inf, np.inf, 400)
+    assert len(x) < 4 * 400
+    assert y.max() == pytest.approx(history.series("a").max())
+    assert y.min() == pytest.approx(history.series("a").min())
+    assert x[0] == 0
+    assert x[-1] == history.times()[-1]
+    assert np.all(np.diff(x) >= 0)
+
+
+def test_envelope_follows_ring_rollover(random_walk):
+    history = TrajectoryHistory(("a",), capacity=5_000, chunk=1024)
+    lod = LevelOfDetail(history, factor=4, levels=4)
+    fill(history, lod, random_walk)
+    x, y = lod.select(1, -np.inf, np.inf, 100)
+    kept = history.series("a")
+    assert x[0] >= history.times()[0] - 4**4
+    assert y.max() == pytest.approx(kept.max())
+    assert y.min() == pytest.approx(kept.min())
+
+
+def test_clear_resets_levels(random_walk):
+    history = TrajectoryHistory(("a",), capacity=50_000)
+    lod = LevelOfDetail(history)
+    fill(history, lod, random_walk[:5000])
+    history.clear()
+    lod.update()
+    fill(history, lod, np.zeros(2000))
+    _, y = lod.select(1, -np.inf, np.inf, 100)
+    assert np.all(y == 0)
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+import main
+from assays import measure
+from constants import TIME_LIMIT_SECONDS
+from runner import build_simulation
+
+
+@pytest.fixture()
+def window():
+    application = QApplication.instance() or QApplication([])
+    main.sim_vars.reset()
+    window = main.MainWindow()
+    yield window
+    window.close()
+    application.processEvents()
+    main.sim_vars.reset()
+
+
+def test_fibrinolysis_mode_reads_the_patients_plasma(window):
+    window.simulationModeCombo.setCurrentText("Fibrinolysis")
+    assert main.sim_vars.iNR == pytest.approx(1.0)
+    assert main.sim_vars.aPTT == pytest.approx(30)
+
+
+def test_a_disorder_chosen_mid_run_is_measured(window):
+    window.simulationModeCombo.setCurrentText("Haemostasis (Pro-thrombotic)")
+    for _ in range(400):
+        window.step_simulation()
+    window.disorderBox.setCurrentText("Liver Disorder")
+    (expected,) = measure([build_simulation("None", "Liver Disorder")])
+    assert main.sim_vars.iNR == pytest.approx(expected.inr)
+    assert main.sim_vars.aPTT == pytest.approx(expected.aptt)
+    assert main.sim_vars.iNR > 1.1
+
+
+def drawn_x_max(window):
+    window.update_lines()
+    return window.line1.getData()[0].max()
+
+
+def test_the_plot_follows_a_run_past_the_time_limit(window):
+    window.simulationModeCombo.setCurrentText("Haemostasis (Pro-thrombotic)")
+    window.toggle_time_limit()
+    for _ in range(2200):
+        window.step_simulation()
+    first = drawn_x_max(window)
+    assert first > TIME_LIMIT_SECONDS
+    for _ in range(200):
+        window.step_simulation()
+    assert drawn_x_max(window) > first
+    assert window.plot_widget.viewRange()[0][1] >= drawn_x_max(window)
+
+
+def test_a_zoom_holds_until_auto_range(window):
+    window.simulationModeCombo.setCurrentText("Haemostasis (Pro-thrombotic)")
+    for _ in range(1000):
+        window.step_simulation()
+    view_box = window.plot_widget.getViewBox()
+    view_box.setXRange(100, 200, padding=0)
+    view_box.sigRangeChangedManually.emit([True, True])
+    for _ in range(100):
+        window.step_simulation()
+    times = window.line1.getData()[0]
+    assert times.min() >= 99 and times.max() <= 201
+    assert drawn_x_max(window) <= 201
+    view_box.enableAutoRange(x=True)
+    assert drawn_x_max(window) == 550
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from ode_solver import AdaptiveSolver, RateFunction
+from reactions import Reaction, compile_reactions
+from runner import build_simulation, compare_backends, run_simulation
+from simulation_variables import SimulationVariables
+from species import SPECIES_INDEX, ZERO_SLOT
+
+
+def test_rate_matches_one_tick_of_each_reaction():
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    for _ in range(300):
+        simulation.time_passes()
+    state = np.array(simulation._values)
+    for reaction in simulation.reactions:
+        rate = RateFunction(compile_reactions((reaction,)))(state)
+        single = SimulationVariables()
+        single._values[:] = simulation._values
+        single.apply_reaction(reaction.name)
+        destination = SPECIES_INDEX[reaction.destination]
+        assert rate[destination] == pytest.approx(
+            single._values[destination] - state[destination]
+        )
+        assert rate[ZERO_SLOT] == 0
+
+
+def test_solver_follows_exponential_decay():
+    # a fixed catalyst converts 1% of the source per tick: dy/dt = -y / 100
+    table = compile_reactions(
+        (Reaction("decay", "tissue_factor", "factor7", "factor7a", 1e-9),)
+    )
+    y0 = np.zeros(ZERO_SLOT + 1)
+    y0[SPECIES_INDEX["tissue_factor"]] = 1
+    y0[SPECIES_INDEX["factor7"]] = 1000
+    solver = AdaptiveSolver(table, rtol=1e-8, atol=1e-8)
+    samples = solver.solve(y0, 200)
+    expected = 1000 * np.exp(-np.arange(201) / 100)
+    np.testing.assert_allclose(
+        samples[:, SPECIES_INDEX["factor7"]], expected, rtol=1e-5
+    )
+    assert solver.accepted < 200
+
+
+def test_ode_backend_tracks_discrete_curves():
+    species = ("thrombin", "cross_linked_fibrin")
+    discrete = run_simulation(
+        build_simulation("Haemostasis (Pro-thrombotic)"), 2000, species
+    )
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    ode = run_simulation(simulation, 2000, species, backend="ode")
+    assert ode.shape == discrete.shape
+    assert np.abs(ode - discrete).max() / discrete.max() < 0.1
+    assert simulation.current_time == 2000
+
+
+def test_compare_backends_reports_both():
+    report = compare_backends("Haemostasis (Pro-thrombotic)", "None", 500, ("fibrin",))
+    assert report["ode_accepted_steps"] < 500
+    assert set(report["species"]) == {"fibrin"}
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        run_simulation(build_simulation(), 10, backend="euler")
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from online_stats import OnlineStats, QuantileSketch
+
+
+@pytest.fixture()
+def samples():
+    return np.random.default_rng(0).normal(5, 3, size=(1000, 3))
+
+
+def test_matches_numpy(samples):
+    stats = OnlineStats(3)
+    for row in samples:
+        stats.update(row)
+    assert stats.count == 1000
+    np.testing.assert_allclose(stats.mean, samples.mean(axis=0))
+    np.testing.assert_allclose(stats.variance, samples.var(axis=0, ddof=1))
+    np.testing.assert_array_equal(stats.minimum, samples.min(axis=0))
+    np.testing.assert_array_equal(stats.maximum, samples.max(axis=0))
+
+
+def test_merge_equals_single_pass(samples):
+    left, right, whole = OnlineStats(3), OnlineStats(3), OnlineStats(3)
+    for row in samples[:300]:
+        left.update(row)
+    for row in samples[300:]:
+        right.update(row)
+    for row in samples:
+        whole.update(row)
+    left.merge(right)
+    left.merge(OnlineStats(3))
+    assert left.count == whole.count
+    np.testing.assert_allclose(left.mean, whole.mean)
+    np.testing.assert_allclose(left.variance, whole.variance)
+    np.testing.assert_array_equal(left.maximum, whole.maximum)
+
+
+def test_variance_needs_two_samples():
+    stats = OnlineStats(1)
+    stats.update([1.0])
+    assert np.isnan(stats.variance).all()
+
+
+def test_from_samples_merges_like_updates(samples):
+    stats = OnlineStats.from_samples(samples[:400])
+    stats.merge(OnlineStats.from_samples(samples[400:]))
+    assert stats.count == 1000
+    np.testing.assert_allclose(stats.mean, samples.mean(axis=0))
+    np.testing.assert_allclose(stats.variance, samples.var(axis=0, ddof=1))
+    assert OnlineStats.from_samples(np.empty((0, 3))).count == 0
+
+
+def test_sketch_quantiles_are_within_relative_accuracy():
+    values = np.random.default_rng(1).lognormal(3, 1, size=(2, 4000))
+    sketch = QuantileSketch((2,), relative_accuracy=0.01)
+    sketch.update(values[:, :1500])
+    other = QuantileSketch((2,), relative_accuracy=0.01)
+    other.update(values[:, 1500:])
+    sketch.merge(other)
+    np.testing.assert_array_equal(sketch.count, [4000, 4000])
+    for q in (0.05, 0.5, 0.95):
+        exact = np.quantile(values, q, axis=1, method="lower")
+        np.testing.assert_allclose(sketch.quantile(q), exact, rtol=0.0101)
+
+
+def test_sketch_zero_bucket_and_empty_cells():
+    sketch = QuantileSketch((3,))
+    sketch.update([0.0, 5.0, 1e9], at=slice(0, 3))
+    sketch.update([[0.0, 0.0]], at=slice(1, 2))
+    quantiles = sketch.quantile(0.5)
+    assert quantiles[0] == 0
+    assert quantiles[1] == 0
+    assert quantiles[2] == pytest.approx(1e7, rel=0.02)
+    assert np.isnan(QuantileSketch((1,)).quantile(0.5)).all()
+    with pytest.raises(ValueError):
+        sketch.merge(QuantileSketch((3,), relative_accuracy=0.05))
@@ -0,0 +1,147 @@
+import random
+
+import pytest
+
+from benchmark import legacy_time_passes
+from reactions import (
+    REACTIONS,
+    Reaction,
+    compile_reactions,
+    possible_reactions,
+    step,
+)
+from runner import build_simulation
+from simulation_variables import SimulationVariables
+from species import SPECIES, ZERO_SLOT
+
+
+@pytest.fixture()
+def random_simulation():
+    generator = random.Random(7)
+    simulation = SimulationVariables()
+    for name in SPECIES:
+        setattr(simulation, name, generator.uniform(0, 2000))
+    return simulation
+
+
+def test_reaction_names_match_simulation_methods():
+    for reaction in REACTIONS:
+        assert callable(getattr(SimulationVariables, reaction.name))
+
+
+def test_compile_uses_zero_slot_for_missing_species():
+    compiled = Reaction("r", "thrombin", "factor7", "factor7a", 10).compile()
+    assert compiled[3] == ZERO_SLOT
+    assert compiled[6] == ZERO_SLOT
+    assert compiled[8] == ZERO_SLOT
+
+
+def test_table_kernel_matches_reaction_variables(random_simulation):
+    legacy = SimulationVariables()
+    legacy._values[:] = random_simulation._values
+    for _ in range(50):
+        random_simulation.time_passes()
+        legacy_time_passes(legacy)
+    assert random_simulation._values == pytest.approx(legacy._values, rel=1e-12)
+    assert random_simulation.current_time == legacy.current_time
+
+
+def test_step_skips_tiny_sources():
+    values = [0.0] * (ZERO_SLOT + 1)
+    table = compile_reactions(
+        (Reaction("r", "thrombin", "factor7", "factor7a", 1, tail=1),)
+    )
+    values[SPECIES.index("thrombin")] = 100
+    values[SPECIES.index("factor7")] = 0.004
+    step(values, table)
+    assert values[SPECIES.index("factor7a")] == 0
+
+
+def test_catalyst_threshold_gates_second_catalyst():
+    reaction = Reaction(
+        "r",
+        "thrombomodulin",
+        "protein_c",
+        "protein_ca",
+        100,
+        catalyst_2="thrombin",
+        multiplier=100,
+        catalyst_threshold=0.01,
+    )
+    simulation = SimulationVariables(protein_c=1000, thrombin=50, thrombomodulin=0.01)
+    step(simulation._values, (reaction.compile(),))
+    assert simulation.protein_ca == 0
+    simulation.thrombomodulin = 1
+    step(simulation._values, (reaction.compile(),))
+    assert simulation.protein_ca > 0
+
+
+def test_catalyze_applies_a_one_off_reaction():
+    simulation = SimulationVariables(tPA=100, plasminogen=10000)
+    moved = simulation.catalyze("tPA", "plasminogen", "plasmin", 20, tail=500)
+    assert moved == pytest.approx(5)
+    assert simulation.plasmin == pytest.approx(5)
+
+
+def test_reactions_from_outside_the_table_bring_reactions_back():
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    simulation.tissue_factor = 0
+    simulation.subendothelium = 0
+    while simulation.time_passes():
+        pass
+    assert simulation.factor10a == simulation.thrombin == 0
+    simulation.catalyze("fibrinogen", "factor7", "factor7a", 1000)
+    for _ in range(200):
+        simulation.time_passes()
+    assert simulation.factor10a > 0
+    assert simulation.thrombin > 0
+
+
+@pytest.mark.parametrize(
+    "mode, pruned",
+    [
+        ("None", len(REACTIONS)),
+        ("Haemostasis (Pro-thrombotic)", 15),
+        ("Fibrinolysis", len(REACTIONS) - 3),
+    ],
+)
+def test_possible_reactions_drop_reactions_that_cannot_fire(mode, pruned):
+    simulation = build_simulation(mode)
+    table = possible_reactions(simulation.reaction_table, simulation._values)
+    assert len(SimulationVariables.reaction_table) - len(table) == pruned
+
+
+@pytest.mark.parametrize("mode", ["Haemostasis (Anti-thrombotic)", "Fibrinolysis"])
+def test_pruned_table_steps_like_full_table(mode):
+    pruned = build_simulation(mode)
+    full = build_simulation(mode)
+    for _ in range(3000):
+        pruned.time_passes()
+        step(full._values, full.reaction_table)
+    assert pruned._values == full._values
+
+
+def test_setting_a_species_brings_reactions_back():
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    for _ in range(100):
+        simulation.time_passes()
+    simulation.tPA = 100
+    for _ in range(100):
+        simulation.time_passes()
+    assert simulation.plasmin > 0
+
+
+def run_mode(mode, ticks=2000):
+    simulation = build_simulation(mode)
+    for _ in range(ticks):
+        simulation.time_passes()
+    return simulation
+
+
+def test_new_modes_now_react():
+    fibrinolysis = run_mode("Fibrinolysis")
+    assert fibrinolysis.fDP > 0
+    assert fibrinolysis.cross_linked_fibrin < 50000
+    anti = run_mode("Haemostasis (Anti-thrombotic)")
+    assert anti.protein_ca > 0
+    assert anti.thrombin < run_mode("Haemostasis (Pro-thrombotic)").thrombin
@@ -0,0 +1,172 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import headless
+import runner
+from history import TrajectoryHistory
+from runner import (
+    build_simulation,
+    load_trajectory,
+    run_simulation,
+    save_trajectory,
+    stream_simulation,
+    tick_times,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_build_simulation_applies_mode_and_disorder():
+    simulation = build_simulation(
+        "Haemostasis (Pro-thrombotic)", "Haemophilia B", {"factor8": 10}
+    )
+    assert simulation.tissue_factor == 100
+    assert simulation.factor9 == 0
+    assert simulation.factor8 == 10
+
+
+def test_build_simulation_rejects_unknown_species():
+    with pytest.raises(ValueError):
+        build_simulation(overrides={"factor99": 1})
+
+
+def test_run_simulation_matches_time_passes():
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    expected = build_simulation("Haemostasis (Pro-thrombotic)")
+    trajectory = run_simulation(simulation, 100, ("thrombin", "fibrin"))
+    for _ in range(100):
+        expected.time_passes()
+    assert trajectory.shape == (101, 2)
+    assert trajectory[0, 0] == 0
+    assert trajectory[-1, 0] == pytest.approx(expected.thrombin)
+    assert trajectory[-1, 1] == pytest.approx(expected.fibrin)
+
+
+def test_save_and_load_npz(tmp_path):
+    trajectory = np.arange(6, dtype=float).reshape(3, 2)
+    path = tmp_path / "run.npz"
+    save_trajectory(path, tick_times(0, 2), ("a", "b"), trajectory, {"steps": 2})
+    times, species, loaded, metadata = load_trajectory(path)
+    assert list(times) == [0, 0.5, 1]
+    assert species == ("a", "b")
+    assert np.array_equal(loaded, trajectory)
+    assert metadata == {"steps": 2}
+
+
+def test_run_command_writes_csv(tmp_path, monkeypatch):
+    monkeypatch.setenv("COAGULATION_CACHE_DIR", str(tmp_path / "cache"))
+    output = tmp_path / "run.csv"
+    headless.main(
+        [
+            "run",
+            "--preset",
+            "Haemostasis (Pro-thrombotic)",
+            "--steps",
+            "10",
+            "--species",
+            "thrombin,fibrin",
+            "--output",
+            str(output),
+        ]
+    )
+    lines = output.read_text().splitlines()
+    assert lines[0] == "time,thrombin,fibrin"
+    assert len(lines) == 12
+
+
+def test_simulation_import_does_not_load_qt():
+    code = (
+        "import sys, simulation_variables, runner, headless; "
+        "assert not [m for m in sys.modules if m.startswith(('PyQt5', 'pyqtgraph'))]"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+
+
+def test_run_simulation_fast_forwards_once_quiescent():
+    simulation = build_simulation("None")
+    trajectory = run_simulation(simulation, 50_000, ("prothrombin",))
+    assert trajectory.shape == (50_001, 1)
+    assert np.all(trajectory == 10000)
+    assert simulation.current_time == 50_000
+
+
+def test_fast_forward_matches_full_stepping():
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    trajectory = run_simulation(simulation, 6000, ("fibrin", "cross_linked_fibrin"))
+    stepped = build_simulation("Haemostasis (Pro-thrombotic)")
+    for _ in range(6000):
+        stepped.time_passes()
+    assert trajectory[-1, 0] == stepped.fibrin
+    assert trajectory[-1, 1] == stepped.cross_linked_fibrin
+
+
+def test_stream_matches_run_at_stride():
+    expected = run_simulation(
+        build_simulation("Haemostasis (Pro-thrombotic)"), 1000, ("thrombin",)
+    )
+    samples = list(
+        stream_simulation(
+            build_simulation("Haemostasis (Pro-thrombotic)"),
+            1000,
+            ("thrombin",),
+            stride=30,
+        )
+    )
+    ticks = [*range(0, 1000, 30), 1000]
+    assert [seconds for seconds, _ in samples] == [tick / 2 for tick in ticks]
+    assert [values[0] for _, values in samples] == list(expected[ticks, 0])
+
+
+def test_stream_stops_on_predicate_and_when_quiescent():
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    *_, (seconds, values) = stream_simulation(
+        simulation, species=("fibrin",), until=lambda _, values: values[0] > 1000
+    )
+    assert values[0] > 1000
+    assert simulation.current_time == seconds * 2
+
+    simulation = build_simulation("None")
+    samples = list(stream_simulation(simulation, species=None, stride=10))
+    assert len(samples) == 2
+    assert samples[-1][1] == simulation.field_values()
+
+
+def test_stream_feeds_history():
+    history = TrajectoryHistory(("thrombin", "fibrin"), capacity=100)
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    for seconds, values in stream_simulation(simulation, 5000, ("thrombin", "fibrin")):
+        history.record(seconds, values)
+    assert history.total == 5001
+    assert history.series("fibrin")[-1] == np.float32(simulation.fibrin)
+
+
+def test_stream_command_writes_csv(tmp_path, capsys):
+    output = tmp_path / "stream.csv"
+    headless.main(
+        [
+            "stream",
+            "--preset",
+            "Haemostasis (Pro-thrombotic)",
+            "--steps",
+            "100",
+            "--stride",
+            "25",
+            "--species",
+            "thrombin",
+            "--output",
+            str(output),
+        ]
+    )
+    assert output.read_text().splitlines()[0] == "time,thrombin"
+    assert len(output.read_text().splitlines()) == 6
+    assert "5 samples" in capsys.readouterr().err
+
+
+def test_tick_times_follow_ticks_per_second(monkeypatch):
+    np.testing.assert_array_equal(tick_times(4, 2), [2.0, 2.5, 3.0])
+    monkeypatch.setattr(runner, "TICKS_PER_SECOND", 4)
+    np.testing.assert_array_equal(tick_times(4, 2), [1.0, 1.25, 1.5])
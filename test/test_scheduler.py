@@ -0,0 +1,63 @@
+import pytest
+
+from constants import MAX_SPEED
+from scheduler import STEPS_PER_CLOCK_CHECK, StepScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+def test_steps_follow_speed(clock):
+    scheduler = StepScheduler(speed=64, clock=clock)
+    clock.now = 0.1
+    assert scheduler.steps_due() == 12
+    clock.now = 0.2
+    # the 0.8 step left over from the first frame carries into the second
+    assert scheduler.steps_due() == 13
+
+
+def test_slow_speeds_accumulate(clock):
+    scheduler = StepScheduler(speed=0.5, clock=clock)
+    steps = 0
+    for frame in range(1, 61):
+        clock.now = frame / 60
+        steps += scheduler.steps_due()
+    assert steps == 1
+
+
+def test_stalled_frames_do_not_burst(clock):
+    scheduler = StepScheduler(speed=1024, clock=clock)
+    clock.now = 10
+    assert scheduler.steps_due() == 512
+
+
+def test_run_frame_stops_when_step_says_so(clock):
+    scheduler = StepScheduler(speed=1024, clock=clock)
+    clock.now = 0.1
+    calls = []
+    assert scheduler.run_frame(lambda: calls.append(1) or len(calls) < 5) == 5
+
+
+def test_unthrottled_runs_until_frame_budget(clock):
+    scheduler = StepScheduler(speed=MAX_SPEED, clock=clock, frame_budget=0.01)
+    calls = []
+
+    def step():
+        calls.append(1)
+        clock.now += 0.0001
+        return True
+
+    done = scheduler.run_frame(step)
+    assert done == len(calls)
+    assert done % STEPS_PER_CLOCK_CHECK == 0
+    assert 100 <= done < 100 + STEPS_PER_CLOCK_CHECK
@@ -0,0 +1,109 @@
+import math
+
+import numpy as np
+import pytest
+
+from batch_engine import BatchSimulation
+from runner import build_simulation
+from sensitivity import Parameter, analyse, parameters, summarise
+
+
+@pytest.fixture()
+def simulation():
+    return build_simulation("Haemostasis (Pro-thrombotic)")
+
+
+def test_parameters_cover_constants_and_starting_amounts(simulation):
+    labels = {parameter.label for parameter in parameters(simulation)}
+    assert "convert_prothrombin.divisor" in labels
+    assert "convert_prothrombin.multiplier" in labels
+    assert "convert_prothrombin.multiplier_i1" in labels
+    assert "convert_prothrombin.tail" in labels
+    assert "convert_fibrin.multiplier" not in labels
+    assert "prothrombin" in labels
+    # nothing reads it, or the scenario leaves it at 0
+    assert "vWF" not in labels
+    assert "tPA" not in labels
+
+
+def test_per_patient_constants_match_separate_runs(simulation):
+    batch = BatchSimulation([simulation.copy() for _ in range(2)])
+    batch.set_constant("convert_prothrombin", "divisor", [120000, 60000])
+    batch.prune()
+    summary = summarise(batch, 600)
+    for column, reactions in enumerate(
+        (
+            simulation.reactions,
+            tuple(
+                (
+                    reaction
+                    if reaction.name != "convert_prothrombin"
+                    else type(reaction)(**{**reaction.__dict__, "divisor": 60000})
+                )
+                for reaction in simulation.reactions
+            ),
+        )
+    ):
+        single = BatchSimulation([simulation.copy()], reactions)
+        expected = summarise(single, 600)
+        np.testing.assert_allclose(summary.final[:, column], expected.final[:, 0])
+        assert summary.clot_time[column] == expected.clot_time[0]
+
+
+def test_set_constant_checks_its_arguments(simulation):
+    batch = BatchSimulation([simulation, simulation.copy()])
+    with pytest.raises(ValueError):
+        batch.set_constant("convert_prothrombin", "catalyst", [1, 2])
+    with pytest.raises(ValueError):
+        batch.set_constant("no_such_reaction", "divisor", [1, 2])
+    with pytest.raises(ValueError):
+        batch.set_constant("convert_prothrombin", "divisor", [1, 2, 3])
+
+
+def test_coefficients_follow_the_model(simulation):
+    result = analyse(
+        simulation,
+        2000,
+        outputs=("clot_time", "final:cross_linked_fibrin"),
+        chosen=[
+            Parameter("convert_prothrombin", "divisor", 120000),
+            Parameter("fibrinogen", None, simulation.fibrinogen),
+            Parameter("vWF", None, simulation.vWF),
+        ],
+    )
+    divisor, fibrinogen, vwf = result.coefficients
+    # a slower reaction clots later; more fibrinogen makes more clot
+    assert divisor[0] > 0.1
+    assert fibrinogen[1] == pytest.approx(1, abs=0.01)
+    assert list(vwf) == [0, 0]
+    assert result.ranked()[0] in (0, 1)
+
+
+def test_outputs_that_never_happen_give_nan():
+    simulation = build_simulation("Haemostasis (Anti-thrombotic)")
+    result = analyse(
+        simulation,
+        200,
+        outputs=("clot_time",),
+        chosen=[Parameter("prothrombin", None, simulation.prothrombin)],
+    )
+    assert math.isinf(result.base[0])
+    assert np.isnan(result.coefficients[0, 0])
+
+
+def test_unknown_outputs_are_rejected(simulation):
+    with pytest.raises(ValueError):
+        analyse(simulation, 10, outputs=("peak:nothing",))
+    with pytest.raises(ValueError):
+        analyse(simulation, 10, outputs=("area:thrombin",))
+
+
+def test_tails_are_perturbed(simulation):
+    result = analyse(
+        simulation,
+        2000,
+        outputs=("final:prothrombin",),
+        chosen=[Parameter("convert_prothrombin", "tail", 100.0)],
+    )
+    # a larger tail leaves more prothrombin behind once conversion slows
+    assert result.coefficients[0, 0] > 1
@@ -0,0 +1,207 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import load_test
+from constants import SERVICE_CHUNK_ROWS, SERVICE_MAX_PAYLOAD
+from runner import build_simulation, run_simulation
+from server import (
+    CLOSE_TOO_BIG,
+    OPCODE_CLOSE,
+    OPCODE_TEXT,
+    RunRequest,
+    SimulationService,
+    compute,
+    encode_frame,
+    read_frame,
+)
+
+PRESET = "Haemostasis (Pro-thrombotic)"
+REQUEST = {"preset": PRESET, "steps": 300, "species": ["thrombin", "fibrin"]}
+
+
+def test_run_request_validation():
+    with pytest.raises(ValueError):
+        RunRequest(preset="Nonsense")
+    with pytest.raises(ValueError):
+        RunRequest(steps=-1)
+    with pytest.raises(ValueError):
+        RunRequest(species=("thrombin", "nonsense"))
+    with pytest.raises(ValueError):
+        RunRequest.from_json([1, 2])
+    with pytest.raises(ValueError):
+        RunRequest.from_json({"overrides": ["factor8"]})
+
+
+def test_requests_from_json_and_query_are_equal():
+    query = RunRequest.from_query(
+        f"preset={PRESET}&set=factor9=0&set=factor8=10&steps=300&species=thrombin,fibrin"
+    )
+    data = RunRequest.from_json({**REQUEST, "overrides": {"factor8": 10, "factor9": 0}})
+    assert query == data
+    assert hash(query) == hash(data)
+    with pytest.raises(ValueError):
+        RunRequest.from_query("set=factor8=lots")
+
+
+def test_compute_chunks_the_trajectory():
+    request = RunRequest.from_json(REQUEST)
+    hit, chunks = compute(request)
+    assert not hit
+    assert len(chunks) == -(-(request.steps + 1) // SERVICE_CHUNK_ROWS)
+    messages = [json.loads(chunk) for chunk in chunks]
+    values = np.concatenate([message["values"] for message in messages])
+    expected = run_simulation(build_simulation(PRESET), 300, request.species)
+    np.testing.assert_allclose(values, expected)
+    assert messages[0]["time"][:2] == [0.0, 0.5]
+
+
+def test_compute_uses_the_disk_cache(tmp_path):
+    request = RunRequest.from_json(REQUEST)
+    assert compute(request, tmp_path) == (False, compute(request)[1])
+    assert compute(request, tmp_path) == (True, compute(request)[1])
+
+
+def test_websocket_frames_round_trip():
+    async def read(data):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_frame(reader)
+
+    for size in (5, 300, 70000):
+        payload = bytes(range(256)) * (size // 256) + b"x" * (size % 256)
+        for mask in (None, b"\x01\x02\x03\x04"):
+            frame = encode_frame(payload, mask=mask)
+            assert asyncio.run(read(frame)) == (OPCODE_TEXT, payload)
+
+
+def run_service(clients):
+    # a service on a free port with compute in threads, driven by the load
+    # test's own clients; returns its stats and what the clients saw
+    async def main():
+        service = SimulationService(executor=ThreadPoolExecutor(2))
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            results = await clients(port)
+        finally:
+            server.close()
+            await server.wait_closed()
+            await asyncio.gather(*service.connections)
+            service.close()
+        return service.stats(), results
+
+    return asyncio.run(main())
+
+
+def test_concurrent_equal_requests_are_computed_once():
+    async def clients(port):
+        results = []
+        await asyncio.gather(
+            *(
+                client("127.0.0.1", port, [REQUEST, REQUEST], results)
+                for client in [load_test.http_client, load_test.websocket_client] * 4
+            )
+        )
+        return results
+
+    stats, results = run_service(clients)
+    assert len(results) == 16
+    assert all(ok for _, _, ok in results)
+    assert len({size for _, size, _ in results}) <= 3
+    assert stats["computed"] == 1
+    assert stats["shared"] + stats["memory_hits"] == 15
+    assert stats["in_flight"] == 0
+    assert stats["results_held"] == 1
+
+
+async def get(port, target, body=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    method = "GET" if body is None else "POST"
+    body = body or b""
+    writer.write(
+        b"%s %s HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n%s"
+        % (method.encode(), target.encode(), len(body), body)
+    )
+    await writer.drain()
+    status, headers = await load_test.read_head(reader)
+    content = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return status, headers, content
+
+
+def test_http_routes():
+    async def clients(port):
+        return [
+            await get(port, "/health"),
+            await get(port, "/options"),
+            await get(port, "/"),
+            await get(port, "/nowhere"),
+            await get(port, "/run?preset=Nonsense"),
+            await get(port, "/run", b"not json"),
+            await get(port, "/run?steps=10&species=thrombin"),
+        ]
+
+    stats, responses = run_service(clients)
+    health, options, index, missing, bad_query, bad_body, run = responses
+    assert health[0] == 200 and json.loads(health[2]) == {"status": "ok"}
+    assert PRESET in json.loads(options[2])["presets"]
+    assert index[0] == 200 and b"<canvas" in index[2]
+    assert missing[0] == 404
+    assert bad_query[0] == bad_body[0] == 400
+    assert run[0] == 200
+    assert run[1]["transfer-encoding"] == "chunked"
+    lines = [line for line in run[2].split(b"\r\n") if line.startswith(b"{")]
+    header, chunk, done = map(json.loads, lines)
+    assert header["source"] == "computed" and header["species"] == ["thrombin"]
+    assert len(chunk["values"]) == 11
+    assert done == {"done": True}
+    assert stats["errors"] == 2
+
+
+async def exchange(port, data, websocket=False):
+    # raw bytes in; the status line and headers, then the first WebSocket
+    # frame or the body
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    status, headers = await load_test.read_head(reader)
+    reply = await read_frame(reader) if websocket else await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return status, reply
+
+
+def test_oversized_or_malformed_requests_are_refused():
+    upgrade = b"GET /ws HTTP/1.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+
+    async def clients(port):
+        return [
+            await exchange(
+                port,
+                b"POST /run HTTP/1.1\r\nContent-Length: %d\r\n\r\n"
+                % (SERVICE_MAX_PAYLOAD + 1),
+            ),
+            await exchange(port, b"POST /run HTTP/1.1\r\nContent-Length: x\r\n\r\n"),
+            await exchange(port, upgrade + b"\r\n"),
+            await exchange(
+                port,
+                upgrade
+                + b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n\r\n"
+                + b"\x81\xff"
+                + (SERVICE_MAX_PAYLOAD + 1).to_bytes(8, "big"),
+                websocket=True,
+            ),
+        ]
+
+    stats, (too_large, bad_length, no_key, big_frame) = run_service(clients)
+    assert too_large[0] == 413
+    assert bad_length[0] == 400
+    assert no_key[0] == 400
+    assert big_frame == (101, (OPCODE_CLOSE, CLOSE_TOO_BIG.to_bytes(2, "big")))
+    assert stats["errors"] == 4
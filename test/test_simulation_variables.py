@@ -190,3 +190,49 @@ def test_convert_fibrin(empty_simulation):
     simulation.convert_fibrin()
     assert simulation.fibrin == pytest.approx(999)
     assert simulation.cross_linked_fibrin == pytest.approx(1)
+
+
+def test_time_passes_reports_amount_moved(empty_simulation):
+    simulation = empty_simulation
+    simulation.subendothelium = 100
+    simulation.factor12 = 100
+    assert simulation.time_passes() == pytest.approx(1)
+    simulation.subendothelium = 0
+    assert simulation.time_passes() == 0
+
+
+def test_copy_is_independent():
+    simulation = SimulationVariables(current_time=5, thrombin=10)
+    copy = simulation.copy()
+    copy.thrombin = 20
+    copy.current_time = 6
+    assert simulation.thrombin == 10
+    assert simulation.current_time == 5
+    assert copy.field_values()[3:] != simulation.field_values()[3:]
+
+
+def test_equal_states_compare_equal():
+    simulation = SimulationVariables(current_time=5, thrombin=10)
+    copy = simulation.copy()
+    assert copy == simulation
+    assert SimulationVariables() == SimulationVariables()
+    copy.thrombin = 11
+    assert copy != simulation
+    assert simulation != simulation.field_values()
+    assert "thrombin=10" in repr(simulation)
+
+
+def test_state_has_no_instance_dict():
+    simulation = SimulationVariables()
+    assert not hasattr(simulation, "__dict__")
+    with pytest.raises(AttributeError):
+        simulation.thrombn = 1
+    assert simulation.nbytes() > 0
+
+
+def test_reset_and_clear_keep_the_same_storage(empty_simulation):
+    values = empty_simulation._values
+    assert set(empty_simulation.field_values()) == {0}
+    empty_simulation.reset()
+    assert empty_simulation.field_values() == SimulationVariables().field_values()
+    assert empty_simulation._values is values
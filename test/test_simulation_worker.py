@@ -0,0 +1,107 @@
+import queue
+import time
+
+import numpy as np
+import pytest
+
+from constants import MAX_SPEED, TICKS_PER_SECOND, TIME_LIMIT_SECONDS
+from runner import build_simulation, run_simulation
+from simulation_worker import SimulationWorker
+from trajectory_cache import TrajectoryCache
+
+MODE = "Haemostasis (Pro-thrombotic)"
+END_TICK = (TIME_LIMIT_SECONDS + 1) * TICKS_PER_SECOND
+
+
+@pytest.fixture()
+def worker():
+    worker = SimulationWorker(build_simulation(MODE), max_batches=2)
+    worker.start()
+    yield worker
+    worker.shutdown()
+
+
+def collect(worker, seconds=30):
+    # every batch until the worker stops of its own accord
+    batches = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            batches.append(worker.batches.get(timeout=0.01))
+        except queue.Empty:
+            if not worker.running:
+                break
+    times = np.concatenate([times for times, _ in batches])
+    states = np.concatenate([states for _, states in batches])
+    return times, states
+
+
+def test_a_full_speed_run_matches_the_plain_engine(worker):
+    worker.resume(MAX_SPEED)
+    times, states = collect(worker)
+    assert not worker.running
+    np.testing.assert_array_equal(states[:, 1], np.arange(1, END_TICK + 1))
+    np.testing.assert_array_equal(times, states[:, 1] / TICKS_PER_SECOND)
+    expected = run_simulation(build_simulation(MODE), END_TICK)
+    np.testing.assert_allclose(states[:, 3:], expected[1:])
+
+
+def test_a_full_queue_holds_the_worker_back(worker):
+    # without the time limit the run cannot finish before the queue fills
+    worker.resume(MAX_SPEED, time_limit=False)
+    time.sleep(0.3)
+    assert worker.batches.full()
+    held = worker.call(lambda: worker.simulation.current_time)
+    time.sleep(0.2)
+    # nothing drained, so nothing more was stepped
+    assert worker.call(lambda: worker.simulation.current_time) == held
+    _, states = worker.batches.get()
+    assert states[-1, 1] < held
+    time.sleep(0.2)
+    assert worker.call(lambda: worker.simulation.current_time) > held
+
+
+def test_pause_and_single_steps(worker):
+    worker.resume(64)
+    time.sleep(0.1)
+    worker.pause()
+    assert not worker.running
+    tick = worker.simulation.current_time
+    time.sleep(0.1)
+    assert worker.simulation.current_time == tick
+    times, states = worker.step()
+    assert states[:, 1].tolist() == [tick + 1]
+    assert times.tolist() == [(tick + 1) / TICKS_PER_SECOND]
+
+
+def test_commands_return_results_and_raise(worker):
+    assert worker.call(sum, (1, 2)) == 3
+    with pytest.raises(ZeroDivisionError):
+        worker.call(lambda: 1 / 0)
+    assert worker.isRunning()
+
+
+def test_a_quiescent_run_still_steps_one_tick_at_a_time():
+    worker = SimulationWorker(build_simulation("None"))
+    # not started: commands run in the calling thread
+    times, states = worker.step()
+    assert states[:, 1].tolist() == [1]
+    assert not worker.limit_reached()
+    worker.simulation.set_haemostasis_mode(prothrombotic=True)
+    for _ in range(100):
+        worker.step()
+    assert worker.simulation.thrombin > 0
+
+
+def test_full_speed_runs_come_from_the_cache(tmp_path):
+    cache = TrajectoryCache(tmp_path)
+    worker = SimulationWorker(build_simulation(MODE), cache)
+    worker.start()
+    try:
+        worker.resume(MAX_SPEED)
+        _, states = collect(worker)
+    finally:
+        worker.shutdown()
+    assert cache.misses == 1
+    expected = run_simulation(build_simulation(MODE), END_TICK)
+    np.testing.assert_allclose(states[:, 3:], expected[1:])
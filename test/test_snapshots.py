@@ -0,0 +1,90 @@
+import pytest
+
+from runner import build_simulation
+from snapshots import CheckpointTimeline
+
+
+@pytest.fixture()
+def simulation():
+    return build_simulation("Haemostasis (Pro-thrombotic)")
+
+
+def run(simulation, timeline, steps):
+    timeline.pin(simulation)
+    for _ in range(steps):
+        simulation.time_passes()
+        timeline.record(simulation)
+
+
+def test_restore_is_inverse_of_field_values(simulation):
+    for _ in range(100):
+        simulation.time_passes()
+    copy = build_simulation()
+    copy.restore(simulation.field_values())
+    assert copy.field_values() == simulation.field_values()
+
+
+def test_seek_matches_straight_run(simulation):
+    timeline = CheckpointTimeline(interval=16)
+    run(simulation, timeline, 1000)
+    reference = build_simulation("Haemostasis (Pro-thrombotic)")
+    for _ in range(437):
+        reference.time_passes()
+    replayed = timeline.seek(simulation, 437)
+    assert replayed < 16
+    assert simulation.field_values() == reference.field_values()
+
+
+def test_checkpoints_stay_within_limit(simulation):
+    timeline = CheckpointTimeline(interval=4, limit=10)
+    run(simulation, timeline, 1000)
+    assert len(timeline) <= 10
+    assert timeline.interval == 128
+    assert timeline.ticks()[0] == 0
+    assert timeline.end == 1000
+
+
+def test_pinned_state_survives_thinning(simulation):
+    timeline = CheckpointTimeline(interval=4, limit=10)
+    run(simulation, timeline, 301)
+    simulation.increase_fibrinogen_level()
+    fibrinogen = simulation.fibrinogen
+    timeline.pin(simulation)
+    for _ in range(700):
+        simulation.time_passes()
+        timeline.record(simulation)
+    assert 301 in timeline.ticks()
+    timeline.seek(simulation, 301)
+    assert simulation.fibrinogen == fibrinogen
+
+
+def test_pinned_checkpoints_beyond_the_limit_are_all_kept(simulation):
+    timeline = CheckpointTimeline(interval=64, limit=4)
+    levels = {}
+    for change in range(8):
+        # a disorder-like change every 10 ticks, never on the interval
+        simulation.factor8 = 100 * change
+        timeline.pin(simulation)
+        levels[simulation.current_time] = simulation.factor8
+        for _ in range(10):
+            simulation.time_passes()
+            timeline.record(simulation)
+    assert len(timeline) == 8
+    for tick, factor8 in levels.items():
+        timeline.seek(simulation, tick)
+        assert simulation.factor8 == factor8
+    timeline.clear()
+    assert timeline.nbytes == CheckpointTimeline(interval=64, limit=4).nbytes
+
+
+def test_truncate_forgets_later_ticks(simulation):
+    timeline = CheckpointTimeline(interval=8)
+    run(simulation, timeline, 200)
+    timeline.truncate(100)
+    assert timeline.ticks().max() <= 100
+    assert timeline.end == 100
+
+
+def test_seek_needs_an_earlier_checkpoint(simulation):
+    with pytest.raises(ValueError):
+        CheckpointTimeline().seek(simulation, 10)
@@ -0,0 +1,70 @@
+import argparse
+import io
+
+import numpy as np
+import pytest
+
+import headless
+from constants import disorders, simulation_modes
+from runner import build_simulation, run_simulation
+from sweep import ProgressBar, build_jobs, run_sweep, save_sweep, stream_sweep
+from trajectory_store import TrajectoryStore
+
+
+def test_build_jobs_covers_cross_product():
+    jobs = build_jobs(grid={"factor8": [0, 1000], "factor9": [0, 500, 1000]})
+    assert len(jobs) == len(simulation_modes) * len(disorders) * 6
+    assert jobs[0] == {
+        "mode": simulation_modes[0],
+        "disorder": disorders[0],
+        "overrides": {"factor8": 0, "factor9": 0},
+    }
+
+
+def test_run_sweep_matches_single_runs(tmp_path):
+    jobs = build_jobs(
+        ["Haemostasis (Pro-thrombotic)"], ["None", "Haemophilia A (Severe)"]
+    )
+    trajectories, job_seconds, _ = run_sweep(
+        jobs, 40, ("thrombin",), workers=2, progress=False
+    )
+    assert trajectories.shape == (2, 41, 1)
+    assert np.all(job_seconds > 0)
+    for job, trajectory in zip(jobs, trajectories):
+        simulation = build_simulation(job["mode"], job["disorder"])
+        expected = run_simulation(simulation, 40, ("thrombin",))
+        np.testing.assert_allclose(trajectory, expected, rtol=1e-6)
+
+    path = tmp_path / "sweep.npz"
+    save_sweep(path, jobs, 40, ("thrombin",), trajectories, job_seconds)
+    with np.load(path) as data:
+        assert list(data["disorders"]) == ["None", "Haemophilia A (Severe)"]
+        assert data["trajectories"].shape == (2, 41, 1)
+
+
+def test_stream_sweep_writes_store(tmp_path):
+    jobs = build_jobs(
+        ["Haemostasis (Pro-thrombotic)"], ["None", "Haemophilia A (Severe)"]
+    )
+    trajectories, _, _ = run_sweep(jobs, 40, ("thrombin",), workers=1, progress=False)
+    stream_sweep(tmp_path / "store", jobs, 40, ("thrombin",), 1, progress=False)
+    store = TrajectoryStore(tmp_path / "store")
+    assert store.run_metadata[1]["disorder"] == "Haemophilia A (Severe)"
+    np.testing.assert_array_equal(
+        store.species_slice("thrombin"), trajectories[:, :, 0]
+    )
+
+
+def test_progress_bar_finishes_line():
+    stream = io.StringIO()
+    bar = ProgressBar(2, stream=stream, width=4)
+    bar.advance()
+    bar.advance()
+    assert "[####] 2/2 jobs" in stream.getvalue()
+    assert stream.getvalue().endswith("\n")
+
+
+@pytest.mark.parametrize("pairs", [["factor8"], ["factor8="]])
+def test_grid_parsing_rejects_missing_values(pairs):
+    with pytest.raises(argparse.ArgumentTypeError):
+        headless.parse_grid(pairs)
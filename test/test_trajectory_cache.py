@@ -0,0 +1,80 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from runner import build_simulation, run_simulation
+from trajectory_cache import TrajectoryCache
+
+
+@pytest.fixture()
+def cache(tmp_path):
+    return TrajectoryCache(tmp_path)
+
+
+def test_hit_matches_fresh_run(cache):
+    first = build_simulation("Haemostasis (Pro-thrombotic)", "Haemophilia B")
+    stored = cache.run(first, 500)
+    second = build_simulation("Haemostasis (Pro-thrombotic)", "Haemophilia B")
+    loaded = cache.run(second, 500)
+    assert (cache.hits, cache.misses) == (1, 1)
+    np.testing.assert_array_equal(stored, loaded)
+    assert second.field_values() == first.field_values()
+
+
+def test_species_subset_comes_from_full_run(cache):
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    cache.run(simulation, 200)
+    subset = cache.run(
+        build_simulation("Haemostasis (Pro-thrombotic)"), 200, ("thrombin",)
+    )
+    expected = run_simulation(
+        build_simulation("Haemostasis (Pro-thrombotic)"), 200, ("thrombin",)
+    )
+    assert cache.hits == 1
+    np.testing.assert_array_equal(subset, expected)
+
+
+def test_key_depends_on_state_steps_and_reactions(cache, monkeypatch):
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    key = cache.key(simulation, 100)
+    assert cache.key(simulation, 101) != key
+    assert cache.key(simulation, 100, backend="ode") != key
+    simulation.speed = 1
+    simulation.current_time = 40
+    assert cache.key(simulation, 100) == key
+    simulation.factor9 = 0
+    assert cache.key(simulation, 100) != key
+
+    simulation = build_simulation("Haemostasis (Pro-thrombotic)")
+    reactions = tuple(
+        (
+            dataclasses.replace(reaction, divisor=reaction.divisor * 2)
+            if reaction.name == "convert_factor9"
+            else reaction
+        )
+        for reaction in simulation.reactions
+    )
+    monkeypatch.setattr(
+        type(simulation),
+        "reaction_table",
+        tuple(reaction.compile() for reaction in reactions),
+    )
+    assert cache.key(simulation, 100) != key
+
+
+def test_evicts_least_recently_used(cache):
+    def run(amount):
+        cache.run(build_simulation(overrides={"fibrinogen": amount}), 100)
+
+    run(1)
+    cache.max_bytes = 2 * cache.nbytes
+    run(2)
+    run(1)
+    run(3)
+    assert len(cache.entries()) == 2
+    assert cache.nbytes <= cache.max_bytes
+    run(1)
+    assert cache.hits == 2
+    run(2)
+    assert cache.misses == 4
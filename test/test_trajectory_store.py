@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from trajectory_store import TrajectoryStore, TrajectoryStoreWriter
+
+SPECIES = ("thrombin", "fibrin", "factor10a")
+
+
+@pytest.fixture()
+def trajectories():
+    return np.random.default_rng(0).random((11, 21, 3)).astype(np.float32)
+
+
+def write(path, trajectories, **options):
+    with TrajectoryStoreWriter(
+        path, SPECIES, 20, chunk_runs=4, attributes={"steps": 20}, **options
+    ) as writer:
+        for index, trajectory in enumerate(trajectories):
+            writer.append(trajectory, {"run": index})
+    return TrajectoryStore(path)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trip(tmp_path, trajectories, compress):
+    store = write(tmp_path / "store", trajectories, compress=compress)
+    assert store.shape == (11, 3, 21)
+    assert store.attributes == {"steps": 20}
+    assert [meta["run"] for meta in store.run_metadata] == list(range(11))
+    np.testing.assert_array_equal(store.run(9), trajectories[9])
+    np.testing.assert_array_equal(store.species_slice("fibrin"), trajectories[:, :, 1])
+    np.testing.assert_array_equal(
+        store.species_slice("factor10a", runs=slice(2, 10, 3), ticks=slice(5, 8)),
+        trajectories[2:10:3, 5:8, 2],
+    )
+
+
+def test_uncompressed_chunks_are_memory_mapped(tmp_path, trajectories):
+    store = write(tmp_path / "store", trajectories)
+    assert isinstance(store._chunk_array(0, "thrombin"), np.memmap)
+
+
+def test_store_is_readable_while_filling(tmp_path, trajectories):
+    writer = TrajectoryStoreWriter(tmp_path / "store", SPECIES, 20, chunk_runs=4)
+    for trajectory in trajectories[:6]:
+        writer.append(trajectory)
+    assert len(TrajectoryStore(tmp_path / "store")) == 4
+    writer.close()
+    assert len(TrajectoryStore(tmp_path / "store")) == 6
+
+
+def test_rejects_wrong_shape_and_existing_store(tmp_path, trajectories):
+    write(tmp_path / "store", trajectories)
+    with pytest.raises(FileExistsError):
+        TrajectoryStoreWriter(tmp_path / "store", SPECIES, 20)
+    writer = TrajectoryStoreWriter(tmp_path / "other", SPECIES, 20)
+    with pytest.raises(ValueError):
+        writer.append(trajectories[0, :10])
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from constants import TRAJECTORY_CACHE_BYTES
+from reactions import ENGINE_VERSION
+from runner import run_simulation
+from species import SPECIES, SPECIES_INDEX
+
+
+def default_directory() -> Path:
+    directory = os.environ.get("COAGULATION_CACHE_DIR")
+    if directory:
+        return Path(directory)
+    return Path.home() / ".cache" / "coagulation-simulator"
+
+
+def _mark_used(path):
+    # the file system's own timestamps can be too coarse to order quick
+    # successive uses, so the time is set explicitly
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+class TrajectoryCache:
+    # finished runs stored under a hash of everything that decides their
+    # result: the starting amounts, the compiled reaction table (so editing
+    # any divisor, multiplier or tail gives a new key), the species order,
+    # the engine version, the backend and the number of ticks. Files are
+    # evicted least recently used first once the directory passes max_bytes.
+    def __init__(self, directory=None, max_bytes=TRAJECTORY_CACHE_BYTES):
+        self.directory = Path(directory) if directory else default_directory()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, simulation, steps, backend="discrete") -> str:
+        # speed, current_time and injury_stage never change the result
+        description = json.dumps(
+            (
+                ENGINE_VERSION,
+                backend,
+                steps,
+                SPECIES,
+                [float(value) for value in simulation._values[:-1]],
+                simulation.reaction_table,
+            )
+        )
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def path(self, key) -> Path:
+        return self.directory / f"{key}.npy"
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            trajectory = np.load(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        _mark_used(path)
+        return trajectory
+
+    def put(self, key, trajectory):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # written aside and renamed so a reader never sees half a file
+        partial = self.directory / f"{key}.{os.getpid()}.partial"
+        with partial.open("wb") as file:
+            np.save(file, trajectory)
+        os.replace(partial, self.path(key))
+        _mark_used(self.path(key))
+        self.evict()
+
+    def entries(self) -> list:
+        # (last used, size, path), oldest first
+        entries = []
+        for path in self.directory.glob("*.npy"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            path.unlink(missing_ok=True)
+
+    def run(self, simulation, steps, species=SPECIES, backend="discrete"):
+        # run_simulation, served from disk when this exact run has been done
+        # before; either way the simulation ends in the run's final state
+        key = self.key(simulation, steps, backend)
+        trajectory = self.get(key)
+        if trajectory is None:
+            self.misses += 1
+            trajectory = run_simulation(simulation, steps, SPECIES, backend)
+            self.put(key, trajectory)
+        else:
+            self.hits += 1
+            simulation.load_amounts(trajectory[-1].tolist())
+            simulation.current_time += steps
+        if species == SPECIES:
+            return trajectory
+        return trajectory[:, [SPECIES_INDEX[name] for name in species]]
@@ -0,0 +1,163 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from constants import STORE_CHUNK_RUNS, TICKS_PER_SECOND
+
+STORE_VERSION = 1
+
+
+class TrajectoryStoreWriter:
+    # streams (ticks, species) trajectories into a directory: runs are
+    # buffered `chunk_runs` at a time and each chunk is written as one array
+    # per species, shaped (runs, ticks). Uncompressed chunks are .npy files
+    # the reader memory-maps; compressed ones are one .npz per chunk, whose
+    # members still load one species at a time. meta.json is rewritten
+    # after every chunk, so a store is readable while it is being filled.
+    def __init__(
+        self,
+        path,
+        species,
+        steps,
+        start_tick=0,
+        chunk_runs=STORE_CHUNK_RUNS,
+        compress=False,
+        attributes=None,
+    ):
+        self.path = Path(path)
+        self.species = tuple(species)
+        self.steps = steps
+        self.start_tick = start_tick
+        self.chunk_runs = chunk_runs
+        self.compress = compress
+        self.attributes = attributes or {}
+        self.runs = 0
+        self.run_metadata = []
+        self._chunk = np.empty((chunk_runs, len(self.species), steps + 1), np.float32)
+        self._buffered = 0
+        self.path.mkdir(parents=True, exist_ok=True)
+        if (self.path / "meta.json").exists():
+            raise FileExistsError(f"{self.path} already holds a trajectory store")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def append(self, trajectory, metadata=None):
+        # one run, rows are ticks and columns follow `species`
+        if np.shape(trajectory) != (self.steps + 1, len(self.species)):
+            raise ValueError(
+                f"expected a trajectory of shape {(self.steps + 1, len(self.species))},"
+                f" got {np.shape(trajectory)}"
+            )
+        self._chunk[self._buffered] = np.transpose(trajectory)
+        self._buffered += 1
+        self.run_metadata.append(metadata or {})
+        if self._buffered == self.chunk_runs:
+            self.flush()
+
+    def flush(self):
+        if not self._buffered:
+            return
+        chunk = self.runs // self.chunk_runs
+        arrays = {
+            name: self._chunk[: self._buffered, index]
+            for index, name in enumerate(self.species)
+        }
+        if self.compress:
+            np.savez_compressed(self.path / f"{_chunk_name(chunk)}.npz", **arrays)
+        else:
+            directory = self.path / _chunk_name(chunk)
+            directory.mkdir(exist_ok=True)
+            for name, array in arrays.items():
+                np.save(directory / f"{name}.npy", array)
+        self.runs += self._buffered
+        self._buffered = 0
+        self._write_meta()
+
+    def _write_meta(self):
+        meta = {
+            "version": STORE_VERSION,
+            "species": self.species,
+            "steps": self.steps,
+            "start_tick": self.start_tick,
+            "chunk_runs": self.chunk_runs,
+            "compressed": self.compress,
+            "runs": self.runs,
+            "attributes": self.attributes,
+            "run_metadata": self.run_metadata[: self.runs],
+        }
+        partial = self.path / "meta.json.partial"
+        partial.write_text(json.dumps(meta))
+        partial.replace(self.path / "meta.json")
+
+    def close(self):
+        self.flush()
+        self._write_meta()
+
+
+class TrajectoryStore:
+    # read side of TrajectoryStoreWriter, indexed (run, species, tick)
+    def __init__(self, path):
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text())
+        if meta["version"] != STORE_VERSION:
+            raise ValueError(f"unsupported trajectory store version {meta['version']}")
+        self.species = tuple(meta["species"])
+        self.steps = meta["steps"]
+        self.start_tick = meta["start_tick"]
+        self.chunk_runs = meta["chunk_runs"]
+        self.compressed = meta["compressed"]
+        self.runs = meta["runs"]
+        self.attributes = meta["attributes"]
+        self.run_metadata = meta["run_metadata"]
+
+    def __len__(self):
+        return self.runs
+
+    @property
+    def shape(self) -> tuple:
+        return self.runs, len(self.species), self.steps + 1
+
+    def times(self) -> np.ndarray:
+        # seconds, at TICKS_PER_SECOND ticks a second as in the GUI
+        return (self.start_tick + np.arange(self.steps + 1)) / TICKS_PER_SECOND
+
+    def _chunk_array(self, chunk, name):
+        if name not in self.species:
+            raise KeyError(f"species '{name}' is not in this store")
+        if self.compressed:
+            with np.load(self.path / f"{_chunk_name(chunk)}.npz") as data:
+                return data[name]
+        return np.load(self.path / _chunk_name(chunk) / f"{name}.npy", mmap_mode="r")
+
+    def species_slice(self, name, runs=slice(None), ticks=slice(None)):
+        # (runs, ticks) for one species; only that species' chunks holding
+        # the selected runs are read, and uncompressed ones only in part
+        selected = np.arange(self.runs)[runs]
+        result = np.empty(
+            (len(selected), len(range(self.steps + 1)[ticks])), dtype=np.float32
+        )
+        chunks = selected // self.chunk_runs
+        for chunk in np.unique(chunks):
+            rows = chunks == chunk
+            result[rows] = self._chunk_array(chunk, name)[
+                selected[rows] - chunk * self.chunk_runs, ticks
+            ]
+        return result
+
+    def run(self, index) -> np.ndarray:
+        # (ticks, species) for one run, the layout run_simulation returns
+        if not 0 <= index < self.runs:
+            raise IndexError(f"run {index} out of range for {self.runs} runs")
+        chunk, row = divmod(index, self.chunk_runs)
+        return np.stack(
+            [self._chunk_array(chunk, name)[row] for name in self.species], axis=1
+        )
+
+
+def _chunk_name(chunk) -> str:
+    return f"chunk_{chunk:05d}"